@@ -1,19 +1,53 @@
 from bs4 import BeautifulSoup
 from bs4.element import Tag
+from parsers import ParserBackend, get_parser
 from models import Celeb, CelebRole
-from urllib3 import PoolManager
 from urllib3.response import HTTPResponse
-import urllib3 as urllib
+from fetcher import AsyncFetcher
+from transport import Transport, LiveTransport, check_status, check_page
+from ratelimit import AdaptiveTransport
+from projection import ExtractionSpec
+from concurrent.futures import ThreadPoolExecutor
+from streaming import ProfileStream, streaming_available
+from registry import FilmRegistry, FILM_FIELDS, title_id, film_fields
+from extractors import FilmPageExtractor, sibling_text
+from pagestore import PageStore, canonical_url
+from manifest import CrawlManifest, CELEB, SEARCH, PROFILE, FILM, DONE, FAILED
+from resolver import NameResolver, name_key, person_id
+from sinks import Sink, get_sink
+from metrics import Metrics, MetricsReporter
+from tmdb import TmdbSource
+from urllib.parse import urlsplit
+import asyncio
+import time
 import re
 import json
-from typing import List, Dict
+from typing import List, Dict, Tuple, Iterator, Callable
 import os
+import traceback
+import pickle
 import multiprocessing
-from multiprocessing import Process, Pool
+from multiprocessing import Pool
+
+# The spider each pool process crawls with, set once by the pool initializer.
+_pool_spyder = None
+
+
+def _init_pool_worker(spyder):
+    global _pool_spyder
+    _pool_spyder = spyder._process_copy()
+
+
+def _process_celeb(celeb: Celeb) -> Tuple[Celeb, str, Dict]:
+    # Tasks carry only the celeb; the spider and its connection pool stay in the worker between tasks.
+    return _pool_spyder._process_celeb(celeb)
+
 
 class CelebSpyder():
     """
     This is a web spider class that crawls 'https://www.the-numbers.com' for top grossing celebrity film stars.
+    Progress is recorded in a crawl manifest, so a crawl can be resumed with mode='resume'
+    or cheaply re-checked with conditional requests with mode='refresh'.
     usage:
         ```
         spyder = CelebSpyder()
@@ -22,24 +56,144 @@ class CelebSpyder():
         ```
     """
 
-    def _process_chunk(self, celebs: List[Celeb]):
-        return list(map(lambda celeb: self._parse_celeb(celeb), celebs))
+    def _process_celeb(self, celeb: Celeb) -> Tuple[Celeb, str, Dict]:
+        """
+        Pool task: crawls one celeb. Errors are returned rather than raised so one bad
+        profile doesn't kill the rest of the batch.
+        @param celeb (Celeb)
+        @returns (celeb, error, metrics) where error is a formatted traceback or None,
+            and metrics is what this worker recorded since its last task.
+        """
+        try:
+            result = self._parse_celeb(celeb)
+            error = None
+        except Exception:
+            result = celeb
+            error = traceback.format_exc()
+            self._manifest.mark(CELEB, celeb.FullName, FAILED, error=error)
+        # A worker can be stopped between tasks; leave nothing it learned about the hosts unwritten.
+        self._transport.flush()
+        if self._tmdb is not None:
+            self._tmdb.flush()
+        return (result, error, self.metrics.drain())
 
     # Controller function.
-    def get_data(self, num_processes:int=0):
+    def get_data(self, num_processes:int=0, chunksize:int=1) -> List[Celeb]:
         """
         Get list of celebrity objects.
+        Celebs are handed out to a process pool one chunk at a time as workers free up,
+        so a celeb with a long filmography doesn't leave the other workers idle.
         @param num_processes (int) the number of processors to use. If '0', uses all available CPUs.
+        @param chunksize (int) the number of celebs a worker claims at a time.
+        @returns celeb_list (List[Celeb])
         """
 
         self.__log('Getting celebrity profiles...')
 
+        celeb_list: List[Celeb] = self._load_celeb_list()
+        self._start_crawl()
+
+        self.celeb_list = []
+        self.errors = []
+        celeb_list = self._skip_completed(celeb_list)
+
+        # 3. Hand out celebs to a pool of N processes.
+        if num_processes == 0:
+            num_processes = multiprocessing.cpu_count()
+        num_processes = max(1, min(num_processes, len(celeb_list)))
+
+        if len(celeb_list) > 0:
+            with Pool(processes=num_processes, initializer=_init_pool_worker, initargs=(self,)) as pool:
+                pending = len(celeb_list)
+                for celeb, error, worker_metrics in pool.imap_unordered(_process_celeb, celeb_list, chunksize=max(1, chunksize)):
+                    self.metrics.merge(worker_metrics)
+                    pending -= 1
+                    self.metrics.gauge('queue_depth', pending, stage='pool')
+                    if error is None:
+                        self.celeb_list.append(celeb)
+                        self._emit(celeb)
+                    else:
+                        self.errors.append((celeb, error))
+                        self.__log(str.format('Error parsing {0}:\n{1}', celeb.FullName, error))
+
+        self.celeb_list.sort(key=lambda celeb: celeb.Rank)
+        self._finish_crawl()
+            
+        self.__log(str.format('Completed retreiving celebrity profiles from {0}.', self._celeb_list_url))
+        return self.celeb_list
+
+    async def get_data_async(self, max_in_flight: int = 256, per_host_concurrency: int = 32) -> List[Celeb]:
+        """
+        Asyncio variant of get_data. All celebs are crawled concurrently over one pooled,
+        keep-alive client per host, so hundreds of requests can be in flight at once.
+        usage:
+            ```
+            celeb_data = asyncio.run(spyder.get_data_async())
+            ```
+        @param max_in_flight (int) the total number of requests in flight across all hosts.
+        @param per_host_concurrency (int) the number of concurrent requests per host.
+        @returns celeb_list (List[Celeb])
+        """
+        self.__log('Getting celebrity profiles...')
+
+        celeb_list: List[Celeb] = self._load_celeb_list()
+        self._start_crawl()
+
+        self.celeb_list = []
+        self.errors = []
+        celeb_list = self._skip_completed(celeb_list)
+
+        self._film_tasks = {}
+        self._film_slots = asyncio.Semaphore(self.max_film_documents)
+        self._transport.reserve(per_host_concurrency)
+        async with AsyncFetcher(per_host_concurrency=per_host_concurrency, max_in_flight=max_in_flight,
+                                transport=self._transport) as fetcher:
+            results = await asyncio.gather(*[self._parse_celeb_async(celeb, fetcher) for celeb in celeb_list], return_exceptions=True)
+
+        for celeb, result in zip(celeb_list, results):
+            if isinstance(result, Exception):
+                error = ''.join(traceback.format_exception(type(result), result, result.__traceback__))
+                self._manifest.mark(CELEB, celeb.FullName, FAILED, error=error)
+                self.errors.append((celeb, error))
+                self.__log(str.format('Error parsing {0}:\n{1}', celeb.FullName, error))
+            else:
+                self.celeb_list.append(result)
+                self._emit(result)
+
+        self.celeb_list.sort(key=lambda celeb: celeb.Rank)
+        self._finish_crawl()
+
+        self.__log(str.format('Completed retreiving celebrity profiles from {0}.', self._celeb_list_url))
+        return self.celeb_list
+
+    def _load_celeb_list(self) -> List[Celeb]:
+        """
+        Gets the celebs to crawl: the frontier if one was given, else the rows of the list page.
+        @returns celeb_list (List[Celeb])
+        """
+        if self.frontier is not None:
+            return list(self.frontier)
+        return self._load_list_page(self._celeb_list_url, self._start_page_path)
+
+    def _load_list_page(self, url: str, path: str) -> List[Celeb]:
+        """
+        Downloads a celebrity list page if it isn't already in the page store and creates a Celeb for each row.
+        @param url (str) the list page URL.
+        @param path (str) where the page may have been saved before the page store existed.
+        @returns celeb_list (List[Celeb])
+        """
         # 1. Get list of celebs from HTML.
-        if not os.path.exists(self._start_page_path):
-            html_page = self.__get_html(url=self._celeb_list_url)
-            self._start_page_path = self.__save_file(html_page, self._start_page_path)
+        html_page: str = self._pages.get(url)
+        if html_page is None:
+            if os.path.exists(path):
+                # List pages saved before the page store existed.
+                with open(path, 'r', encoding='utf-8') as file:
+                    html_page = file.read()
+            else:
+                html_page = self.__get_html(url=url)
+            self._pages.put(url, html_page)
 
-        celeb_rows_html: List[Tag] = self._parse_celeb_list_html(path=self._start_page_path)
+        celeb_rows_html: List[Tag] = self._parse_celeb_list_html(html=html_page)
 
         if len(celeb_rows_html) == 0:
             raise Exception("Error getting list of celebrities from HTML.")
@@ -50,82 +204,304 @@ class CelebSpyder():
         if len(celeb_list) == 0:
             raise Exception("Error creating list of celebrity objects.")
 
-        # 3. Split workload into N processes
-        
-        if num_processes == 0:
-            num_processes = multiprocessing.cpu_count()
+        return celeb_list
 
-        list_len = len(celeb_list) # =100
-        n = list_len//num_processes # =25
-        chunks = [celeb_list[i:i + n] for i in range(0, list_len, n)]
-        procs = [] 
-        for chunk in chunks:
-            p = Process(target=self._process_chunk, args=(chunk,))
-            procs.append(p)
-            p.start()
-
-        for proc in procs:
-            proc.join()
-        
-            
-        self.__log(str.format('Completed retreiving celebrity profiles from {0}.', self._celeb_list_url))
+    def _start_crawl(self):
+        """
+        Starts periodic metrics snapshots if requested and, in refresh mode, a new crawl generation
+        so every film is re-checked once.
+        """
+        if self.mode == 'refresh':
+            self._films.crawl_id = str(time.time())
+        if self.metrics_interval > 0 and self.metrics_path:
+            prometheus_path = os.path.splitext(self.metrics_path)[0] + '.prom'
+            self._reporter = MetricsReporter(self.metrics, self.metrics_path, self.metrics_interval, prometheus_path)
+            self._reporter.start()
+
+    def _emit(self, celeb: Celeb):
+        """
+        Writes a finished celeb to the sink.
+        """
+        with self.metrics.timer('export'):
+            self._sink.write(celeb)
+
+    def _finish_crawl(self):
+        """
+        Flushes the sink and writes the metrics summary (and any per-stage profiles) next to it.
+        Closing the transports writes their buffered rate control outcomes.
+        """
+        with self.metrics.timer('export'):
+            self._sink.close()
+        self._transport.close()
+        if self._tmdb is not None:
+            self._tmdb.close()
+        if self._reporter is not None:
+            self._reporter.stop()
+            self._reporter = None
+        if self.metrics_path:
+            self.metrics.write_summary(self.metrics_path)
+            if self.metrics.track_memory:
+                self.metrics.write_pages(os.path.join(os.path.dirname(self.metrics_path), 'memory.jsonl'))
+            if self.metrics.profile:
+                self.metrics.dump_profiles(os.path.join(os.path.dirname(self.metrics_path), 'profiles'))
+
+    def _skip_completed(self, celeb_list: List[Celeb]) -> List[Celeb]:
+        """
+        In resume mode, restores celebs the manifest has as done into celeb_list.
+        @param celeb_list (List[Celeb])
+        @returns celeb_list (List[Celeb]) the celebs that still need to be crawled.
+        """
+        if self.mode != 'resume':
+            return celeb_list
+
+        todo: List[Celeb] = []
+        for celeb in celeb_list:
+            entry: Dict = self._manifest.get(CELEB, celeb.FullName)
+            if entry and entry['status'] == DONE and entry['data']:
+                self.celeb_list.append(self._restore_celeb(celeb, entry))
+            else:
+                todo.append(celeb)
+
+        self.__log(str.format('Resuming: {0} celebs done, {1} to crawl.', len(self.celeb_list), len(todo)))
+        return todo
+
+    def _restore_celeb(self, celeb: Celeb, entry: Dict) -> Celeb:
+        """
+        Rebuilds a celeb from its last parse in the manifest, keeping the current list page fields.
+        @param celeb (Celeb) from the list page.
+        @param entry (Dict) the celeb's manifest entry.
+        @returns Celeb
+        """
+        restored: Celeb = Celeb.fromJson(entry['data'])
+        restored.Rank = celeb.Rank
+        restored.DomesticBoxOfficeRevenue = celeb.DomesticBoxOfficeRevenue
+        restored.AverageDomesticBoxOfficeRevenue = celeb.AverageDomesticBoxOfficeRevenue
+        return restored
 
     # region helper functions
 
-    def __init__(self, celeb_list_url: str, page_num: int = 1, debug: bool=False):
+    def __init__(self, celeb_list_url: str, page_num: int = 1, debug: bool=False, parser: str=None, page_store: PageStore=None,
+                 manifest: CrawlManifest=None, mode: str='full', resolver: NameResolver=None, store_candidates: int=0,
+                 sink: Sink=None, frontier: List[Celeb]=None, transport: Transport=None,
+                 imdb_url: str="https://www.imdb.com", metrics: Metrics=None, metrics_path: str='./html/metrics.json',
+                 metrics_interval: float=0, spec: ExtractionSpec=None, streaming: bool=False,
+                 max_film_documents: int=64, tmdb: TmdbSource=None):
         """
         Entry point for class. Init local vars here.
+        @param parser (str) HTML parser backend: 'lxml', 'html.parser' or None for the fastest available.
+        @param page_store (PageStore) where raw pages are cached. Defaults to './html/pages'.
+        @param manifest (CrawlManifest) where crawl progress is recorded. Defaults to './html/manifest.db'.
+        @param mode (str) 'full' re-downloads searches and profiles; 'resume' skips celebs and pages the manifest
+            has as done; 'refresh' sends conditional requests and re-parses only pages whose content changed.
+        @param resolver (NameResolver) persistent name to IMDB id index checked before searching. Defaults to './html/resolutions.db'.
+        @param store_candidates (int) the number of search matches to keep in the resolver for review.
+        @param sink (Sink) where crawled celebs are written. Defaults to JSONL celebs and roles tables in './dataset'.
+        @param frontier (List[Celeb]) celebs to crawl instead of the rows of the list page, e.g. from several list pages.
+        @param transport (Transport) sends requests: live (default, paced and retried per host by an AdaptiveTransport),
+            recording to an archive, or replaying one.
+        @param imdb_url (str) base URL for IMDB searches, profiles and films, e.g. a local stand-in server.
+        @param metrics (Metrics) per-stage latency, bytes, cache and queue metrics. Pass Metrics(profile=[...]) to cProfile stages.
+        @param metrics_path (str) where the JSON metrics summary is written when a crawl ends. None to skip it.
+        @param metrics_interval (float) seconds between snapshots (JSON and Prometheus text) during a crawl. If '0', none.
+        @param spec (ExtractionSpec) the Celeb and CelebRole fields to extract. Defaults to every field.
+            Film pages are only fetched if the spec asks for a film field.
+        @param streaming (bool) parse profiles incrementally, one filmography row at a time, instead of building
+            the whole page's tree. Keeps memory flat on profiles with hundreds of credits. Requires lxml.
+        @param max_film_documents (int) film pages a worker holds in memory at once, between download and parse.
+            Applies to the async and pipeline engines; the process pool engine holds one at a time.
+        @param tmdb (TmdbSource) takes the fields it was given from TMDB's JSON API instead of IMDB's pages.
+            Film pages are only fetched for the film fields it doesn't cover, or for films TMDB doesn't have.
         """
+        if mode not in ('full', 'resume', 'refresh'):
+            raise ValueError(str.format('Unknown crawl mode: {0}', mode))
+
         self._celeb_list_url: str = celeb_list_url
         self._start_page_path = str.format('./html/celebs_{0}.html', str(page_num))
         self.celeb_list: List[Celeb] = []
+        self.errors: List[Tuple[Celeb, str]] = []
         self.debug = debug
-        self._imdb_url = "https://www.imdb.com"
+        self._imdb_url = imdb_url.rstrip('/')
+        self._transport: Transport = transport or AdaptiveTransport(LiveTransport())
+        self.spec: ExtractionSpec = spec or ExtractionSpec()
+        self._films: FilmRegistry = FilmRegistry(fields=self.spec.film_fields)
+        self._film_extractor: FilmPageExtractor = FilmPageExtractor()
+        self._parser: ParserBackend = get_parser(parser)
+        self._pages: PageStore = page_store or PageStore()
+        self._manifest: CrawlManifest = manifest or CrawlManifest()
+        self.mode = mode
+        self._resolver: NameResolver = resolver or NameResolver()
+        self._store_candidates = store_candidates
+        self._film_tasks: Dict[str, asyncio.Future] = {}
+        self._sink: Sink = sink or get_sink('jsonl')
+        self.frontier: List[Celeb] = frontier
+        self.metrics: Metrics = metrics or Metrics()
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self._reporter: MetricsReporter = None
+        self.streaming = streaming and streaming_available()
+        self.max_film_documents = max(1, max_film_documents)
+        self._film_slots: asyncio.Semaphore = None
+        self._tmdb: TmdbSource = tmdb
+
+    def _process_copy(self) -> 'CelebSpyder':
+        """
+        Copies the spider for a worker process, leaving out what can't be shared between processes.
+        A forked worker is handed the parent's objects as they are, without pickling them, so it would share
+        the parent's open keep-alive sockets and SQLite connections; workers crawl with this copy instead.
+        @returns spyder (CelebSpyder) with its own connection pools, database handles and empty metrics.
+        """
+        return pickle.loads(pickle.dumps(self))
+
+    def __getstate__(self):
+        # Connection pools can't cross process boundaries; each process opens its own.
+        state = self.__dict__.copy()
+        # Workers crawl the celebs they're handed; the frontier and results stay with the parent.
+        state['celeb_list'] = []
+        state['errors'] = []
+        state['frontier'] = None
+        state['_film_tasks'] = {}
+        state['_reporter'] = None
+        state['_film_slots'] = None
+        return state
 
     def __log(self, msg: str):
         if self.debug:
             print(msg)
 
-    def __save_file(self, contents: str, output_path: str) -> str:
-        """
-        Writes text contents to a file path.
-        @param contents (str)
-        @param output_path (str)
-        @returns output_path (str)
-        """
-        try:
-            dirs = os.path.dirname(output_path)
-            if not os.path.exists(dirs):
-                os.makedirs(dirs, exist_ok=True)
-            with open(output_path, 'w', encoding='utf8') as output:
-                output.write(contents)
-                output.close()
-
-            return output_path
-        except Exception as e:
-            raise e
-    
     def __get_html(self, url: str, host_name: str=None) -> str:
         """
         Gets the raw HTML from a web page URL.
         @param url (str)
         @returns html (str)
         """
-        headers = {
-            'User-Agent': 'RIVA Solutions, Inc.',
-            'Accept-Encoding': 'gzip, deflate'
-        }
+        headers = {}
         
         if host_name is not None:
             headers['Host'] = host_name
         try:
-            http: PoolManager = urllib.PoolManager()
-            res: HTTPResponse = http.request('GET', url, headers=headers)
+            res: HTTPResponse = self._request(url, headers)
             html = res.data.decode('utf-8')
             return html
         except Exception as e:
             raise e
 
+    def _request(self, url: str, headers: Dict[str, str]) -> HTTPResponse:
+        """
+        Sends a GET request through the transport.
+        @param url (str)
+        @param headers (Dict[str, str]) added to the default headers.
+        @returns HTTPResponse
+        """
+        with self.metrics.timer('fetch'):
+            res: HTTPResponse = self._transport.request(url, headers)
+        self._record_response(url, res)
+        return check_status(url, res)
+
+    def _record_response(self, url: str, res: HTTPResponse):
+        host = urlsplit(url).netloc
+        self.metrics.count('http_responses', host=host, status=res.status)
+        self.metrics.count('http_bytes', len(res.data or b''), host=host)
+        retries = getattr(res, 'retries', None)
+        if retries is not None and len(retries.history) > 0:
+            self.metrics.count('http_retries', len(retries.history), host=host)
+        # Set by AdaptiveTransport when it had to retry.
+        attempts: int = getattr(res, 'attempts', 1)
+        if attempts > 1:
+            self.metrics.count('http_retries', attempts - 1, host=host)
+
+    def _page_request(self, kind: str, key: str, url: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Decides whether a page has to be requested, and with which conditional headers.
+        @param kind (str) manifest kind of the page.
+        @param key (str) manifest key of the page.
+        @param url (str)
+        @returns (cached, headers) the stored page or None, and the request headers or None if the stored page is used as is.
+        """
+        cached: str = self._pages.get(url)
+        if cached is None:
+            self.metrics.count('page_cache', kind=kind, result='miss')
+            return (None, {})
+
+        entry: Dict = self._manifest.get(kind, key)
+        if self.mode == 'refresh':
+            headers: Dict[str, str] = {}
+            if entry and entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+            self.metrics.count('page_cache', kind=kind, result='revalidate')
+            return (cached, headers)
+
+        if kind == PROFILE and self.mode == 'full':
+            self.metrics.count('page_cache', kind=kind, result='refetch')
+            return (cached, {})
+
+        self.metrics.count('page_cache', kind=kind, result='hit')
+
+        if entry is None:
+            # Cached before the manifest existed.
+            self._manifest.mark(kind, key, DONE, url=url, content_hash=self._pages.digest(url))
+        return (cached, None)
+
+    def _page_response(self, kind: str, key: str, url: str, res: HTTPResponse, cached: str) -> Tuple[str, bool]:
+        """
+        Stores a fetched page and records it in the manifest.
+        @returns (html, changed) changed is False if the server answered 304 or the content hash didn't change.
+        """
+        if res.status == 304 and cached is not None:
+            self.metrics.count('page_cache', kind=kind, result='not_modified')
+            self._manifest.mark(kind, key, DONE, url=url, fetched_at=time.time())
+            return (cached, False)
+
+        check_page(url, res)
+        html: str = res.data.decode('utf-8')
+        changed: bool = self._persist_page(kind, key, url, html, res.headers.get('ETag'), res.headers.get('Last-Modified'))
+        return (html, changed)
+
+    def _persist_page(self, kind: str, key: str, url: str, html: str, etag: str = None, last_modified: str = None) -> bool:
+        """
+        Writes a fetched page to the page store and records it in the manifest.
+        @returns changed (bool) False if the content hash is the same as last time.
+        """
+        digest: str = self._pages.put(url, html)
+        entry: Dict = self._manifest.get(kind, key)
+        changed: bool = entry is None or entry['content_hash'] != digest
+        self._manifest.mark(kind, key, DONE, url=url, fetched_at=time.time(), content_hash=digest,
+                            etag=etag, last_modified=last_modified)
+        return changed
+
+    def _get_page(self, kind: str, key: str, url: str) -> Tuple[str, bool]:
+        """
+        Gets a page through the page store and crawl manifest.
+        @param kind (str) 'profile' or 'film'.
+        @param key (str) manifest key of the page.
+        @param url (str)
+        @returns (html, changed)
+        """
+        cached, headers = self._page_request(kind, key, url)
+        if headers is None:
+            return (cached, False)
+        res: HTTPResponse = self._request(url, headers)
+        return self._page_response(kind, key, url, res, cached)
+
+    async def _get_page_async(self, kind: str, key: str, url: str, fetcher: AsyncFetcher) -> Tuple[str, bool]:
+        cached, headers = await self._off_loop(self._page_request, kind, key, url)
+        if headers is None:
+            return (cached, False)
+        with self.metrics.timer('fetch'):
+            res: HTTPResponse = await fetcher.request(url, headers)
+        self._record_response(url, res)
+        check_status(url, res)
+        return await self._off_loop(self._page_response, kind, key, url, res, cached)
+
+    async def _off_loop(self, fn: Callable, *args):
+        """
+        Runs blocking work, i.e. page store, manifest and resolver I/O or parsing, on the loop's executor
+        so the event loop keeps other celebs' requests moving meanwhile.
+        @returns what fn returns.
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
     def __trim(self, s: str) -> str:
         """
         Removes leading/trailing white space from string.
@@ -146,22 +522,26 @@ class CelebSpyder():
 
     # region HTML functions
 
-    def _parse_celeb_list_html(self, path: str) -> List[Tag]:
+    def _parse_celeb_list_html(self, path: str = None, html: str = None) -> List[Tag]:
         """
         Parses the HTML for a celebrity list page URL into a list of Celeb objects.
         @param path (str) - the file path to a local HTML page.
+        @param html (str) - the raw HTML, used instead of `path` when given.
         @returns Celeb
         """
-        self.__log(str.format('Parsing celeb list from {0}...', path))
+        source = path or self._celeb_list_url
+        self.__log(str.format('Parsing celeb list from {0}...', source))
         celeb_rows: List[Tag] = None
         try:
-            with open(path, 'r', encoding='utf-8') as html_page:
-                soup: BeautifulSoup = BeautifulSoup(html_page, 'html.parser')
-                celeb_list_container: Tag = soup.find_all('div', attrs={'id': 'page_filling_chart'})
-                celeb_rows = celeb_list_container[1].find('center').find('table').find('tbody').find_all('tr')
-                html_page.close()
-                self.__log(str.format('Parsed celeb list from {0}.', path))
-                return celeb_rows
+            if html is None:
+                with open(path, 'r', encoding='utf-8') as html_page:
+                    html = html_page.read()
+                    html_page.close()
+            soup: BeautifulSoup = self._parser.parse(html)
+            celeb_list_container: Tag = soup.find_all('div', attrs={'id': 'page_filling_chart'})
+            celeb_rows = celeb_list_container[1].find('center').find('table').find('tbody').find_all('tr')
+            self.__log(str.format('Parsed celeb list from {0}.', source))
+            return celeb_rows
         except Exception as e:
             raise e
 
@@ -181,85 +561,288 @@ class CelebSpyder():
         @returns (Celeb)
         """
 
-        filename = str.format('./JSON/{0}.json', re.sub(r'[^a-zA-Z]', '', celeb.FullName))
-        dirs = os.path.dirname(filename)
-        if not os.path.exists(dirs):
-            os.makedirs(dirs)
+        self._search_imdb(celeb)
 
-        def _export_json(celeb_obj: Celeb):
-            # Export to JSON
-            with open(filename, 'w', encoding='utf-8') as file:
-                file.write(celeb_obj.toJson(indent=4))
-                file.close()
+        previous: Dict = self._manifest.get(CELEB, celeb.FullName)
+        profile_hash: str = self._pages.digest(celeb.LocalDataSourcePath)
+        if self._profile_unchanged(previous, profile_hash):
+            # Keep the last parse of the profile and only re-check its films.
+            celeb = self._restore_celeb(celeb, previous)
+            if self.spec.needsFilms:
+                for role in celeb.Roles or []:
+                    if role.FilmUrl:
+                        self._film_details(role)
+        else:
+            self._parse_celeb_profile_html(celeb)
+            self._tmdb_celeb(celeb)
 
-        self._search_imdb(celeb)
-        self._parse_celeb_profile_html(celeb)
-        _export_json(celeb)
+        self._finish_celeb(celeb, profile_hash)
 
         self.__log(str.format('Created Celeb object for {0}.', celeb.FullName))
         return celeb
 
+    async def _parse_celeb_async(self, celeb: Celeb, fetcher: AsyncFetcher) -> Celeb:
+        """
+        Asyncio variant of _parse_celeb. Film pages for all of the celeb's roles are fetched concurrently.
+        @param celeb (Celeb)
+        @param fetcher (AsyncFetcher)
+        @returns (Celeb)
+        """
+        imdb_search_url: str = self._prepare_imdb_search(celeb)
+        celeb_url: str = await self._off_loop(self._resolved_profile_url, celeb)
+        if celeb_url is None:
+            search_results_html: str = await fetcher.fetch(imdb_search_url)
+            celeb_url = await self._off_loop(self._record_search, celeb, search_results_html)
+        celeb.LocalDataSourcePath = canonical_url(celeb_url)
+        await self._get_page_async(PROFILE, celeb.LocalDataSourcePath, celeb_url, fetcher)
+        self.__log(str.format('Retrieved IMDB HTML for {0} at {1}.', celeb.FullName, celeb.LocalDataSourcePath))
+
+        celeb, profile_hash = await self._off_loop(self._parse_stored_profile, celeb)
+
+        roles: List[CelebRole] = [role for role in celeb.Roles or [] if role.FilmUrl] if self.spec.needsFilms else []
+        film_list: List[Dict] = await asyncio.gather(*[self._film_fields_async(role, fetcher) for role in roles])
+        for role, fields in zip(roles, film_list):
+            self._films.stamp(role, fields)
+
+        await self._off_loop(self._finish_celeb, celeb, profile_hash)
+
+        self.__log(str.format('Created Celeb object for {0}.', celeb.FullName))
+        return celeb
+
+    def _parse_stored_profile(self, celeb: Celeb) -> Tuple[Celeb, str]:
+        """
+        Parses a celeb's stored profile without its films, or in refresh mode restores the last parse
+        if the profile hasn't changed.
+        @param celeb (Celeb)
+        @returns (celeb, profile_hash)
+        """
+        previous: Dict = self._manifest.get(CELEB, celeb.FullName)
+        profile_hash: str = self._pages.digest(celeb.LocalDataSourcePath)
+        if self._profile_unchanged(previous, profile_hash):
+            return (self._restore_celeb(celeb, previous), profile_hash)
+        self._parse_celeb_profile_html(celeb, fetch_films=False)
+        self._tmdb_celeb(celeb)
+        return (celeb, profile_hash)
+
+    def _profile_unchanged(self, previous: Dict, profile_hash: str) -> bool:
+        """
+        In refresh mode, checks whether a celeb's profile is the same page it was last parsed from.
+        @param previous (Dict) the celeb's manifest entry.
+        @param profile_hash (str) content hash of the stored profile.
+        @returns bool
+        """
+        return self.mode == 'refresh' and previous is not None and previous['status'] == DONE \
+            and previous['data'] is not None and previous['content_hash'] == profile_hash
+
+    def _finish_celeb(self, celeb: Celeb, profile_hash: str):
+        """
+        Records a celeb as done, along with the profile it was parsed from.
+        The celeb is written to the sink by the process collecting results.
+        """
+        self._manifest.mark(CELEB, celeb.FullName, DONE, url=celeb.DataSourceUrl, ref=celeb.LocalDataSourcePath,
+                            content_hash=profile_hash, data=celeb.toJson())
+
+    async def _film_fields_async(self, role: CelebRole, fetcher: AsyncFetcher) -> Dict:
+        """
+        Gets a role's film fields, fetching and parsing each title id at most once per crawl.
+        @param role (CelebRole)
+        @param fetcher (AsyncFetcher)
+        @returns fields (Dict)
+        """
+        tid: str = title_id(role.FilmUrl) or role.FilmUrl
+        fields: Dict = await self._off_loop(self._films.get, tid)
+        if fields is not None:
+            self.metrics.count('film_cache', result='hit')
+            return fields
+
+        task = self._film_tasks.get(tid)
+        if task is None:
+            self.metrics.count('film_cache', result='miss')
+            task = asyncio.ensure_future(self._load_film_async(tid, role, fetcher))
+            self._film_tasks[tid] = task
+        else:
+            self.metrics.count('film_cache', result='hit')
+        return await task
+
+    async def _load_film_async(self, tid: str, role: CelebRole, fetcher: AsyncFetcher) -> Dict:
+        # Caps the film pages held in memory at once, from download until their fields are parsed.
+        async with self._film_slots:
+            html_needs, tmdb_fields = self.spec.film_fields, {}
+            if self._tmdb is not None:
+                # TMDB is asked once; its answer is handed on rather than looked up again.
+                html_needs, tmdb_fields = await self._off_loop(self._film_plan, role, self.spec.film_fields)
+            page: Tuple[str, bool] = None
+            if html_needs:
+                page = await self._get_page_async(FILM, tid, role.FilmUrl, fetcher)
+            # Resolving may wait on another process's film lock and reads and writes the stores; keep it off the loop too.
+            return await self._off_loop(self._films.resolve, tid, lambda: self._load_film_page(role, html_needs, tmdb_fields, page))
+
     def _search_imdb(self, celeb: Celeb) -> Celeb:
         """
         Search IMDB by celebrity's full name if result doesn't already exist locally. 
         Return first result.
-        Saves HTML to local folder.
+        Saves HTML to the page store.
         @param celeb (Celeb)
-        @returns output_path (str)
+        @returns celeb (Celeb)
         """
-        celeb_name_clean: str = re.sub(r'\W', '', celeb.FullName)
-        output_path: str = str.format("./html/imdb_profiles/{0}.html", celeb_name_clean)
-        celeb.LocalDataSourcePath = output_path
-        dirs = os.path.dirname(output_path)
-        if not os.path.exists(dirs):
-            os.makedirs(dirs, exist_ok=True)
+        imdb_search_url: str = self._prepare_imdb_search(celeb)
 
         self.__log(str.format('Downloading HTML from IMDB for {0}...', celeb.FullName))
-        imdb_base_url: str = self._imdb_url
-        celeb_name_param: str = re.sub(r'\s', '+', celeb.FullName)
-        imdb_search_url = str.format("{0}/find?s=nm&q={1}&ref_=nv_sr_sm", imdb_base_url, celeb_name_param)
-        celeb.DataSourceUrl = imdb_search_url
-        search_results_html: str = self.__get_html(imdb_search_url)
-        soup = BeautifulSoup(search_results_html, 'html.parser')
-        celeb_url_el: List[Tag] = soup.select_one("section[data-testid='find-results-section-name'] a:first-child")
-        celeb_url = str.format("{0}{1}", imdb_base_url, celeb_url_el['href'])
-        celeb_profile_html: str = self.__get_html(celeb_url)
-        self.__save_file(celeb_profile_html, output_path)
+        with self.metrics.timer('search'):
+            celeb_url: str = self._resolved_profile_url(celeb)
+            if celeb_url is None:
+                search_results_html: str = self.__get_html(imdb_search_url)
+                celeb_url = self._record_search(celeb, search_results_html)
+        celeb.LocalDataSourcePath = canonical_url(celeb_url)
+        self._get_page(PROFILE, celeb.LocalDataSourcePath, celeb_url)
         self.__log(str.format('IMDB HTML retreived for {0}.', celeb.FullName))      
-        self.__log(str.format('Retrieved IMDB HTML for {0} at {1}.', celeb.FullName, output_path))    
+        self.__log(str.format('Retrieved IMDB HTML for {0} at {1}.', celeb.FullName, celeb.LocalDataSourcePath))    
         return celeb
 
-    def _parse_celeb_profile_html(self, celeb: Celeb) -> Celeb:
+    def _prepare_imdb_search(self, celeb: Celeb) -> str:
+        """
+        Sets the IMDB search URL for a celeb.
+        @param celeb (Celeb)
+        @returns imdb_search_url (str)
+        """
+        celeb_name_param: str = re.sub(r'\s', '+', celeb.FullName)
+        imdb_search_url = str.format("{0}/find?s=nm&q={1}&ref_=nv_sr_sm", self._imdb_url, celeb_name_param)
+        celeb.DataSourceUrl = imdb_search_url
+        return imdb_search_url
+
+    def _resolved_profile_url(self, celeb: Celeb) -> str:
+        """
+        Gets the profile URL for a celeb's name from the resolution index or, outside of full crawls,
+        from an earlier run's manifest.
+        @param celeb (Celeb)
+        @returns celeb_url (str) or None if the name has to be searched.
+        """
+        resolution: Dict = self._resolver.lookup(celeb.FullName)
+        if resolution:
+            self.metrics.count('resolver', result='hit')
+            return str.format('{0}/name/{1}/', self._imdb_url, resolution['person_id'])
+
+        if self.mode != 'full':
+            entry: Dict = self._manifest.get(SEARCH, celeb.FullName)
+            if entry and entry['status'] == DONE and entry['ref']:
+                self.metrics.count('resolver', result='manifest')
+                return entry['ref']
+        self.metrics.count('resolver', result='miss')
+        return None
+
+    def _record_search(self, celeb: Celeb, search_results_html: str) -> str:
+        """
+        Parses a search results page and records the resolved profile URL in the resolution index and manifest.
+        @param celeb (Celeb)
+        @param search_results_html (str)
+        @returns celeb_url (str)
+        """
+        # The page is parsed once; the first name result is the profile.
+        results: List[Tuple[str, str]] = self._parse_imdb_search_candidates(search_results_html)
+        if len(results) == 0:
+            raise Exception(str.format('No IMDB name results for {0}.', celeb.FullName))
+        celeb_url: str = results[0][0]
+
+        # Exact name matches are trusted; anything else is kept at lower confidence.
+        candidates: List[Tuple[str, str, float]] = []
+        for rank, (url, label) in enumerate(results):
+            match = 1.0 if name_key(label) == name_key(celeb.FullName) else 0.5
+            candidates.append((url, label, match / (1 + rank)))
+        chosen = [c for c in candidates if person_id(c[0]) == person_id(celeb_url)]
+        confidence = chosen[0][2] if len(chosen) > 0 else 0.5
+        self._resolver.store(celeb.FullName, celeb_url, confidence=confidence, source='search',
+                             candidates=candidates[:self._store_candidates])
+
+        self._manifest.mark(SEARCH, celeb.FullName, DONE, url=celeb.DataSourceUrl, fetched_at=time.time(), ref=celeb_url)
+        return celeb_url
+
+    def _parse_imdb_search_html(self, search_results_html: str) -> str:
+        """
+        Returns the URL of the first name result on an IMDB search page.
+        @param search_results_html (str)
+        @returns celeb_url (str) or None if the page has no name results.
+        """
+        candidates: List[Tuple[str, str]] = self._parse_imdb_search_candidates(search_results_html)
+        return candidates[0][0] if len(candidates) > 0 else None
+
+    def _parse_imdb_search_candidates(self, search_results_html: str) -> List[Tuple[str, str]]:
+        """
+        Returns every name result on an IMDB search page.
+        @param search_results_html (str)
+        @returns candidates (List[Tuple[str, str]]) (profile URL, label) pairs in result order.
+        """
+        soup = self._parser.parse(search_results_html)
+        candidates: List[Tuple[str, str]] = []
+        seen = set()
+        for a in soup.select("section[data-testid='find-results-section-name'] a[href*='/name/']"):
+            pid = person_id(a['href'])
+            if pid and pid not in seen:
+                seen.add(pid)
+                candidates.append((str.format("{0}{1}", self._imdb_url, a['href']), self.__trim(a.text)))
+        return candidates
+
+    def _parse_celeb_profile_html(self, celeb: Celeb, fetch_films: bool = True, profile_html: str = None) -> Celeb:
         """
         Parses the HTML for a celebrity profile page URL into an instance of Celeb.
         @param celeb (Celeb)
-        @param profile_html (str)
+        @param fetch_films (bool) if False, roles only get the fields on the profile row and film pages are left to the caller.
+        @param profile_html (str) the raw profile. Read from the page store if not given.
         @returns Celeb
         """
-        with open(celeb.LocalDataSourcePath, 'r', encoding='utf-8') as profile_html:    
-            soup = BeautifulSoup(profile_html, 'html.parser')
+        # LocalDataSourcePath is the profile's key in the page store.
+        if profile_html is None:
+            profile_html = self._pages.get(celeb.LocalDataSourcePath)
+        if profile_html is None:
+            raise Exception(str.format("No IMDB profile stored for {0}.", celeb.FullName))
+
+        with self.metrics.timer('parse_profile'), self.metrics.memory('parse_profile', celeb.LocalDataSourcePath, len(profile_html)):
+            if self.streaming:
+                self._parse_profile_streaming(celeb, profile_html)
+            else:
+                self._parse_profile_fields(celeb, profile_html)
+
+        # Film pages are fetched after the profile is parsed, so each stage is timed on its own.
+        if fetch_films and self.spec.needsFilms:
+            for role in celeb.Roles:
+                if role.FilmUrl:
+                    self._film_details(role)
+
+        self.__log(str.format('Parsed HTML profile for {0}.', celeb.FullName))
+
+        return celeb
+
+    def _parse_profile_fields(self, celeb: Celeb, profile_html: str):
+        """
+        Parses a profile page's celeb fields and filmography rows, without film details.
+        Only the fields in the spider's spec are extracted.
+        @param celeb (Celeb)
+        @param profile_html (str)
+        """
+        soup = self._parser.parse(profile_html)
+        spec: ExtractionSpec = self.spec
 
-            # Photo Url
-            img: Tag = soup.select_one("img#name-poster")
-            if img:
-                celeb.PhotoUrl = img['src']
+        # Photo Url
+        img: Tag = soup.select_one("img#name-poster") if spec.wants('PhotoUrl') else None
+        if img:
+            celeb.PhotoUrl = img['src']
 
-            # Date of Birth
-            dob: Tag = soup.select_one("div#name-born-info > time")
-            if dob:
-                celeb.DOB = dob['datetime']
+        # Date of Birth
+        dob: Tag = soup.select_one("div#name-born-info > time") if spec.wants('DOB') else None
+        if dob:
+            celeb.DOB = dob['datetime']
 
-            # Born in
-            born_in: Tag = soup.select_one("div#name-born-info > a")
-            if born_in:
-                celeb.BornIn = born_in.text
+        # Born in
+        born_in: Tag = soup.select_one("div#name-born-info > a") if spec.wants('BornIn') else None
+        if born_in:
+            celeb.BornIn = born_in.text
 
-            # Date of Death
-            dod: Tag = soup.select_one("div#name-death-info > time")
-            if dod:
-                celeb.DOD = dod['datetime']
+        # Date of Death
+        dod: Tag = soup.select_one("div#name-death-info > time") if spec.wants('DOD') else None
+        if dod:
+            celeb.DOD = dod['datetime']
 
-            # Gender
+        # Gender
+        if spec.wants('Gender'):
             actor = soup.select_one("a[href='#actor']")
             actress = soup.select_one("a[href='#actress']")
             if actor:
@@ -267,63 +850,238 @@ class CelebSpyder():
             elif actress:
                 celeb.Gender = 'Female'
 
-            # Height
-            height: Tag = soup.select_one("div#details-height")
-            if height:
-                ht = self.__trim( height.text )
-                htm: List[str] = re.findall(r'\(\d\.\d+\sm\)', ht)
-                if len(htm) > 0:
-                    celeb.Height = float(re.sub(r'[^0-9\.]', '', htm[0]))
-
-            # Atrological Sign
-            sign = soup.select_one("div#dyk-star-sign > a")
-            if sign:
-                celeb.AstrologicalSign = self.__trim( sign.text )
-
-            # Trademark
-            trademark = soup.select_one("div#dyk-trademark")
-            if trademark:
-                tm = re.findall(r'(?<=\</h4\>)(.*)(?=\<span)', str(trademark).replace('\n', ''))
-                if len(tm) > 0:
-                    celeb.Trademark = self.__trim( tm[0] )
-            
-            # Awards
+        # Height
+        height: Tag = soup.select_one("div#details-height") if spec.wants('Height') else None
+        if height:
+            ht = self.__trim( height.text )
+            htm: List[str] = re.findall(r'\(\d\.\d+\sm\)', ht)
+            if len(htm) > 0:
+                celeb.Height = float(re.sub(r'[^0-9\.]', '', htm[0]))
+
+        # Atrological Sign
+        sign = soup.select_one("div#dyk-star-sign > a") if spec.wants('AstrologicalSign') else None
+        if sign:
+            celeb.AstrologicalSign = self.__trim( sign.text )
+
+        # Trademark
+        trademark = soup.select_one("div#dyk-trademark") if spec.wants('Trademark') else None
+        if trademark:
+            h4: Tag = trademark.find('h4')
+            if h4 and trademark.find('span'):
+                celeb.Trademark = self.__trim( sibling_text(h4, 'span') )
+        
+        # Awards
+        awards: List[Tag] = []
+        if spec.wants('AwardsWins') or spec.wants('AwardNominations'):
             awards = [span for span in soup.select("span.awards-blurb") if re.search(r'(wins|nominations)', span.text)]
-            if len(awards) > 0:
-                wins = re.findall(r'\d+(?=\swins)', awards[0].text)
-                if len(wins) > 0:
-                    celeb.AwardsWins = int(wins[0])
+        if len(awards) > 0:
+            wins = re.findall(r'\d+(?=\swins)', awards[0].text)
+            if len(wins) > 0 and spec.wants('AwardsWins'):
+                celeb.AwardsWins = int(wins[0])
 
-                nominations = re.findall(r'\d+(?=\snominations)', awards[0].text)
-                if len(nominations) > 0:
-                    celeb.AwardNominations = int(nominations[0])
+            nominations = re.findall(r'\d+(?=\snominations)', awards[0].text)
+            if len(nominations) > 0 and spec.wants('AwardNominations'):
+                celeb.AwardNominations = int(nominations[0])
 
-            # Roles
+        # Roles
+        if spec.needsRoles:
             celeb.Roles = []
             for row in soup.select("div#filmography div.filmo-row"):
-                celeb.Roles.append(self._parse_film_html(row))
+                celeb.Roles.append(self._parse_film_html(row, fetch_details=False))
 
-            # celeb.Roles = list(map(lambda row: self._parse_film_html(row), soup.select("div#filmography div.filmo-row"))) 
+        # celeb.Roles = list(map(lambda row: self._parse_film_html(row), soup.select("div#filmography div.filmo-row"))) 
 
-            self.__log(str.format('Parsed HTML profile for {0}.', celeb.FullName))
-            profile_html.close()
-            
+        # The tree's parent/child links are cycles; break them so it's freed now rather than at the next GC pass.
+        soup.decompose()
+
+    def _parse_profile_streaming(self, celeb: Celeb, profile_html: str):
+        """
+        Streaming variant of _parse_profile_fields: filmography rows are parsed one at a time as the page
+        streams through lxml's pull parser, then the celeb fields are read from the few header elements kept.
+        @param celeb (Celeb)
+        @param profile_html (str)
+        """
+        stream = ProfileStream(profile_html)
+        roles: List[CelebRole] = list(self._stream_roles(stream)) if self.spec.needsRoles else None
+        self._parse_profile_fields(celeb, stream.header())
+        if roles is not None:
+            celeb.Roles = roles
+
+    def _stream_roles(self, stream: ProfileStream) -> Iterator[CelebRole]:
+        """
+        Yields a CelebRole per filmography row, releasing each row's tree as soon as its fields are read.
+        @param stream (ProfileStream)
+        """
+        for row_html in stream.rows():
+            soup = self._parser.parse(row_html)
+            row: Tag = soup.select_one("div.filmo-row")
+            role: CelebRole = self._parse_film_row(row) if row else None
+            soup.decompose()
+            if role is not None:
+                yield role
+
+    def _parse_film_html(self, row: Tag, fetch_details: bool = True) -> CelebRole:
+        """
+        Parses a filmography row and, if requested, the film's IMDB page into a CelebRole.
+        @param row (Tag) a 'div.filmo-row' from a profile page.
+        @param fetch_details (bool) download (if not cached) and parse the film page.
+        @returns CelebRole
+        """
+        role = self._parse_film_row(row)
+        if role.FilmUrl is None or not fetch_details:
+            return role
+
+        return self._film_details(role)
+
+    def load_film_details(self, roles: List[CelebRole], fields: List[str] = None, workers: int = 8) -> List[CelebRole]:
+        """
+        Fetches (if not cached) and parses the film pages of some roles on demand, e.g. for a sample of
+        the roles from a crawl whose spec skipped film pages.
+        @param roles (List[CelebRole]) roles with a FilmUrl.
+        @param fields (List[str]) the film fields to load. If None, all of them.
+        @param workers (int) film pages fetched at once.
+        @returns roles (List[CelebRole]) the same roles, stamped with their film fields.
+        """
+        needs: frozenset = frozenset(FILM_FIELDS if fields is None else fields)
+        unknown: List[str] = [f for f in needs if f not in FILM_FIELDS]
+        if unknown:
+            raise ValueError(str.format('Not film fields: {0}', ', '.join(unknown)))
+
+        todo: List[CelebRole] = [role for role in roles if role.FilmUrl]
+        self._transport.reserve(workers)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(lambda role: self._film_details(role, needs), todo))
+        return roles
+
+    def _film_details(self, role: CelebRole, needs: frozenset = None) -> CelebRole:
+        """
+        Stamps a role with its film's fields.
+        Film details are fetched and parsed once per title id, then shared by every role in the crawl.
+        @param role (CelebRole)
+        @param needs (frozenset) the film fields to load. If None, those in the spider's spec.
+        @returns CelebRole
+        """
+        tid: str = title_id(role.FilmUrl) or role.FilmUrl
+        needs = self.spec.film_fields if needs is None else needs
+        loaded: List[bool] = []
+
+        def load() -> Dict:
+            loaded.append(True)
+            return self._load_film(role, needs=needs)
+
+        with self.metrics.timer('film'):
+            fields: Dict = self._films.resolve(tid, load, needs)
+        self.metrics.count('film_cache', result='miss' if loaded else 'hit')
+        if not needs.issuperset(FILM_FIELDS):
+            # The cached parse may hold more fields than were asked for.
+            fields = {key: value for key, value in fields.items() if key in needs}
+        return self._films.stamp(role, fields)
+
+    def _load_film(self, role: CelebRole, page: Tuple[str, bool] = None, needs: frozenset = None) -> Dict:
+        """
+        Downloads (if needed) and parses a role's film page. If the page hasn't changed since
+        it was last parsed, the previous fields are reused.
+        @param role (CelebRole)
+        @param page (Tuple[str, bool]) the (html, changed) page if it was already fetched.
+        @param needs (frozenset) the film fields to parse. If None, those in the spider's spec.
+        @returns fields (Dict) the film-level fields.
+        """
+        self.__log(str.format("Parsing Film Details for {0}...", role.FilmTitle))
+
+        html_needs, tmdb_fields = self._film_plan(role, self.spec.film_fields if needs is None else needs)
+        return self._load_film_page(role, html_needs, tmdb_fields, page)
+
+    def _film_plan(self, role: CelebRole, needs: frozenset) -> Tuple[frozenset, Dict]:
+        """
+        Takes the film fields TMDB covers from TMDB, and works out which are left for the film page.
+        @param role (CelebRole)
+        @param needs (frozenset) the film fields to load.
+        @returns (html_needs, tmdb_fields) the fields to parse from the film page, and the fields TMDB filled.
+        """
+        html_needs, tmdb_needs = self._film_sources(needs)
+        tmdb_fields: Dict = self._tmdb_film(role, tmdb_needs) if tmdb_needs else {}
+        if tmdb_fields is None:
+            # TMDB doesn't have the film; its page is parsed for every field.
+            return needs, {}
+        return html_needs, tmdb_fields
+
+    def _load_film_page(self, role: CelebRole, html_needs: frozenset, tmdb_fields: Dict, page: Tuple[str, bool] = None) -> Dict:
+        """
+        Downloads (if needed) and parses a role's film page for the fields TMDB didn't fill.
+        @param role (CelebRole)
+        @param html_needs (frozenset) the film fields to parse from the page. If empty, the page isn't fetched.
+        @param tmdb_fields (Dict) the fields taken from TMDB, merged into the result.
+        @param page (Tuple[str, bool]) the (html, changed) page if it was already fetched.
+        @returns fields (Dict) the film-level fields.
+        """
+        if not html_needs:
+            return tmdb_fields
+
+        # Get film details from IMDB URL       
+        tid: str = title_id(role.FilmUrl) or role.FilmUrl
+        film_html, changed = page or self._get_page(FILM, tid, role.FilmUrl)
+
+        if not changed:
+            previous: Dict = self._films.get(tid, any_crawl=True, needs=html_needs)
+            if previous is not None:
+                if self._tmdb is None:
+                    return previous
+                return dict({key: value for key, value in previous.items() if key in html_needs}, **tmdb_fields)
+
+        film = CelebRole()
+        film.FilmTitle = role.FilmTitle
+        film.FilmUrl = role.FilmUrl
+        fields: Dict = film_fields(self._parse_film_page(film, film_html, html_needs))
+        fields.update(tmdb_fields)
+        return fields
+
+    def _film_sources(self, needs: frozenset) -> Tuple[frozenset, frozenset]:
+        """
+        Splits the film fields to load between the film page and TMDB.
+        @param needs (frozenset)
+        @returns (html_needs, tmdb_needs) the fields parsed from the film page, and those taken from TMDB.
+        """
+        if self._tmdb is None:
+            return needs, frozenset()
+        tmdb_needs: frozenset = needs & self._tmdb.film_fields
+        return needs - tmdb_needs, tmdb_needs
+
+    def _tmdb_film(self, role: CelebRole, needs: frozenset) -> Dict:
+        """
+        Gets a role's film fields from TMDB.
+        @returns fields (Dict) or None if TMDB doesn't have the film.
+        """
+        with self.metrics.timer('tmdb_film'):
+            return self._tmdb.film(role, needs)
+
+    def _tmdb_celeb(self, celeb: Celeb) -> Celeb:
+        """
+        Overwrites the profile fields parsed from IMDB with TMDB's, for the fields taken from TMDB.
+        @param celeb (Celeb) a celeb whose profile has been parsed.
+        @returns Celeb
+        """
+        fields: frozenset = self._tmdb.celeb_fields & self.spec.celeb_fields if self._tmdb else frozenset()
+        if fields:
+            with self.metrics.timer('tmdb_celeb'):
+                self._tmdb.fill_celeb(celeb, fields)
         return celeb
 
-    def _parse_film_html(self, row: Tag) -> CelebRole:
+    def _parse_film_row(self, row: Tag) -> CelebRole:
+        """
+        Parses the role fields found on a profile's filmography row.
+        @param row (Tag)
+        @returns CelebRole
+        """
         role = CelebRole()
 
         # CharacterName
-        # Use Regex look behind and look ahead to get all characters between <br/> and <div>
-        role_el = re.findall(r'(?<=\<br/\>)(.*)(?=\<)', str(row).replace('\n', ''))
-        if len(role_el) > 0:
-            role_name = role_el[0]
-            if len(re.findall(r'\<div', role_name)) > 0:
-                role_name = role_name.split('<div')[0]          
-            role.CharacterName = self.__trim(role_name)
+        # All text between <br/> and the next <div>
+        br: Tag = row.find('br') if self.spec.wantsRole('CharacterName') else None
+        if br:
+            role.CharacterName = self.__trim(sibling_text(br, 'div'))
 
         # Year
-        yr: Tag = row.select_one("span.year_column")
+        yr: Tag = row.select_one("span.year_column") if self.spec.wantsRole('Year') else None
         if yr:
             role.Year = self.__trim(yr.text)
 
@@ -333,138 +1091,37 @@ class CelebSpyder():
             return role
 
         role.FilmTitle = self.__trim( title.text )
-        self.__log(str.format("Parsing Film Details for {0}...", role.FilmTitle))
 
         # FilmUrl
         role.FilmUrl = str.format("{0}{1}", self._imdb_url, self.__trim(title['href']))
+        return role
 
-        # Get film details from IMDB URL       
-        film_path = str.format('./html/imdb_films/{0}.html', re.sub(r'[^a-zA-Z0-9]', '', role.FilmTitle))
-
-        if not os.path.exists(film_path):
-            film_html = self.__get_html(role.FilmUrl)
-            self.__save_file(film_html, film_path)
-        
-        with open(film_path, 'r', encoding='utf-8') as html:
-            soup = BeautifulSoup(html, 'html.parser')
-            role.Directors = []
-            role.Writers = []
-            role.Stars = []
-            role.Genres = []
-            role.ProductionCompanies = []
-            role.PlotKeywords = []
-
-            for item in soup.select("div.plot_summary div.credit_summary_item"):
-                h4 = item.select_one("h4")
-
-                # Directors
-                if h4 and re.search(r'^Director', h4.text):
-                    for director in item.select("a"):
-                        if director.text not in role.Directors and not re.search(r'^\d+\smore', director.text):
-                            role.Directors.append(director.text)
-                # Writers
-                elif h4 and re.search(r'^Writer', h4.text):
-                    for writer in item.select("a"):
-                        if writer.text not in role.Writers and not re.search(r'^\d+\smore', writer.text):
-                            role.Writers.append(writer.text)
-                # Stars
-                elif h4 and re.search(r'^Star', h4.text):
-                    for star in item.select("a"):
-                        if not re.search(r'^See\s', star.text) and star.text not in role.Stars:
-                            role.Stars.append(star.text)
-
-                # Metascore
-                metascore = soup.select_one("div.metacriticScore > span")
-                if metascore:
-                    role.Metascore = int(metascore.text)
-            
-                for review in soup.select("div.titleReviewBarItem span.subText > a"):
-                # UserReviews
-                    if re.search(r'\d+\suser', review.text):
-                        role.UserReviews = int(re.sub(r'\D', '', review.text))
-
-                # CriticReviews
-                    if re.search(r'\d+\scritic', review.text):
-                        role.CriticReviews = int(re.sub(r'\D', '', review.text))
-
-                # Popularity
-                for item in soup.select("div.titleReviewBarSubItem"):
-                    for div in item.select("div"):
-                        if re.search(r'Popularity', div.text):
-                            popularity = item.select_one("div span.subText")
-                            if popularity:
-                                role.Popularity = int(re.sub(r'\D', '', re.findall(r'\d+\n', popularity.text)[0] ))
-                
-                # PlotKeywords
-                for item in soup.select("div#titleStoryLine > div > a > span.itemprop"):
-                    kw = re.sub(r'\s+', ' ', re.sub(r'(\n)', '', item.text))
-                    if kw not in role.PlotKeywords:
-                        role.PlotKeywords.append(kw)
-
-                # Genres
-                for item in soup.select("div#titleStoryLine > div"):
-                    h4 = item.select_one("h4")
-                    if h4 and re.search(r'Genre', h4.text):
-                        for genre in item.select("a"):
-                            ge = re.sub(r'(^\s+|\s+$)', '', genre.text)
-                            if ge not in role.Genres:
-                                role.Genres.append(ge)
-                # MotionPictureRating
-                    elif h4 and re.search(r'^Motion Picture Rating', h4.text):
-                        rating = item.select_one("span")
-                        if rating:
-                            role.MotionPictureRating = rating.text
-
-                # ReleaseDate
-                for item in soup.select("div#titleDetails > div"):
-                    h4 = item.select_one("h4")
-                    if h4 and re.search(r'^Release Date', h4.text):
-                        release_date = re.findall(r'\d{1,2}\s.*\s\d{4}', item.text)
-                        if len(release_date) > 0:
-                            role.ReleaseDate = release_date[0]
-                # Budget
-                    elif h4 and re.search(r'^Budget', h4.text):
-                        budget = re.findall(r'[\$0-9,]+', item.text)
-                        role.Budget = int(re.sub(r'[^0-9]', '', budget[0]))
-                # OpeningWeekend
-                    elif h4 and re.search(r'^Opening Weekend', h4.text):
-                        opening = re.findall(r'[\$0-9,]+', item.text)
-                        role.OpeningWeekend = int(re.sub(r'[^0-9]', '', opening[0]))
-                # Gross
-                    elif h4 and re.search(r'^Gross', h4.text):
-                        gross = re.findall(r'[\$0-9,]+', item.text)
-                        role.Gross = int(re.sub(r'[^0-9]', '', gross[0]))
-                # CumulativeWorldwideGross
-                    elif h4 and re.search(r'^Cumulative Worldwide Gross', h4.text):
-                        cumlative = re.findall(r'[\$0-9,]+', item.text)
-                        role.CumulativeWorldwideGross = int(re.sub(r'[^0-9]', '', cumlative[0])) 
-                # ProductionCompanies
-                    elif h4 and re.findall(r'^Production Co', h4.text):
-                        for a in item.select("a"):
-                            if not re.search(r'^See\s', a.text):
-                                pc = re.sub(r'(^\s+|\s+$)', '', a.text)
-                                if pc not in role.ProductionCompanies:
-                                    role.ProductionCompanies.append(pc)
-                # RuntimeMinutes
-                    elif h4 and re.findall(r'^Runtime', h4.text):
-                        runtime = item.select_one("time")
-                        if runtime:
-                            role.RuntimeMinutes = int(re.sub(r'[^0-9]', '', runtime.text))
-            html.close()
+    def _parse_film_page(self, role: CelebRole, film_html: str = None, needs: frozenset = None) -> CelebRole:
+        """
+        Parses an IMDB film page into the film fields of a CelebRole.
+        @param role (CelebRole)
+        @param film_html (str) the raw page. Read from the page store if not given.
+        @param needs (frozenset) the film fields to parse. If None, those in the spider's spec.
+        @returns CelebRole
+        """
+        if film_html is None:
+            film_html = self._pages.get(role.FilmUrl)
+        needs = self.spec.film_fields if needs is None else needs
+        with self.metrics.timer('parse_film'), self.metrics.memory('parse_film', role.FilmUrl, len(film_html)):
+            soup = self._parser.parse(film_html)
+            self._film_extractor.extract(soup, role, None if needs.issuperset(FILM_FIELDS) else needs)
+            soup.decompose()
 
         self.__log(str.format("Parsed Film Details for {0}.", role.FilmTitle))
 
         return role
-    # end (def _parse_film_html())
+    # end (def _parse_film_page())
      
 
     # endregion
 
 # Get first 5 pages of celebrities
 if __name__ == '__main__':
-    start_url="https://www.the-numbers.com/box-office-star-records/domestic/lifetime-acting/top-grossing-leading-stars"
-    for page_num in range(0, 2):
-        url = start_url if page_num < 1 else str.format('{0}/{1}01', start_url, page_num)
-        print(url)
-        spyder = CelebSpyder(celeb_list_url=url, page_num=page_num, debug=True)
-        spyder.get_data()
\ No newline at end of file
+    from orchestrator import CrawlOrchestrator
+    orchestrator = CrawlOrchestrator(pages=range(0, 2), debug=True)
+    orchestrator.run()
@@ -0,0 +1,109 @@
+"""
+Local HTTP server for end-to-end benchmarks. Serves a list page at '/list' and IMDB-shaped
+search, profile and film pages generated by benchmarks.fixtures, so a full crawl runs with no network.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from benchmarks import fixtures
+from typing import List, Dict
+import threading
+import re
+
+_name_re = re.compile(r'^/name/(nm\d+)/?$')
+_title_re = re.compile(r'^/title/(tt\d+)/?$')
+
+
+class FixtureServer():
+    """
+    usage:
+        ```
+        with FixtureServer(names) as server:
+            spyder = CelebSpyder(server.url + '/list')
+            spyder._imdb_url = server.url
+        ```
+    """
+
+    def __init__(self, names: List[str], roles: int = 30, film_pool: int = 500, list_html: str = None):
+        """
+        @param names (List[str]) celebs on the list page.
+        @param roles (int) filmography rows per profile.
+        @param film_pool (int) distinct films shared by all profiles.
+        @param list_html (str) list page to serve instead of a generated one.
+        """
+        self.names = names
+        self.roles = roles
+        self.film_pool = film_pool
+        self.list_html = list_html or fixtures.list_page(names)
+        self._people: Dict[str, str] = {fixtures.person_id_for(name): name for name in names}
+        self.hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer = None
+        self.url: str = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def page(self, path: str, query: Dict[str, List[str]]) -> str:
+        """
+        @returns html (str) the page for a request path, or None for a 404.
+        """
+        if path == '/list':
+            return self.list_html
+        if path == '/find':
+            name = query.get('q', [''])[0]
+            return fixtures.search_page(name, fixtures.person_id_for(name))
+        m = _name_re.match(path)
+        if m:
+            pid = m.group(1)
+            name = self._people.get(pid, pid)
+            return fixtures.profile_page(name, fixtures.films_for(pid, self.roles, self.film_pool), deceased=int(pid[2:]) % 7 == 0)
+        m = _title_re.match(path)
+        if m:
+            tid = m.group(1)
+            return fixtures.film_page(tid, str.format('Film {0}', int(tid[2:])))
+        return None
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def start(self) -> str:
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                html = fixture.page(parts.path, parse_qs(parts.query))
+                fixture._count(parts.path.split('/')[1] or 'root')
+                if html is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = html.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = str.format('http://127.0.0.1:{0}', self._server.server_address[1])
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,154 @@
+"""
+Synthetic fixture pages shaped like the pages the spider parses: the-numbers.com list page,
+IMDB search results, profiles and film pages. Pages are generated deterministically from a
+name or title id, so every run parses identical input.
+"""
+from typing import List, Tuple
+import random
+import zlib
+import os
+
+RECORDED_LIST_PAGE = './html/celebs_1.html'
+
+_FIRST = ['Tom', 'Ralph', 'Scarlett', 'Samuel', 'Meryl', 'Morgan', 'Cate', 'Denzel', 'Julia', 'Harrison',
+          'Emma', 'Robert', 'Viola', 'Keanu', 'Natalie', 'Idris', 'Sandra', 'Hugh', 'Zoe', 'Jeff']
+_LAST = ['Hanks', 'Fiennes', 'Johansson', 'Jackson', 'Streep', 'Freeman', 'Blanchett', 'Washington', 'Roberts',
+         'Ford', 'Stone', 'Downey', 'Davis', 'Reeves', 'Portman', 'Elba', 'Bullock', 'Jackman', 'Saldana', 'Bridges']
+_GENRES = ['Drama', 'Crime', 'Action', 'Comedy', 'Thriller', 'Romance', 'Sci-Fi', 'Adventure', 'Horror', 'Fantasy']
+_KEYWORDS = ['heist', 'new york', 'revenge', 'friendship', 'prison', 'time travel', 'family', 'betrayal', 'war', 'escape']
+_COMPANIES = ['Castle Rock', 'Warner Bros.', 'Universal Pictures', 'Paramount', 'Miramax', 'Legendary', 'A24']
+_RATINGS = ['Rated R for violence', 'Rated PG-13 for language', 'Rated PG for some peril', 'Rated R for language']
+
+
+def celeb_names(count: int) -> List[str]:
+    """
+    @param count (int)
+    @returns names (List[str]) distinct, deterministic names.
+    """
+    names: List[str] = []
+    for i in range(count):
+        name = str.format('{0} {1}', _FIRST[i % len(_FIRST)], _LAST[(i // len(_FIRST)) % len(_LAST)])
+        if i >= len(_FIRST) * len(_LAST):
+            name = str.format('{0} {1}', name, i // (len(_FIRST) * len(_LAST)) + 1)
+        names.append(name)
+    return names
+
+
+def person_id_for(name: str) -> str:
+    return str.format('nm{0:07d}', zlib.crc32(name.encode('utf-8')) % 10000000)
+
+
+def title_id_for(index: int) -> str:
+    return str.format('tt{0:07d}', index)
+
+
+def films_for(pid: str, roles: int, film_pool: int) -> List[Tuple[str, str]]:
+    """
+    Picks a profile's films from a shared pool, so celebs share films the way co-stars do.
+    @param pid (str) person id, seeds the choice.
+    @param roles (int) the number of filmography rows.
+    @param film_pool (int) the number of distinct films across all profiles.
+    @returns films (List[Tuple[str, str]]) (title id, title) pairs.
+    """
+    rng = random.Random(pid)
+    picks = rng.sample(range(1, film_pool + 1), min(roles, film_pool))
+    return [(title_id_for(i), str.format('Film {0}', i)) for i in picks]
+
+
+def list_page(names: List[str], start_rank: int = 1) -> str:
+    """
+    A the-numbers.com top grossing stars page.
+    """
+    rows = ''.join(str.format(
+        '<tr><td class="data">{0}</td><td><b><a href="/person/{1}">{2}</a></b></td>'
+        '<td class="data">${3:,}</td><td class="data">{4}</td><td class="data">${5:,}</td></tr>\n',
+        start_rank + i, person_id_for(name), name, 5000000000 - 1000000 * i, 40 + i % 30, 90000000 - 100000 * i)
+        for i, name in enumerate(names))
+    return str.format(
+        '<html><head><title>Top Grossing Stars</title></head><body>'
+        '<div id="page_filling_chart"><p>Box office records</p></div>'
+        '<div id="page_filling_chart"><center><table><thead><tr><th>Rank</th><th>Name</th><th>Domestic Box Office</th>'
+        '<th>Movies</th><th>Average</th></tr></thead><tbody>\n{0}</tbody></table></center></div></body></html>', rows)
+
+
+def search_page(name: str, pid: str, others: int = 4) -> str:
+    """
+    An IMDB search results page with the celeb first, followed by other name matches.
+    """
+    results = [str.format('<li class="find-result-item"><a href="/name/{0}/?ref_=fn_al_nm_1">{1}</a></li>', pid, name)]
+    for i in range(others):
+        results.append(str.format('<li class="find-result-item"><a href="/name/nm9{0:06d}/?ref_=fn_al_nm_{1}">{2} ({1})</a></li>',
+                                  zlib.crc32(str.format('{0}{1}', name, i).encode('utf-8')) % 1000000, i + 2, name))
+    return str.format(
+        '<html><body><h1>Results for "{0}"</h1><section data-testid="find-results-section-name">'
+        '<h3>People</h3><ul>{1}</ul></section><section data-testid="find-results-section-title"><ul>'
+        '<li><a href="/title/tt0000001/">{0}: The Movie</a></li></ul></section></body></html>', name, ''.join(results))
+
+
+def profile_page(name: str, films: List[Tuple[str, str]], deceased: bool = False) -> str:
+    """
+    An IMDB profile with a filmography row per film.
+    """
+    rows = ''.join(str.format(
+        '<div class="filmo-row {0}" id="actor-{1}">\n<span class="year_column">&nbsp;{2}</span>\n'
+        '<b><a href="/title/{1}/">{3}</a></b>\n<br/>\nCharacter {4}\n<div class="filmo-episodes">Episode list</div>\n</div>\n',
+        'odd' if i % 2 else 'even', tid, 1980 + i % 40, title, i)
+        for i, (tid, title) in enumerate(films))
+    death = '<div id="name-death-info"><time datetime="2016-01-10">January 10, 2016</time></div>' if deceased else ''
+    return str.format(
+        '<html><body><img id="name-poster" src="https://img.example/{0}.jpg"/>'
+        '<div id="name-born-info"><time datetime="1962-12-22">December 22, 1962</time> in <a href="/search">London, England, UK</a></div>'
+        '{1}<a href="#actor">Actor</a>'
+        '<div id="details-height"><h4>Height:</h4> 5\' 11" (1.80 m)</div>'
+        '<div id="dyk-star-sign"><a href="/search">Sagittarius</a></div>'
+        '<div id="dyk-trademark"><h4>Trademark:</h4> Deep, resonant voice <span class="see-more">See more</span></div>'
+        '<span class="awards-blurb">Another 45 wins &amp; 92 nominations.</span>'
+        '<div id="filmography">{2}</div></body></html>', name, death, rows)
+
+
+def film_page(tid: str, title: str) -> str:
+    """
+    An IMDB film page with credits, review bar, story line and details.
+    """
+    rng = random.Random(tid)
+    n = int(tid[2:])
+    genres = ' | '.join(str.format('<a href="/genre">{0}</a>', g) for g in rng.sample(_GENRES, 2))
+    keywords = ' | '.join(str.format('<a href="/keyword"><span class="itemprop">{0}</span></a>', k) for k in rng.sample(_KEYWORDS, 3))
+    stars = ', '.join(str.format('<a href="/name/nm{0:07d}/">Star {0}</a>', rng.randrange(1, 500)) for _ in range(3))
+    return str.format(
+        '<html><head><title>{1}</title></head><body><div class="plot_summary">'
+        '<div class="credit_summary_item"><h4 class="inline">Director:</h4><a href="/name/nm1/">Director {2}</a></div>'
+        '<div class="credit_summary_item"><h4 class="inline">Writers:</h4><a href="/name/nm2/">Writer {3}</a>, '
+        '<a href="/name/nm3/">Writer {4}</a>, <a href="/title/{0}/fullcredits">1 more credit</a></div>'
+        '<div class="credit_summary_item"><h4 class="inline">Stars:</h4>{5} | <a href="/title/{0}/fullcredits">See full cast &amp; crew</a></div>'
+        '</div><div class="titleReviewBar">'
+        '<div class="titleReviewBarItem"><div class="metacriticScore score_favorable titleReviewBarSubItem"><span>{6}</span></div></div>'
+        '<div class="titleReviewBarItem titleReviewBarItem--reviews"><span class="subText">'
+        '<a href="/reviews">{7:,} user</a> | <a href="/externalreviews">{8} critic</a></span></div>'
+        '<div class="titleReviewBarItem"><div class="titleReviewBarSubItem"><div>Popularity</div><div><span class="subText">\n{9}\n'
+        '(<span>up</span> 12)</span></div></div></div></div>'
+        '<div id="titleStoryLine"><div class="see-more inline canwrap"><h4 class="inline">Plot Keywords:</h4>{10}</div>'
+        '<div class="see-more inline canwrap"><h4 class="inline">Genres:</h4>{11}</div>'
+        '<div class="txt-block"><h4 class="inline">Motion Picture Rating (<a href="/mpaa">MPAA</a>)</h4><span>{12}</span></div></div>'
+        '<div id="titleDetails"><div class="txt-block"><h4 class="inline">Release Date:</h4> 14 October {13} (USA)</div>'
+        '<div class="txt-block"><h4 class="inline">Budget:</h4>${14:,} (estimated)</div>'
+        '<div class="txt-block"><h4 class="inline">Opening Weekend USA:</h4> ${15:,}, 25 September {13}</div>'
+        '<div class="txt-block"><h4 class="inline">Gross USA:</h4> ${16:,}</div>'
+        '<div class="txt-block"><h4 class="inline">Cumulative Worldwide Gross:</h4> ${17:,}</div>'
+        '<div class="txt-block"><h4 class="inline">Production Co:</h4><a href="/company">{18}</a>, <a href="/company">See more</a></div>'
+        '<div class="txt-block"><h4 class="inline">Runtime:</h4><time datetime="PT{19}M">{19} min</time></div></div>'
+        '</body></html>',
+        tid, title, n % 300, n % 97, n % 89, stars, 20 + n % 80, rng.randrange(100, 100000), rng.randrange(10, 900),
+        rng.randrange(1, 5000), keywords, genres, rng.choice(_RATINGS), 1970 + n % 50, rng.randrange(1, 300) * 1000000,
+        rng.randrange(1, 90) * 1000000, rng.randrange(1, 400) * 1000000, rng.randrange(1, 900) * 1000000,
+        rng.choice(_COMPANIES), 80 + n % 100)
+
+
+def recorded_list_page() -> str:
+    """
+    @returns html (str) the saved the-numbers.com list page, or None if it isn't there.
+    """
+    if not os.path.exists(RECORDED_LIST_PAGE):
+        return None
+    with open(RECORDED_LIST_PAGE, 'r', encoding='utf-8') as file:
+        return file.read()
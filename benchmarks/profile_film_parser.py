@@ -0,0 +1,241 @@
+"""
+Profiles the single-pass FilmPageExtractor against the original nested-loop film parser
+on saved IMDB film pages: the film pages a crawl stored in the page store, or saved HTML files.
+usage:
+    ```
+    python -m benchmarks.profile_film_parser --repeat 5 --profile
+    python -m benchmarks.profile_film_parser --pages "./fixtures/films/*.html"
+    ```
+"""
+from bs4 import BeautifulSoup
+from models import CelebRole
+from extractors import FilmPageExtractor
+from parsers import get_parser
+from pagestore import PageStore
+from manifest import CrawlManifest, FILM, DONE
+from typing import List, Dict
+import argparse
+import cProfile
+import pstats
+import glob
+import json
+import time
+import re
+
+
+def legacy_parse_film_page(soup: BeautifulSoup, role: CelebRole) -> CelebRole:
+    """
+    The film page parser as it was before FilmPageExtractor: every field scan runs once per credit item.
+    Kept verbatim as the reference for output and timing comparisons.
+    """
+    role.Directors = []
+    role.Writers = []
+    role.Stars = []
+    role.Genres = []
+    role.ProductionCompanies = []
+    role.PlotKeywords = []
+
+    for item in soup.select("div.plot_summary div.credit_summary_item"):
+        h4 = item.select_one("h4")
+
+        # Directors
+        if h4 and re.search(r'^Director', h4.text):
+            for director in item.select("a"):
+                if director.text not in role.Directors and not re.search(r'^\d+\smore', director.text):
+                    role.Directors.append(director.text)
+        # Writers
+        elif h4 and re.search(r'^Writer', h4.text):
+            for writer in item.select("a"):
+                if writer.text not in role.Writers and not re.search(r'^\d+\smore', writer.text):
+                    role.Writers.append(writer.text)
+        # Stars
+        elif h4 and re.search(r'^Star', h4.text):
+            for star in item.select("a"):
+                if not re.search(r'^See\s', star.text) and star.text not in role.Stars:
+                    role.Stars.append(star.text)
+
+        # Metascore
+        metascore = soup.select_one("div.metacriticScore > span")
+        if metascore:
+            role.Metascore = int(metascore.text)
+    
+        for review in soup.select("div.titleReviewBarItem span.subText > a"):
+        # UserReviews
+            if re.search(r'\d+\suser', review.text):
+                role.UserReviews = int(re.sub(r'\D', '', review.text))
+
+        # CriticReviews
+            if re.search(r'\d+\scritic', review.text):
+                role.CriticReviews = int(re.sub(r'\D', '', review.text))
+
+        # Popularity
+        for item in soup.select("div.titleReviewBarSubItem"):
+            for div in item.select("div"):
+                if re.search(r'Popularity', div.text):
+                    popularity = item.select_one("div span.subText")
+                    if popularity:
+                        role.Popularity = int(re.sub(r'\D', '', re.findall(r'\d+\n', popularity.text)[0] ))
+        
+        # PlotKeywords
+        for item in soup.select("div#titleStoryLine > div > a > span.itemprop"):
+            kw = re.sub(r'\s+', ' ', re.sub(r'(\n)', '', item.text))
+            if kw not in role.PlotKeywords:
+                role.PlotKeywords.append(kw)
+
+        # Genres
+        for item in soup.select("div#titleStoryLine > div"):
+            h4 = item.select_one("h4")
+            if h4 and re.search(r'Genre', h4.text):
+                for genre in item.select("a"):
+                    ge = re.sub(r'(^\s+|\s+$)', '', genre.text)
+                    if ge not in role.Genres:
+                        role.Genres.append(ge)
+        # MotionPictureRating
+            elif h4 and re.search(r'^Motion Picture Rating', h4.text):
+                rating = item.select_one("span")
+                if rating:
+                    role.MotionPictureRating = rating.text
+
+        # ReleaseDate
+        for item in soup.select("div#titleDetails > div"):
+            h4 = item.select_one("h4")
+            if h4 and re.search(r'^Release Date', h4.text):
+                release_date = re.findall(r'\d{1,2}\s.*\s\d{4}', item.text)
+                if len(release_date) > 0:
+                    role.ReleaseDate = release_date[0]
+        # Budget
+            elif h4 and re.search(r'^Budget', h4.text):
+                budget = re.findall(r'[\$0-9,]+', item.text)
+                role.Budget = int(re.sub(r'[^0-9]', '', budget[0]))
+        # OpeningWeekend
+            elif h4 and re.search(r'^Opening Weekend', h4.text):
+                opening = re.findall(r'[\$0-9,]+', item.text)
+                role.OpeningWeekend = int(re.sub(r'[^0-9]', '', opening[0]))
+        # Gross
+            elif h4 and re.search(r'^Gross', h4.text):
+                gross = re.findall(r'[\$0-9,]+', item.text)
+                role.Gross = int(re.sub(r'[^0-9]', '', gross[0]))
+        # CumulativeWorldwideGross
+            elif h4 and re.search(r'^Cumulative Worldwide Gross', h4.text):
+                cumlative = re.findall(r'[\$0-9,]+', item.text)
+                role.CumulativeWorldwideGross = int(re.sub(r'[^0-9]', '', cumlative[0])) 
+        # ProductionCompanies
+            elif h4 and re.findall(r'^Production Co', h4.text):
+                for a in item.select("a"):
+                    if not re.search(r'^See\s', a.text):
+                        pc = re.sub(r'(^\s+|\s+$)', '', a.text)
+                        if pc not in role.ProductionCompanies:
+                            role.ProductionCompanies.append(pc)
+        # RuntimeMinutes
+            elif h4 and re.findall(r'^Runtime', h4.text):
+                runtime = item.select_one("time")
+                if runtime:
+                    role.RuntimeMinutes = int(re.sub(r'[^0-9]', '', runtime.text))
+    return role
+
+
+def _fields(role: CelebRole) -> Dict:
+    return role.toDict()
+
+
+def _time(fn, docs: List[BeautifulSoup], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for soup in docs:
+            fn(soup, CelebRole())
+    return time.perf_counter() - start
+
+
+def stored_pages(root: str = './html/pages', manifest_path: str = './html/manifest.db') -> Dict[str, str]:
+    """
+    Reads the film pages a crawl stored, found through the crawl manifest.
+    @param root (str) the page store folder.
+    @param manifest_path (str) the crawl manifest.
+    @returns pages (Dict[str, str]) html by film URL.
+    """
+    store = PageStore(root)
+    manifest = CrawlManifest(manifest_path)
+    pages: Dict[str, str] = {}
+    for key in manifest.keys(FILM, DONE):
+        url: str = manifest.get(FILM, key)['url']
+        html: str = store.get(url) if url else None
+        if html is not None:
+            pages[url] = html
+    manifest.close()
+    store.close()
+    return pages
+
+
+def file_pages(pattern: str) -> Dict[str, str]:
+    """
+    Reads saved film pages from files.
+    @param pattern (str) glob of HTML files.
+    @returns pages (Dict[str, str]) html by path.
+    """
+    pages: Dict[str, str] = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as html:
+            pages[path] = html.read()
+    return pages
+
+
+def compare(pages: Dict[str, str], repeat: int = 5, profile: bool = False, parser: str = None) -> Dict:
+    """
+    Times both parsers on the same pre-parsed pages and counts pages whose output differs.
+    Pages without credit items are reported separately: the legacy parser extracts no details from them.
+    @param pages (Dict[str, str]) saved film pages' html, by URL or path.
+    @param repeat (int) passes over the pages per parser.
+    @param profile (bool) print the top cProfile entries for each parser.
+    @param parser (str) HTML parser backend used to build the trees.
+    @returns results (Dict)
+    """
+    backend = get_parser(parser)
+    paths: List[str] = list(pages)
+    docs: List[BeautifulSoup] = [backend.parse(pages[path]) for path in paths]
+
+    extractor = FilmPageExtractor()
+    parsers = {'legacy': legacy_parse_film_page, 'single_pass': extractor.extract}
+
+    mismatches: List[str] = []
+    no_credits = 0
+    for path, soup in zip(paths, docs):
+        if len(soup.select("div.plot_summary div.credit_summary_item")) == 0:
+            no_credits += 1
+            continue
+        if _fields(legacy_parse_film_page(soup, CelebRole())) != _fields(extractor.extract(soup, CelebRole())):
+            mismatches.append(path)
+
+    results = {'parser': backend.name, 'pages': len(docs), 'repeat': repeat, 'pages_without_credits': no_credits, 'mismatches': mismatches}
+    for name, fn in parsers.items():
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elapsed = _time(fn, docs, repeat)
+        if profile:
+            profiler.disable()
+            print(str.format('--- {0} ---', name))
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+        results[name] = {
+            'seconds': elapsed,
+            'ms_per_page': 1000 * elapsed / max(1, len(docs) * repeat)
+        }
+
+    if results['single_pass']['seconds'] > 0:
+        results['speedup'] = results['legacy']['seconds'] / results['single_pass']['seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare film page parsers on saved pages.')
+    parser.add_argument('--pages', default=None, help='glob of saved film pages. Defaults to the film pages in the page store')
+    parser.add_argument('--store', default='./html/pages', help='page store folder')
+    parser.add_argument('--manifest', default='./html/manifest.db', help='crawl manifest listing the stored film pages')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--profile', action='store_true', help='print cProfile stats for each parser')
+    parser.add_argument('--parser', default=None, help="HTML parser backend: 'lxml' or 'html.parser'")
+    args = parser.parse_args()
+
+    pages = file_pages(args.pages) if args.pages else stored_pages(args.store, args.manifest)
+    if len(pages) == 0:
+        raise Exception(str.format('No film pages in {0}.', args.pages or args.store))
+    print(json.dumps(compare(pages, repeat=args.repeat, profile=args.profile, parser=args.parser), indent=4))
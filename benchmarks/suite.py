@@ -0,0 +1,232 @@
+"""
+Offline benchmark suite. Times each parse stage on fixture pages, then runs get_data end to end
+against a local fixture server at several worker counts. Results are written as JSON, and can be
+compared against an earlier run to spot regressions.
+usage:
+    ```
+    python -m benchmarks.suite --output ./benchmarks/results/head.json --workers 1,2,4
+    python -m benchmarks.suite --baseline ./benchmarks/results/base.json
+    ```
+"""
+from bs4.element import Tag
+from CelebSpyder import CelebSpyder
+from models import Celeb, CelebRole
+from sinks import JsonLinesSink
+from transport import LiveTransport
+from benchmarks import fixtures
+from benchmarks.fixture_server import FixtureServer
+from typing import List, Dict, Callable
+import multiprocessing
+import subprocess
+import statistics
+import platform
+import tempfile
+import argparse
+import shutil
+import json
+import time
+import os
+
+
+def _timeit(fn: Callable, number: int, repeat: int) -> Dict:
+    """
+    Runs fn `number` times per round for `repeat` rounds.
+    @returns stats (Dict) seconds per call.
+    """
+    rounds: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': min(rounds),
+        'median': statistics.median(rounds),
+        'mean': statistics.mean(rounds),
+        'ops_per_sec': 1 / min(rounds) if min(rounds) > 0 else None
+    }
+
+
+def _spyder(parser: str, streaming: bool = False) -> CelebSpyder:
+    # Run from a scratch directory: the spider's stores default to paths under './html'.
+    # Requests aren't paced, so the numbers measure the crawler rather than the rate controller.
+    return CelebSpyder('fixture://list', parser=parser, sink=JsonLinesSink('./dataset'), transport=LiveTransport(),
+                       streaming=streaming)
+
+
+def micro_benchmarks(parser: str = None, repeat: int = 5, roles: int = 30) -> Dict[str, Dict]:
+    """
+    Times the parse stages on fixture pages. The recorded list page is used when it's available.
+    @param parser (str) HTML parser backend.
+    @param repeat (int) rounds per benchmark.
+    @param roles (int) filmography rows on the fixture profile.
+    @returns results (Dict[str, Dict]) stats per benchmark.
+    """
+    list_html: str = fixtures.recorded_list_page() or fixtures.list_page(fixtures.celeb_names(100))
+    name = 'Tom Hanks'
+    pid = fixtures.person_id_for(name)
+    profile_html = fixtures.profile_page(name, fixtures.films_for(pid, roles, 500))
+    film_html = fixtures.film_page('tt0000042', 'Film 42')
+    search_html = fixtures.search_page(name, pid)
+
+    spyder = _spyder(parser)
+    streaming_spyder = _spyder(parser, streaming=True)
+    rows: List[Tag] = spyder._parse_celeb_list_html(html=list_html)
+    filmo_rows: List[Tag] = spyder._parser.parse(profile_html).select("div#filmography div.filmo-row")
+
+    def parse_profile(parsing: CelebSpyder = spyder):
+        celeb = Celeb()
+        celeb.FullName = name
+        parsing._parse_celeb_profile_html(celeb, fetch_films=False, profile_html=profile_html)
+
+    benchmarks: Dict[str, Callable] = {
+        '_parse_celeb_list_html': lambda: spyder._parse_celeb_list_html(html=list_html),
+        '_create_celeb': lambda: [spyder._create_celeb(row) for row in rows],
+        '_parse_imdb_search_html': lambda: spyder._parse_imdb_search_html(search_html),
+        '_parse_celeb_profile_html': parse_profile,
+        '_parse_profile_streaming': lambda: parse_profile(streaming_spyder),
+        '_parse_film_html': lambda: [spyder._parse_film_html(row, fetch_details=False) for row in filmo_rows],
+        '_parse_film_page': lambda: spyder._parse_film_page(CelebRole(), film_html)
+    }
+    sizes: Dict[str, int] = {
+        '_parse_celeb_list_html': len(list_html),
+        '_create_celeb': len(rows),
+        '_parse_imdb_search_html': len(search_html),
+        '_parse_celeb_profile_html': len(profile_html),
+        '_parse_profile_streaming': len(profile_html),
+        '_parse_film_html': len(filmo_rows),
+        '_parse_film_page': len(film_html)
+    }
+
+    results: Dict[str, Dict] = {}
+    for bench, fn in benchmarks.items():
+        # Calibrate so each round takes roughly 0.2s.
+        start = time.perf_counter()
+        fn()
+        number = max(1, int(0.2 / max(time.perf_counter() - start, 1e-6)))
+        results[bench] = _timeit(fn, number, repeat)
+        results[bench]['input_size'] = sizes[bench]
+    return results
+
+
+def end_to_end(workers: List[int], celebs: int = 20, roles: int = 30, film_pool: int = 200, parser: str = None) -> List[Dict]:
+    """
+    Runs a full get_data crawl against a local fixture server, once per worker count, each from an empty cache.
+    @param workers (List[int]) process counts.
+    @param celebs (int) rows on the list page.
+    @param roles (int) filmography rows per profile.
+    @param film_pool (int) distinct films shared by all profiles.
+    @param parser (str) HTML parser backend.
+    @returns results (List[Dict])
+    """
+    results: List[Dict] = []
+    with FixtureServer(fixtures.celeb_names(celebs), roles=roles, film_pool=film_pool) as server:
+        for num_processes in workers:
+            server.hits = {}
+            spyder = _spyder(parser)
+            spyder._celeb_list_url = server.url + '/list'
+            spyder._imdb_url = server.url
+
+            start = time.perf_counter()
+            crawled = spyder.get_data(num_processes=num_processes)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'num_processes': num_processes,
+                'seconds': elapsed,
+                'celebs': len(crawled),
+                'errors': len(spyder.errors),
+                'roles': sum(len(celeb.Roles or []) for celeb in crawled),
+                'requests': dict(server.hits),
+                'celebs_per_sec': len(crawled) / elapsed if elapsed > 0 else None
+            })
+            # The next run starts from an empty cache.
+            for folder in ['./html', './dataset']:
+                shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def compare(results: Dict, baseline: Dict) -> Dict:
+    """
+    Ratios of this run to a baseline run; above 1 is slower.
+    @returns comparison (Dict)
+    """
+    comparison: Dict = {'baseline_commit': baseline.get('commit'), 'micro': {}, 'end_to_end': {}}
+    for bench, stats in results.get('micro', {}).items():
+        base = baseline.get('micro', {}).get(bench)
+        if base and base['median'] > 0:
+            comparison['micro'][bench] = stats['median'] / base['median']
+    base_runs = {run['num_processes']: run for run in baseline.get('end_to_end', [])}
+    for run in results.get('end_to_end', []):
+        base = base_runs.get(run['num_processes'])
+        if base and base['seconds'] > 0:
+            comparison['end_to_end'][str(run['num_processes'])] = run['seconds'] / base['seconds']
+    return comparison
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(workers: List[int], repeat: int = 5, celebs: int = 20, roles: int = 30, film_pool: int = 200,
+        parser: str = None, skip_end_to_end: bool = False) -> Dict:
+    """
+    Runs the whole suite in a scratch directory.
+    @returns results (Dict)
+    """
+    results: Dict = {
+        'commit': _commit(),
+        'created_at': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'config': {'parser': parser, 'repeat': repeat, 'celebs': celebs, 'roles': roles, 'film_pool': film_pool, 'workers': workers}
+    }
+    cwd = os.getcwd()
+    recorded = os.path.abspath(fixtures.RECORDED_LIST_PAGE)
+    scratch = tempfile.mkdtemp(prefix='celebspyder-bench-')
+    try:
+        os.chdir(scratch)
+        fixtures.RECORDED_LIST_PAGE = recorded
+        results['micro'] = micro_benchmarks(parser=parser, repeat=repeat, roles=roles)
+        if not skip_end_to_end:
+            results['end_to_end'] = end_to_end(workers, celebs=celebs, roles=roles, film_pool=film_pool, parser=parser)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite.')
+    parser.add_argument('--output', default=None, help='write results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='earlier results to compare against')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated process counts for get_data')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--celebs', type=int, default=20)
+    parser.add_argument('--roles', type=int, default=30)
+    parser.add_argument('--film-pool', type=int, default=200)
+    parser.add_argument('--parser', default=None, help="HTML parser backend: 'lxml' or 'html.parser'")
+    parser.add_argument('--micro-only', action='store_true', help='skip the end-to-end crawl')
+    args = parser.parse_args()
+
+    results = run([int(w) for w in args.workers.split(',')], repeat=args.repeat, celebs=args.celebs, roles=args.roles,
+                  film_pool=args.film_pool, parser=args.parser, skip_end_to_end=args.micro_only)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            results['comparison'] = compare(results, json.load(file))
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        dirs = os.path.dirname(args.output)
+        if dirs:
+            os.makedirs(dirs, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    print(output)
@@ -0,0 +1,375 @@
+from CelebSpyder import CelebSpyder
+from models import Celeb, CelebRole
+from frontier import FrontierStore, get_frontier, PENDING, LEASED, DONE, FAILED
+from manifest import CELEB
+from registry import title_id
+from typing import List, Dict
+import multiprocessing
+import traceback
+import threading
+import argparse
+import hashlib
+import socket
+import json
+import time
+import os
+
+# Queue of celebs to crawl. Films go to one queue per shard, see film_queue().
+CELEBS = 'celebs'
+
+
+def film_queue(shard: int) -> str:
+    return str.format('films:{0}', shard)
+
+
+def film_shard(tid: str, shards: int) -> int:
+    """
+    @returns shard (int) a title id's shard, the same on every node.
+    """
+    return int(hashlib.sha1(tid.encode('utf-8')).hexdigest()[:8], 16) % shards
+
+
+def shard_owner(shard: int, nodes: List[str]) -> str:
+    """
+    Picks the node that works a shard by rendezvous hashing, so when a node joins or leaves only
+    the shards it gains or loses move.
+    @param shard (int)
+    @param nodes (List[str]) the live nodes.
+    @returns node (str) or None if there are no nodes.
+    """
+    if len(nodes) == 0:
+        return None
+    return max(nodes, key=lambda node: hashlib.sha1(str.format('{0}:{1}', node, shard).encode('utf-8')).hexdigest())
+
+
+class _Parked():
+    """
+    A celeb whose profile is parsed, waiting on its films.
+    """
+
+    def __init__(self, celeb: Celeb, profile_hash: str, roles: List[CelebRole], queues: Dict[str, str]):
+        self.celeb = celeb
+        self.profile_hash = profile_hash
+        self.roles = roles
+        self.queues = queues
+        self.missing = set(queues)
+        self.films: Dict[str, Dict] = {}
+        self.checking = False
+        self.checked_at = 0.0
+
+
+class ClusterNode():
+    """
+    One node of a distributed crawl. Nodes share a frontier store (SQLite on a shared volume, or a
+    Redis-compatible server) and claim celebs from it under expiring leases, so a node that dies only
+    delays its claimed celebs until their leases run out. A celeb's film pages are queued by title id
+    into hashed shards, and each shard is worked by one live node, so each film is fetched and parsed
+    on exactly one node and that node's page cache and film registry stay warm for it. A celeb whose
+    films are being parsed elsewhere is parked, and the node's threads move on to other celebs and films.
+    Finished celebs are kept in the store; collect() merges them into one output.
+    usage:
+        ```
+        store = get_frontier('sqlite:///shared/frontier.db')
+        ClusterNode(spyder, store).seed(frontier)   # on one node
+        ClusterNode(spyder, store).run()            # on every node
+        ClusterNode(spyder, store).collect()        # on one node, writes to the spyder's sink
+        ```
+    """
+
+    def __init__(self, spyder: CelebSpyder, store: FrontierStore, node_id: str = None, shards: int = 16,
+                 threads: int = 8, max_parked: int = None, lease: float = 120.0, heartbeat: float = 5.0,
+                 poll_interval: float = 0.2):
+        """
+        @param spyder (CelebSpyder) fetches and parses the pages.
+        @param store (FrontierStore) the shared frontier.
+        @param node_id (str) unique per node. Defaults to '<host name>-<process id>'.
+        @param shards (int) film shards; the same on every node.
+        @param threads (int) work loops run at once on this node.
+        @param max_parked (int) celebs held waiting on their films at once. Defaults to four per thread.
+        @param lease (float) seconds a claimed celeb or film is held before another node may take it over.
+        @param heartbeat (float) seconds between heartbeats. A node missing three is presumed dead and its shards move.
+        @param poll_interval (float) seconds between checks for work while there's none.
+        """
+        self.spyder = spyder
+        self.store = store
+        self.node_id = node_id or str.format('{0}-{1}', socket.gethostname(), os.getpid())
+        self.shards = shards
+        self.threads = max(1, threads)
+        self.max_parked = max_parked or 4 * self.threads
+        self.lease = lease
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.crawled = 0
+        self._owned: List[int] = []
+        self._beat_at = 0.0
+        self._parked: Dict[str, _Parked] = {}
+        # Films being loaded on this node, by title id, with their queues.
+        self._loading: Dict[str, str] = {}
+        self._starting = 0
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def seed(self, celebs: List[Celeb]) -> int:
+        """
+        Queues celebs to crawl. Celebs already queued are left as they are.
+        @param celebs (List[Celeb]) e.g. CrawlOrchestrator.load_frontier().
+        @returns added (int)
+        """
+        return self.store.add(CELEBS, {celeb.FullName: celeb.toJson() for celeb in celebs})
+
+    def _beat(self):
+        with self._lock:
+            if time.time() - self._beat_at < self.heartbeat:
+                return
+            self._beat_at = time.time()
+            parked: List[str] = list(self._parked)
+            loading: Dict[str, List[str]] = {}
+            for tid, queue in self._loading.items():
+                loading.setdefault(queue, []).append(tid)
+        self.store.heartbeat(self.node_id)
+        if len(parked) > 0:
+            self.store.renew(CELEBS, self.node_id, parked, self.lease)
+        # A slow film keeps its lease for as long as it's loading, so no other node takes it over and fetches it again.
+        for queue, tids in loading.items():
+            self.store.renew(queue, self.node_id, tids, self.lease)
+        nodes: List[str] = self.store.nodes(3 * self.heartbeat)
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        self._owned = [shard for shard in range(self.shards) if shard_owner(shard, nodes) == self.node_id]
+
+    def _keep_beating(self):
+        while not self._stopped.wait(self.heartbeat):
+            self._beat()
+
+    def _work_film(self) -> bool:
+        """
+        Fetches and parses one film from this node's shards.
+        @returns bool whether there was one.
+        """
+        self._beat()
+        for shard in self._owned:
+            queue = film_queue(shard)
+            for tid, payload in self.store.claim(queue, self.node_id, 1, self.lease):
+                role: CelebRole = CelebRole.fromDict(json.loads(payload))
+                with self._lock:
+                    self._loading[tid] = queue
+                try:
+                    with self.spyder.metrics.timer('film'):
+                        fields: Dict = self.spyder._films.resolve(tid, lambda: self.spyder._load_film(role))
+                    self.store.complete(queue, self.node_id, tid, json.dumps(fields))
+                except Exception:
+                    self.store.fail(queue, self.node_id, tid, traceback.format_exc())
+                finally:
+                    with self._lock:
+                        del self._loading[tid]
+                return True
+        return False
+
+    def _queue_films(self, roles: List[CelebRole]) -> Dict[str, str]:
+        """
+        Queues the films of a celeb's roles in their shards.
+        @returns queues (Dict[str, str]) each film's queue, by title id.
+        """
+        queues: Dict[str, str] = {}
+        payloads: Dict[str, Dict[str, str]] = {}
+        for role in roles:
+            tid = title_id(role.FilmUrl) or role.FilmUrl
+            queues[tid] = film_queue(film_shard(tid, self.shards))
+            payloads.setdefault(queues[tid], {})[tid] = json.dumps({'FilmTitle': role.FilmTitle, 'FilmUrl': role.FilmUrl})
+        for queue, items in payloads.items():
+            self.store.add(queue, items)
+        return queues
+
+    def _start_celeb(self, name: str, celeb: Celeb):
+        """
+        Fetches and parses a celeb's profile, queues its films, and parks it until they're parsed.
+        """
+        spyder = self.spyder
+        spyder._search_imdb(celeb)
+        previous: Dict = spyder._manifest.get(CELEB, celeb.FullName)
+        profile_hash: str = spyder._pages.digest(celeb.LocalDataSourcePath)
+        if spyder._profile_unchanged(previous, profile_hash):
+            celeb = spyder._restore_celeb(celeb, previous)
+        else:
+            spyder._parse_celeb_profile_html(celeb, fetch_films=False)
+            spyder._tmdb_celeb(celeb)
+
+        roles: List[CelebRole] = [role for role in celeb.Roles or [] if role.FilmUrl] if spyder.spec.needsFilms else []
+        parked = _Parked(celeb, profile_hash, roles, self._queue_films(roles))
+        with self._lock:
+            self._parked[name] = parked
+
+    def _finish_parked(self) -> bool:
+        """
+        Checks one parked celeb, finishing it if all of its films are parsed.
+        @returns bool whether one was finished.
+        """
+        with self._lock:
+            due = [name for name, parked in self._parked.items() if not parked.checking and time.time() - parked.checked_at >= self.poll_interval]
+            if len(due) == 0:
+                return False
+            name = due[0]
+            parked: _Parked = self._parked[name]
+            parked.checking = True
+
+        try:
+            for tid in list(parked.missing):
+                item: Dict = self.store.get(parked.queues[tid], tid)
+                if item['status'] == DONE:
+                    parked.films[tid] = json.loads(item['result'])
+                    parked.missing.discard(tid)
+                elif item['status'] == FAILED:
+                    raise Exception(str.format('Film {0} failed:\n{1}', tid, item['error']))
+            if len(parked.missing) > 0:
+                return False
+
+            for role in parked.roles:
+                self.spyder._films.stamp(role, parked.films[title_id(role.FilmUrl) or role.FilmUrl])
+            self.spyder._finish_celeb(parked.celeb, parked.profile_hash)
+            self.store.complete(CELEBS, self.node_id, name, parked.celeb.toJson())
+            with self._lock:
+                del self._parked[name]
+                self.crawled += 1
+            self.spyder.metrics.count('cluster_celebs', result='done')
+            return True
+        except Exception:
+            with self._lock:
+                del self._parked[name]
+            self._fail_celeb(name, traceback.format_exc())
+            return True
+        finally:
+            parked.checking = False
+            parked.checked_at = time.time()
+
+    def _fail_celeb(self, name: str, error: str):
+        self.spyder._manifest.mark(CELEB, name, FAILED, error=error)
+        self.store.fail(CELEBS, self.node_id, name, error)
+        self.spyder.metrics.count('cluster_celebs', result='failed')
+
+    def _claim_celeb(self) -> bool:
+        """
+        Claims and starts a celeb, unless this node already has max_parked celebs waiting on films.
+        @returns bool whether one was claimed.
+        """
+        with self._lock:
+            if len(self._parked) + self._starting >= self.max_parked:
+                return False
+            self._starting += 1
+        try:
+            claimed = self.store.claim(CELEBS, self.node_id, 1, self.lease)
+            for name, payload in claimed:
+                try:
+                    self._start_celeb(name, Celeb.fromJson(payload))
+                except Exception:
+                    self._fail_celeb(name, traceback.format_exc())
+            return len(claimed) > 0
+        finally:
+            with self._lock:
+                self._starting -= 1
+
+    def _loop(self):
+        while True:
+            if self._finish_parked() or self._work_film() or self._claim_celeb():
+                continue
+            with self._lock:
+                busy = len(self._parked) + self._starting > 0
+            if not busy:
+                counts: Dict[str, int] = self.store.counts(CELEBS)
+                if counts[PENDING] + counts[LEASED] == 0:
+                    return
+            time.sleep(self.poll_interval)
+
+    def run(self) -> int:
+        """
+        Works the frontier until every celeb is done or has failed for good.
+        @returns crawled (int) the number of celebs this node crawled.
+        """
+        self.spyder._start_crawl()
+        self.spyder._transport.reserve(self.threads)
+        self._beat()
+        # Beats from their own thread too, so leases are renewed while every work loop is busy.
+        self._stopped.clear()
+        beater = threading.Thread(target=self._keep_beating, daemon=True)
+        beater.start()
+        workers = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self._stopped.set()
+        beater.join()
+        # Nothing is written to the sink here; collect() writes the merged output.
+        self.spyder._finish_crawl()
+        return self.crawled
+
+    def collect(self, wait: bool = True) -> List[Celeb]:
+        """
+        Merges the celebs every node crawled into the spyder's celeb_list, errors and sink.
+        @param wait (bool) wait until the frontier is worked through.
+        @returns celeb_list (List[Celeb]) ordered by rank.
+        """
+        while wait:
+            counts: Dict[str, int] = self.store.counts(CELEBS)
+            if counts[PENDING] + counts[LEASED] == 0:
+                break
+            time.sleep(max(self.poll_interval, 1.0))
+
+        spyder = self.spyder
+        spyder.celeb_list = sorted((Celeb.fromJson(data) for data in self.store.results(CELEBS).values()), key=lambda celeb: celeb.Rank)
+        spyder.errors = [(Celeb.fromDict({'FullName': name}), error) for name, error in self.store.errors(CELEBS).items()]
+        for celeb in spyder.celeb_list:
+            spyder._emit(celeb)
+        with spyder.metrics.timer('export'):
+            spyder._sink.close()
+        return spyder.celeb_list
+
+
+def _run_node(spyder: CelebSpyder, store: FrontierStore, node_args: Dict) -> int:
+    return ClusterNode(spyder, store, **node_args).run()
+
+
+if __name__ == '__main__':
+    from orchestrator import CrawlOrchestrator, START_URL
+    from transport import get_transport
+    from projection import ExtractionSpec
+
+    parser = argparse.ArgumentParser(description='Crawl with workers on several nodes sharing one frontier.')
+    parser.add_argument('--store', default='sqlite:///./html/frontier.db', help="'sqlite:///path' or 'redis://host:port/db'")
+    parser.add_argument('--shards', type=int, default=16, help='film shards; must be the same on every node')
+    parser.add_argument('--imdb-url', default='https://www.imdb.com')
+    parser.add_argument('--transport', default='live', choices=['live', 'record', 'replay'])
+    parser.add_argument('--archive', default='./html/archive', help='archive folder for record and replay')
+    parser.add_argument('--fields', default=None, help="comma-separated fields to extract, e.g. 'DOB,Height,Roles.Genres'")
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed = commands.add_parser('seed', help='queue the celebs of a range of list pages')
+    seed.add_argument('--start-url', default=START_URL)
+    seed.add_argument('--first-page', type=int, default=0)
+    seed.add_argument('--last-page', type=int, default=1)
+    work = commands.add_parser('work', help='work the frontier on this node')
+    work.add_argument('--processes', type=int, default=1, help='nodes started on this machine')
+    work.add_argument('--threads', type=int, default=8, help='work loops per node')
+    commands.add_parser('collect', help='wait for the crawl and write every node\'s celebs to one output')
+    args = parser.parse_args()
+
+    store = get_frontier(args.store)
+    spyder_args: Dict = {'imdb_url': args.imdb_url, 'transport': get_transport(args.transport, args.archive),
+                         'spec': ExtractionSpec.fromFields(args.fields.split(',')) if args.fields else None}
+    if args.command == 'seed':
+        orchestrator = CrawlOrchestrator(args.start_url, range(args.first_page, args.last_page + 1), **spyder_args)
+        print(str.format('Queued {0} celebs.', ClusterNode(orchestrator.spyder, store).seed(orchestrator.load_frontier())))
+    elif args.command == 'work':
+        def node_spyder(index: int) -> CelebSpyder:
+            # Each node's metrics go to their own file, in case ./html is on the shared volume.
+            return CelebSpyder(celeb_list_url=None, metrics_path=str.format('./html/metrics-{0}-{1}.json', socket.gethostname(), index),
+                               **spyder_args)
+        node_args: Dict = {'shards': args.shards, 'threads': args.threads}
+        if args.processes <= 1:
+            crawled = [_run_node(node_spyder(0), store, node_args)]
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                crawled = pool.starmap(_run_node, [(node_spyder(i), store, node_args) for i in range(args.processes)])
+        print(str.format('Crawled {0} celebs.', sum(crawled)))
+    else:
+        node = ClusterNode(CelebSpyder(celeb_list_url=None, **spyder_args), store, shards=args.shards)
+        celebs = node.collect()
+        print(str.format('Collected {0} celebs, {1} failed.', len(celebs), len(node.spyder.errors)))
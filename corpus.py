@@ -0,0 +1,374 @@
+from sinks import celeb_record, role_records, celeb_schema, role_schema
+from models import Celeb
+from utils import read_files, read_json
+from typing import List, Dict, Tuple
+import hashlib
+import json
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.compute as compute
+    import pyarrow.json as arrow_json
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+# Bump when the feature layout changes; cached matrices built with another version are rebuilt.
+FEATURES_VERSION = 1
+
+CELEB_NUMBERS: Tuple[str, ...] = ('Rank', 'Height', 'DomesticBoxOfficeRevenue', 'AverageDomesticBoxOfficeRevenue',
+                                  'AwardNominations', 'AwardsWins')
+
+# Role columns aggregated per celeb, and the aggregates taken of each. Missing values are skipped.
+ROLE_AGGREGATES: Dict[str, Tuple[str, ...]] = {
+    'Budget': ('sum', 'mean', 'max'),
+    'Gross': ('sum', 'mean', 'max'),
+    'CumulativeWorldwideGross': ('sum', 'mean', 'max'),
+    'Metascore': ('mean', 'min', 'max')
+}
+
+
+def _require():
+    if numpy is None or pyarrow is None:
+        raise ValueError('The corpus loader requires the numpy and pyarrow packages.')
+
+
+def source_files(path: str) -> List[str]:
+    """
+    The files a corpus is read from: '<path>/celebs.jsonl' and '<path>/roles.jsonl' for the JSONL sink,
+    the part files under '<path>/celebs' and '<path>/roles' for the Parquet sink, or every '.json' file
+    under path for the original './JSON' layout.
+    @param path (str)
+    @returns paths (List[str]) sorted.
+    """
+    if os.path.isfile(os.path.join(path, 'celebs.jsonl')):
+        return sorted(p for p in [os.path.join(path, 'celebs.jsonl'), os.path.join(path, 'roles.jsonl')] if os.path.isfile(p))
+    if os.path.isdir(os.path.join(path, 'celebs')):
+        return sorted(os.path.join(root, doc) for table in ('celebs', 'roles')
+                      for root, _, docs in os.walk(os.path.join(path, table)) for doc in docs if doc.endswith('.parquet'))
+    return sorted(read_files(path))
+
+
+def fingerprint(files: List[str]) -> str:
+    """
+    @param files (List[str])
+    @returns digest (str) that changes whenever a file is added, removed or rewritten.
+    """
+    digest = hashlib.sha1(str(FEATURES_VERSION).encode('utf-8'))
+    for path in files:
+        stat = os.stat(path)
+        digest.update(str.format('{0}\0{1}\0{2}\n', path, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _read_tables(path: str) -> Tuple['pyarrow.Table', 'pyarrow.Table']:
+    celebs_path, roles_path = os.path.join(path, 'celebs.jsonl'), os.path.join(path, 'roles.jsonl')
+    if os.path.isfile(celebs_path):
+        def read(file: str, schema) -> 'pyarrow.Table':
+            if not os.path.isfile(file) or os.path.getsize(file) == 0:
+                return schema.empty_table()
+            options = arrow_json.ParseOptions(explicit_schema=schema, unexpected_field_behavior='ignore')
+            return arrow_json.read_json(file, parse_options=options)
+        return read(celebs_path, celeb_schema()), read(roles_path, role_schema())
+
+    if os.path.isdir(os.path.join(path, 'celebs')):
+        roles = role_schema().empty_table()
+        if os.path.isdir(os.path.join(path, 'roles')):
+            roles = parquet.read_table(os.path.join(path, 'roles'), schema=role_schema())
+        return parquet.read_table(os.path.join(path, 'celebs'), schema=celeb_schema()), roles
+
+    celebs: List[Dict] = []
+    roles: List[Dict] = []
+    for file in sorted(read_files(path)):
+        celeb = Celeb.fromDict(read_json(file))
+        celebs.append(celeb_record(celeb))
+        roles.extend(role_records(celeb))
+    return pyarrow.Table.from_pylist(celebs, schema=celeb_schema()), pyarrow.Table.from_pylist(roles, schema=role_schema())
+
+
+def _numbers(column) -> 'numpy.ndarray':
+    """
+    @returns values (numpy.ndarray) of a numeric or boolean Arrow column as float64, with NaN for missing values.
+    """
+    return compute.cast(column, pyarrow.float64()).fill_null(float('nan')).to_numpy()
+
+
+class Corpus():
+    """
+    The crawled dataset held column-wise: a celebs table with one row per celeb, and a roles table holding
+    every celeb's roles back to back, in RoleIndex order. The roles of celeb i are rows offsets[i] to
+    offsets[i + 1] of the roles table. Celebs crawled more than once keep only their last crawl.
+    Requires the numpy and pyarrow packages.
+    usage:
+        ```
+        corpus = Corpus.load('./dataset')
+        budgets = corpus.role_numbers('Budget')
+        first = corpus.roles.slice(corpus.offsets[0], corpus.offsets[1] - corpus.offsets[0])
+        ```
+    """
+
+    def __init__(self, celebs: 'pyarrow.Table', roles: 'pyarrow.Table'):
+        """
+        Aligns a celebs table and a roles table as written by the sinks, keeping the last row of each celeb
+        and the roles of that last crawl.
+        @param celebs (pyarrow.Table) rows of celeb_record().
+        @param roles (pyarrow.Table) rows of role_records().
+        """
+        _require()
+        keys: numpy.ndarray = celebs.column('CelebKey').to_numpy(zero_copy_only=False).astype(str)
+        unique, inverse = numpy.unique(keys, return_inverse=True)
+        last = numpy.full(len(unique), -1, dtype=numpy.int64)
+        numpy.maximum.at(last, inverse, numpy.arange(len(keys), dtype=numpy.int64))
+        # Celebs in rank order; unranked ones last, in the order they were written.
+        ranks = _numbers(celebs.column('Rank'))[last]
+        order = last[numpy.lexsort((last, numpy.where(numpy.isnan(ranks), numpy.inf, ranks)))]
+        self.celebs: 'pyarrow.Table' = celebs.take(order)
+        self.keys: numpy.ndarray = keys[order]
+
+        # Map each role row to its celeb's row, dropping roles of celebs with no row.
+        celeb_of_key = numpy.empty(len(unique), dtype=numpy.int64)
+        celeb_of_key[inverse[order]] = numpy.arange(len(order), dtype=numpy.int64)
+        role_keys: numpy.ndarray = roles.column('CelebKey').to_numpy(zero_copy_only=False).astype(str)
+        found = numpy.searchsorted(unique, role_keys) if len(unique) > 0 else numpy.zeros(len(role_keys), dtype=numpy.int64)
+        found = numpy.minimum(found, max(len(unique) - 1, 0))
+        known = (unique[found] == role_keys) if len(unique) > 0 else numpy.zeros(len(role_keys), dtype=bool)
+        rows = numpy.flatnonzero(known)
+        celeb = celeb_of_key[found[rows]]
+
+        # Roles are appended on every crawl: keep each celeb's last RoleCount rows, which belong to its last crawl.
+        grouped = numpy.lexsort((rows, celeb))
+        rows, celeb = rows[grouped], celeb[grouped]
+        sizes = numpy.bincount(celeb, minlength=len(order))
+        starts = numpy.concatenate(([0], numpy.cumsum(sizes)[:-1])).astype(numpy.int64)
+        from_end = sizes[celeb] - 1 - (numpy.arange(len(rows)) - starts[celeb])
+        role_counts = numpy.nan_to_num(_numbers(self.celebs.column('RoleCount')), nan=0).astype(numpy.int64)
+        keep = from_end < role_counts[celeb]
+        rows, celeb = rows[keep], celeb[keep]
+        role_index = _numbers(roles.column('RoleIndex'))[rows]
+        ordered = numpy.lexsort((role_index, celeb))
+
+        self.roles: 'pyarrow.Table' = roles.take(rows[ordered])
+        self.role_celeb: numpy.ndarray = celeb[ordered]
+        self.offsets: numpy.ndarray = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(self.role_celeb, minlength=len(order))))).astype(numpy.int64)
+
+    @staticmethod
+    def load(path: str = './dataset'):
+        """
+        Reads a whole crawled dataset at once; see source_files() for the layouts read.
+        @param path (str) the JSONL or Parquet sink's root, or a folder of celeb '.json' files.
+        @returns Corpus
+        """
+        _require()
+        return Corpus(*_read_tables(path))
+
+    def __len__(self) -> int:
+        return self.celebs.num_rows
+
+    def celeb_numbers(self, name: str) -> 'numpy.ndarray':
+        """
+        @param name (str) a numeric or boolean celebs column, e.g. 'Rank'.
+        @returns values (numpy.ndarray) float64, one per celeb, NaN where missing.
+        """
+        return _numbers(self.celebs.column(name))
+
+    def role_numbers(self, name: str) -> 'numpy.ndarray':
+        """
+        @param name (str) a numeric roles column, e.g. 'Budget'.
+        @returns values (numpy.ndarray) float64, one per role, NaN where missing.
+        """
+        return _numbers(self.roles.column(name))
+
+    def role_years(self) -> 'numpy.ndarray':
+        """
+        @returns years (numpy.ndarray) float64, the first four-digit year of each role's Year, e.g. 2001 for '2001/I'.
+        """
+        years = compute.extract_regex(self.roles.column('Year'), r'(?P<year>\d{4})')
+        return _numbers(compute.cast(compute.struct_field(years, [0]), pyarrow.int64()))
+
+    def role_categories(self, name: str) -> Tuple['numpy.ndarray', 'numpy.ndarray']:
+        """
+        Explodes a categorical roles column, either a list column like Genres or a string column.
+        @param name (str)
+        @returns (roles, values) the role row and value of every (role, value) pair, values as str.
+        """
+        column = self.roles.column(name).combine_chunks()
+        if pyarrow.types.is_list(column.type):
+            values = compute.list_flatten(column)
+            roles = compute.list_parent_indices(column).to_numpy()
+        else:
+            roles = numpy.flatnonzero(column.is_valid().to_numpy(zero_copy_only=False))
+            values = column.drop_null()
+        return roles.astype(numpy.int64), values.to_numpy(zero_copy_only=False).astype(str)
+
+
+class FeatureMatrix():
+    """
+    Per-celeb features as one float64 matrix, a row per celeb (in Corpus order) and a named column per feature.
+    Matrices loaded from the cache are memory-mapped and read-only.
+    usage:
+        ```
+        matrix = load_features('./dataset')
+        gross = matrix.column('Gross_sum')
+        row = matrix.values[matrix.index('nm0000001')]
+        ```
+    """
+
+    def __init__(self, keys: 'numpy.ndarray', columns: List[str], values: 'numpy.ndarray'):
+        """
+        @param keys (numpy.ndarray) the CelebKey of each row.
+        @param columns (List[str]) the name of each column.
+        @param values (numpy.ndarray) shape (len(keys), len(columns)).
+        """
+        self.keys = keys
+        self.columns = columns
+        self.values = values
+        self._positions: Dict[str, int] = {name: i for i, name in enumerate(columns)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def column(self, name: str) -> 'numpy.ndarray':
+        return self.values[:, self._positions[name]]
+
+    def index(self, key: str) -> int:
+        """
+        @param key (str) a CelebKey.
+        @returns row (int) or -1 if the celeb isn't in the matrix.
+        """
+        rows = numpy.flatnonzero(self.keys == key)
+        return int(rows[0]) if len(rows) > 0 else -1
+
+
+def _segments(ufunc, values: 'numpy.ndarray', offsets: 'numpy.ndarray') -> 'numpy.ndarray':
+    """
+    Reduces each celeb's run of role values with a ufunc, e.g. numpy.fmax. Celebs with no roles get NaN.
+    """
+    out = numpy.full(len(offsets) - 1, numpy.nan)
+    filled = offsets[1:] > offsets[:-1]
+    if filled.any():
+        out[filled] = ufunc.reduceat(values, offsets[:-1][filled])
+    return out
+
+
+def _rating(text: str) -> str:
+    # 'Rated R for violence' counts as 'R'.
+    words = text.split()
+    return words[1] if len(words) > 1 and words[0] == 'Rated' else text.strip()
+
+
+def _counts(celeb: 'numpy.ndarray', values: 'numpy.ndarray', size: int, prefix: str) -> Tuple[List[str], 'numpy.ndarray']:
+    """
+    One-hot counts: how many of each celeb's roles carry each value.
+    @returns (columns, counts) a column per distinct value, and the (size, columns) matrix of counts.
+    """
+    names, codes = numpy.unique(values, return_inverse=True)
+    counts = numpy.bincount(celeb * len(names) + codes, minlength=size * len(names)).reshape(size, len(names))
+    return [prefix + str(name) for name in names], counts.astype(numpy.float64)
+
+
+def build_features(corpus: Corpus) -> FeatureMatrix:
+    """
+    Builds per-celeb features from a corpus with array operations over the whole roles table at once:
+    the celeb's own numbers, RoleCount, the ROLE_AGGREGATES of its roles' film numbers, its first and
+    last role year and years active, and one-hot counts of its roles' genres and motion picture ratings.
+    @param corpus (Corpus)
+    @returns FeatureMatrix
+    """
+    size = len(corpus)
+    offsets, celeb = corpus.offsets, corpus.role_celeb
+    columns: List[str] = []
+    blocks: List[numpy.ndarray] = []
+
+    def add(name: str, values: numpy.ndarray):
+        columns.append(name)
+        blocks.append(values.reshape(size, 1))
+
+    for name in CELEB_NUMBERS + ('Deceased',):
+        add(name, corpus.celeb_numbers(name))
+    add('RoleCount', numpy.diff(offsets).astype(numpy.float64))
+
+    for name, aggregates in ROLE_AGGREGATES.items():
+        values = corpus.role_numbers(name)
+        present = ~numpy.isnan(values)
+        total = numpy.bincount(celeb[present], weights=values[present], minlength=size)
+        known = numpy.bincount(celeb[present], minlength=size)
+        for aggregate in aggregates:
+            if aggregate == 'sum':
+                result = numpy.where(known > 0, total, numpy.nan)
+            elif aggregate == 'mean':
+                result = numpy.divide(total, known, out=numpy.full(size, numpy.nan), where=known > 0)
+            else:
+                result = _segments(numpy.fmax if aggregate == 'max' else numpy.fmin, values, offsets)
+            add(str.format('{0}_{1}', name, aggregate), result)
+
+    years = corpus.role_years()
+    first, last = _segments(numpy.fmin, years, offsets), _segments(numpy.fmax, years, offsets)
+    add('FirstYear', first)
+    add('LastYear', last)
+    add('YearsActive', last - first + 1)
+
+    roles, genres = corpus.role_categories('Genres')
+    names, counts = _counts(celeb[roles], genres, size, 'Genre_')
+    columns.extend(names)
+    blocks.append(counts)
+
+    roles, ratings = corpus.role_categories('MotionPictureRating')
+    distinct, codes = numpy.unique(ratings, return_inverse=True)
+    if len(distinct) > 0:
+        ratings = numpy.array([_rating(rating) for rating in distinct], dtype=str)[codes]
+    names, counts = _counts(celeb[roles], ratings, size, 'Rating_')
+    columns.extend(names)
+    blocks.append(counts)
+
+    values = numpy.hstack(blocks) if size > 0 else numpy.zeros((0, len(columns)))
+    return FeatureMatrix(corpus.keys, columns, values)
+
+
+def _save(path: str, array: 'numpy.ndarray'):
+    tmp_path = str.format('{0}.{1}.tmp', path, os.getpid())
+    with open(tmp_path, 'wb') as file:
+        numpy.save(file, array)
+    os.replace(tmp_path, path)
+
+
+def load_features(source: str = './dataset', cache_dir: str = './html/features', rebuild: bool = False) -> FeatureMatrix:
+    """
+    Loads a corpus's feature matrix from the cache, memory-mapped, building and caching it first if the
+    source files changed since it was built.
+    @param source (str) the corpus folder; see source_files().
+    @param cache_dir (str) folder the matrices are cached in, a subfolder per source.
+    @param rebuild (bool) builds the matrix even if the cached one is current.
+    @returns FeatureMatrix
+    """
+    _require()
+    folder = os.path.join(cache_dir, hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:12])
+    meta_path = os.path.join(folder, 'meta.json')
+    keys_path, values_path = os.path.join(folder, 'keys.npy'), os.path.join(folder, 'values.npy')
+    digest = fingerprint(source_files(source))
+
+    meta: Dict = None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        pass
+
+    if rebuild or meta is None or meta.get('fingerprint') != digest:
+        matrix = build_features(Corpus.load(source))
+        os.makedirs(folder, exist_ok=True)
+        _save(keys_path, matrix.keys.astype(str))
+        _save(values_path, numpy.ascontiguousarray(matrix.values, dtype=numpy.float64))
+        # Written last, so a half-written cache is never taken for a current one.
+        meta = {'source': os.path.abspath(source), 'fingerprint': digest, 'columns': matrix.columns}
+        tmp_path = str.format('{0}.{1}.tmp', meta_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, meta_path)
+
+    return FeatureMatrix(numpy.load(keys_path, mmap_mode='r'), meta['columns'], numpy.load(values_path, mmap_mode='r'))
@@ -0,0 +1,333 @@
+from models import Celeb, CelebRole
+from registry import title_id
+from resolver import name_key
+from sinks import celeb_key
+from typing import List, Dict, Tuple, Iterable
+import threading
+import argparse
+import sqlite3
+import os
+
+# Bumped when the tables change. An index from an older version is emptied; rebuild it from the dataset.
+INDEX_VERSION = 2
+
+# Kinds of film entities indexed, and the CelebRole list each is read from.
+ENTITY_FIELDS: Dict[str, str] = {
+    'director': 'Directors',
+    'writer': 'Writers',
+    'star': 'Stars',
+    'genre': 'Genres',
+    'company': 'ProductionCompanies',
+    'keyword': 'PlotKeywords'
+}
+
+
+def film_key(role: CelebRole) -> str:
+    """
+    Key of a role's film: the IMDB title id, or the normalized title if the URL has none.
+    @param role (CelebRole)
+    @returns key (str) or None if the role names no film.
+    """
+    tid = title_id(role.FilmUrl)
+    if tid:
+        return tid
+    return str.format('title:{0}', name_key(role.FilmTitle)) if role.FilmTitle else None
+
+
+class EntityIndex():
+    """
+    Persistent inverted indexes over the crawled dataset: from each director, writer, star, genre, production
+    company and plot keyword to the films it appears in and the crawled celebs who had a role in those films,
+    plus a weighted co-star graph linking every two people who appeared in the same film.
+    Celebs can be added as they're crawled (see IndexSink) or the index rebuilt from a dataset after the crawl.
+    Every entity and person is recorded with the celebs whose roles named it, so re-adding a celeb replaces
+    what it contributed: an entity or co-star no crawled celeb names any more drops out of the index.
+    Lookups are single indexed SQLite queries. Safe to share between worker processes and threads:
+    each thread opens its own connection and the database runs in WAL mode.
+    usage:
+        ```
+        index = EntityIndex('./dataset/entities.db')
+        index.add([celeb])
+        index.films('director', 'Christopher Nolan')
+        index.celebs('director', 'Christopher Nolan')
+        index.costars('Tom Hanks', limit=10)
+        ```
+    """
+
+    def __init__(self, path: str = './dataset/entities.db', timeout: float = 60.0):
+        """
+        @param path (str) the SQLite database file.
+        @param timeout (float) seconds to wait on another process's write lock.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # SQLite connections can't cross process or thread boundaries; each thread opens its own.
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirs = os.path.dirname(self.path)
+            if dirs:
+                os.makedirs(dirs, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if conn.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+                conn.executescript('''
+                    DROP TABLE IF EXISTS films; DROP TABLE IF EXISTS celebs; DROP TABLE IF EXISTS names;
+                    DROP TABLE IF EXISTS entities; DROP TABLE IF EXISTS appearances; DROP TABLE IF EXISTS people;
+                    DROP TABLE IF EXISTS costars;
+                ''')
+                conn.execute(str.format('PRAGMA user_version = {0}', INDEX_VERSION))
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS films (
+                    film TEXT PRIMARY KEY,
+                    title TEXT,
+                    year TEXT
+                );
+                CREATE TABLE IF NOT EXISTS celebs (
+                    celeb TEXT PRIMARY KEY,
+                    name TEXT,
+                    rank INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS names (
+                    kind TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    PRIMARY KEY (kind, entity)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS entities (
+                    kind TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    film TEXT NOT NULL,
+                    celeb TEXT NOT NULL,
+                    PRIMARY KEY (kind, entity, film, celeb)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS entities_film ON entities (film, kind);
+                CREATE INDEX IF NOT EXISTS entities_celeb ON entities (celeb);
+                CREATE TABLE IF NOT EXISTS appearances (
+                    celeb TEXT NOT NULL,
+                    film TEXT NOT NULL,
+                    PRIMARY KEY (celeb, film)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS appearances_film ON appearances (film, celeb);
+                CREATE TABLE IF NOT EXISTS people (
+                    film TEXT NOT NULL,
+                    person TEXT NOT NULL,
+                    celeb TEXT NOT NULL,
+                    PRIMARY KEY (film, person, celeb)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS people_celeb ON people (celeb);
+                CREATE TABLE IF NOT EXISTS costars (
+                    person TEXT NOT NULL,
+                    other TEXT NOT NULL,
+                    films INTEGER NOT NULL,
+                    PRIMARY KEY (person, other)
+                ) WITHOUT ROWID;
+            ''')
+        return conn
+
+    def _add_person(self, conn: sqlite3.Connection, film: str, person: str, name: str, celeb: str):
+        conn.execute('INSERT OR IGNORE INTO names (kind, entity, name) VALUES (?, ?, ?)', ('person', person, name))
+        cast = conn.execute('SELECT 1 FROM people WHERE film = ? AND person = ? LIMIT 1', (film, person)).fetchone() is not None
+        conn.execute('INSERT OR IGNORE INTO people (film, person, celeb) VALUES (?, ?, ?)', (film, person, celeb))
+        if cast:
+            return
+        # A new member of the film's cast: one more shared film with everyone already in it, both ways.
+        for sql in ('INSERT INTO costars (person, other, films) SELECT ?, person, 1 FROM people WHERE film = ? AND person != ? '
+                    'GROUP BY person ON CONFLICT (person, other) DO UPDATE SET films = films + 1',
+                    'INSERT INTO costars (person, other, films) SELECT person, ?, 1 FROM people WHERE film = ? AND person != ? '
+                    'GROUP BY person ON CONFLICT (person, other) DO UPDATE SET films = films + 1'):
+            conn.execute(sql, (person, film, person))
+
+    def _remove_celeb(self, conn: sqlite3.Connection, celeb: str):
+        """
+        Removes what a celeb's roles contributed, dropping people from the casts no other celeb still puts them in.
+        """
+        conn.execute('DELETE FROM entities WHERE celeb = ?', (celeb,))
+        conn.execute('DELETE FROM appearances WHERE celeb = ?', (celeb,))
+        # One at a time, so each pair of people leaving a cast together is counted down once.
+        for row in conn.execute('SELECT film, person FROM people WHERE celeb = ?', (celeb,)).fetchall():
+            film, person = row['film'], row['person']
+            conn.execute('DELETE FROM people WHERE film = ? AND person = ? AND celeb = ?', (film, person, celeb))
+            if conn.execute('SELECT 1 FROM people WHERE film = ? AND person = ? LIMIT 1', (film, person)).fetchone() is not None:
+                continue
+            # One fewer shared film with everyone left in the cast, both ways.
+            others = [other['person'] for other in conn.execute('SELECT DISTINCT person FROM people WHERE film = ?', (film,))]
+            for other in others:
+                for pair in ((person, other), (other, person)):
+                    conn.execute('UPDATE costars SET films = films - 1 WHERE person = ? AND other = ?', pair)
+            conn.execute('DELETE FROM costars WHERE films <= 0 AND (person = ? OR other = ?)', (person, person))
+
+    def _add(self, conn: sqlite3.Connection, celebs: Iterable[Celeb]):
+        for celeb in celebs:
+            key = celeb_key(celeb)
+            self._remove_celeb(conn, key)
+            conn.execute('INSERT OR REPLACE INTO celebs (celeb, name, rank) VALUES (?, ?, ?)', (key, celeb.FullName, celeb.Rank))
+            for role in celeb.Roles or []:
+                film = film_key(role)
+                if film is None:
+                    continue
+                conn.execute('INSERT INTO films (film, title, year) VALUES (?, ?, ?) ON CONFLICT (film) DO UPDATE SET '
+                             'title = coalesce(excluded.title, title), year = coalesce(excluded.year, year)',
+                             (film, role.FilmTitle, role.Year))
+                conn.execute('INSERT OR IGNORE INTO appearances (celeb, film) VALUES (?, ?)', (key, film))
+                for kind, field in ENTITY_FIELDS.items():
+                    for name in getattr(role, field) or []:
+                        entity = name_key(name)
+                        if not entity:
+                            continue
+                        conn.execute('INSERT OR IGNORE INTO names (kind, entity, name) VALUES (?, ?, ?)', (kind, entity, name))
+                        conn.execute('INSERT OR IGNORE INTO entities (kind, entity, film, celeb) VALUES (?, ?, ?, ?)',
+                                     (kind, entity, film, key))
+                        if kind == 'star':
+                            self._add_person(conn, film, entity, name, key)
+                if celeb.FullName:
+                    self._add_person(conn, film, name_key(celeb.FullName), celeb.FullName, key)
+
+    def add(self, celebs: Iterable[Celeb]):
+        """
+        Indexes celebs and the films of their roles in one transaction, replacing what earlier adds of the same celebs contributed.
+        @param celebs (Iterable[Celeb])
+        """
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._add(conn, celebs)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def rebuild(self, source: str = './dataset'):
+        """
+        Clears the index and indexes every celeb of a crawled dataset, in one transaction, so a rebuild that fails
+        part way leaves the previous index as it was. Requires numpy and pyarrow.
+        @param source (str) the JSONL or Parquet sink's root, or a folder of celeb '.json' files.
+        """
+        from corpus import Corpus
+
+        corpus = Corpus.load(source)
+
+        def celebs() -> Iterable[Celeb]:
+            for i, row in enumerate(corpus.celebs.to_pylist()):
+                roles = corpus.roles.slice(corpus.offsets[i], corpus.offsets[i + 1] - corpus.offsets[i]).to_pylist()
+                row['Roles'] = [{name: value for name, value in role.items() if value is not None} for role in roles]
+                yield Celeb.fromDict({name: value for name, value in row.items() if value is not None})
+
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table in ('films', 'celebs', 'names', 'entities', 'appearances', 'people', 'costars'):
+                conn.execute(str.format('DELETE FROM {0}', table))
+            self._add(conn, celebs())
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def films(self, kind: str, name: str) -> List[str]:
+        """
+        @param kind (str) 'director', 'writer', 'star', 'genre', 'company' or 'keyword'.
+        @param name (str) matched without case, accents or extra white space.
+        @returns films (List[str]) film keys, see film_key().
+        """
+        rows = self._db().execute('SELECT DISTINCT film FROM entities WHERE kind = ? AND entity = ? ORDER BY film', (kind, name_key(name)))
+        return [row['film'] for row in rows]
+
+    def celebs(self, kind: str, name: str) -> List[str]:
+        """
+        The crawled celebs with a role in any film of an entity, e.g. everyone who worked with a director.
+        @param kind (str)
+        @param name (str)
+        @returns celebs (List[str]) celeb keys in rank order.
+        """
+        rows = self._db().execute(
+            'SELECT DISTINCT a.celeb, c.rank FROM entities e JOIN appearances a ON a.film = e.film JOIN celebs c ON c.celeb = a.celeb '
+            'WHERE e.kind = ? AND e.entity = ? ORDER BY c.rank IS NULL, c.rank, a.celeb', (kind, name_key(name)))
+        return [row['celeb'] for row in rows]
+
+    def filmography(self, celeb: str) -> List[str]:
+        """
+        @param celeb (str) a celeb key, see sinks.celeb_key().
+        @returns films (List[str])
+        """
+        return [row['film'] for row in self._db().execute('SELECT film FROM appearances WHERE celeb = ? ORDER BY film', (celeb,))]
+
+    def entities(self, film: str, kind: str) -> List[str]:
+        """
+        @param film (str) a film key.
+        @param kind (str)
+        @returns names (List[str]) e.g. the film's directors.
+        """
+        rows = self._db().execute('SELECT DISTINCT n.name FROM entities e JOIN names n ON n.kind = e.kind AND n.entity = e.entity '
+                                  'WHERE e.film = ? AND e.kind = ? ORDER BY n.name', (film, kind))
+        return [row['name'] for row in rows]
+
+    def costars(self, name: str, limit: int = None) -> List[Tuple[str, int]]:
+        """
+        The people who appeared in a film with someone, most shared films first.
+        @param name (str) a celeb or a star, matched like films().
+        @param limit (int) the most co-stars returned, or all if None.
+        @returns costars (List[Tuple[str, int]]) each co-star's name and the number of films shared.
+        """
+        rows = self._db().execute(
+            "SELECT n.name, s.films FROM costars s JOIN names n ON n.kind = 'person' AND n.entity = s.other "
+            'WHERE s.person = ? ORDER BY s.films DESC, n.name LIMIT ?', (name_key(name), -1 if limit is None else limit))
+        return [(row['name'], row['films']) for row in rows]
+
+    def shared_films(self, name: str, other: str) -> List[str]:
+        """
+        @returns films (List[str]) the films two people both appeared in.
+        """
+        rows = self._db().execute('SELECT DISTINCT a.film FROM people a JOIN people b ON b.film = a.film AND b.person = ? '
+                                  'WHERE a.person = ? ORDER BY a.film', (name_key(other), name_key(name)))
+        return [row['film'] for row in rows]
+
+    def close(self):
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds or queries the entity index of a crawled dataset.')
+    parser.add_argument('--db', default='./dataset/entities.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='rebuild the index from a dataset')
+    build.add_argument('source', nargs='?', default='./dataset')
+    films = commands.add_parser('films', help='films of a director, writer, star, genre, company or keyword')
+    films.add_argument('kind', choices=list(ENTITY_FIELDS))
+    films.add_argument('name')
+    celebs = commands.add_parser('celebs', help='crawled celebs with a role in the films of an entity')
+    celebs.add_argument('kind', choices=list(ENTITY_FIELDS))
+    celebs.add_argument('name')
+    costars = commands.add_parser('costars', help="a person's co-stars, most shared films first")
+    costars.add_argument('name')
+    costars.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    index = EntityIndex(args.db)
+    if args.command == 'build':
+        index.rebuild(args.source)
+    elif args.command == 'films':
+        print('\n'.join(index.films(args.kind, args.name)))
+    elif args.command == 'celebs':
+        print('\n'.join(index.celebs(args.kind, args.name)))
+    else:
+        for name, count in index.costars(args.name, args.limit):
+            print(str.format('{0}\t{1}', count, name))
+    index.close()
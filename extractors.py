@@ -0,0 +1,246 @@
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from models import CelebRole
+from typing import List, Dict, Tuple, FrozenSet
+import soupsieve as sv
+import re
+
+# region precompiled selectors and regexes
+
+_credit_links = sv.compile("a")
+_metascore_span = sv.compile(":scope > span")
+_review_links = sv.compile("span.subText > a")
+_popularity_span = sv.compile("div span.subText")
+_keyword_spans = sv.compile(":scope > a > span.itemprop")
+
+_director_re = re.compile(r'^Director')
+_writer_re = re.compile(r'^Writer')
+_star_re = re.compile(r'^Star')
+_more_re = re.compile(r'^\d+\smore')
+_see_re = re.compile(r'^See\s')
+_user_reviews_re = re.compile(r'\d+\suser')
+_critic_reviews_re = re.compile(r'\d+\scritic')
+_popularity_re = re.compile(r'\d+\n')
+_genre_re = re.compile(r'Genre')
+_rating_re = re.compile(r'^Motion Picture Rating')
+_release_date_re = re.compile(r'\d{1,2}\s.*\s\d{4}')
+_money_re = re.compile(r'[\$0-9,]+')
+_non_digit_re = re.compile(r'\D')
+_newline_re = re.compile(r'(\n)')
+_spaces_re = re.compile(r'\s+')
+_strip_re = re.compile(r'(^\s+|\s+$)')
+
+# Release Date, Budget, Opening Weekend, Gross, Cumulative Worldwide Gross, Production Co, Runtime
+_details_re = re.compile(r'^(Release Date|Budget|Opening Weekend|Gross|Cumulative Worldwide Gross|Production Co|Runtime)')
+
+# endregion
+
+# The fields each part of the film page fills.
+_CREDIT_FIELDS = ('Directors', 'Writers', 'Stars')
+_METASCORE_FIELDS = ('Metascore',)
+_REVIEW_FIELDS = ('UserReviews', 'CriticReviews')
+_POPULARITY_FIELDS = ('Popularity',)
+_STORY_LINE_FIELDS = ('PlotKeywords', 'Genres', 'MotionPictureRating')
+_DETAILS_FIELDS = ('ReleaseDate', 'ProductionCompanies', 'RuntimeMinutes', 'Budget', 'OpeningWeekend', 'Gross',
+                   'CumulativeWorldwideGross')
+_LIST_FIELDS = ('Directors', 'Writers', 'Stars', 'Genres', 'ProductionCompanies', 'PlotKeywords')
+
+
+def _to_int(s: str) -> int:
+    digits = _non_digit_re.sub('', s)
+    return int(digits) if digits else None
+
+
+def _has_class(tag: Tag, name: str) -> bool:
+    return name in (tag.get('class') or [])
+
+
+def sibling_text(start: Tag, stop: str) -> str:
+    """
+    Gets the text of the nodes that follow a tag, up to the next sibling tag named `stop`.
+    Reads the tree directly instead of regexing the tag's serialized HTML.
+    @param start (Tag) e.g. the '<br/>' before a character name.
+    @param stop (str) tag name that ends the text, e.g. 'div'.
+    @returns text (str) with newlines removed.
+    """
+    parts: List[str] = []
+    for node in start.next_siblings:
+        if isinstance(node, Tag):
+            if node.name == stop:
+                break
+            parts.append(node.get_text())
+        else:
+            parts.append(str(node))
+    return ''.join(parts).replace('\n', '')
+
+
+class FilmPageExtractor():
+    """
+    Extracts the film fields of a CelebRole from an IMDB title page in a single walk over the document.
+    Every 'div' is visited once and dispatched on its class or its parent's id, instead of
+    re-running one selector per field. Given a set of fields, only the parts of the page that fill them are read.
+    usage:
+        ```
+        extractor = FilmPageExtractor()
+        extractor.extract(soup, role)
+        extractor.extract(soup, role, fields=frozenset(['Genres', 'RuntimeMinutes']))
+        ```
+    """
+
+    def extract(self, soup: BeautifulSoup, role: CelebRole, fields: FrozenSet[str] = None) -> CelebRole:
+        """
+        Fills the film fields of a role from a parsed film page.
+        @param soup (BeautifulSoup) the parsed film page.
+        @param role (CelebRole)
+        @param fields (FrozenSet[str]) the film fields to fill. If None, all of them.
+        @returns CelebRole
+        """
+        def wanted(names: Tuple[str, ...]) -> bool:
+            return fields is None or any(name in fields for name in names)
+
+        credit, metascore, reviews = wanted(_CREDIT_FIELDS), wanted(_METASCORE_FIELDS), wanted(_REVIEW_FIELDS)
+        popularity, story_line, details = wanted(_POPULARITY_FIELDS), wanted(_STORY_LINE_FIELDS), wanted(_DETAILS_FIELDS)
+
+        # A part of the page can fill more fields than were asked for; those are dropped at the end.
+        before: Dict = role.toDict()
+        for name in _LIST_FIELDS:
+            setattr(role, name, [])
+
+        metascore_found = not metascore
+        for div in soup.find_all('div'):
+            classes = div.get('class') or []
+            parent = div.parent
+            parent_id = parent.get('id') if parent is not None else None
+
+            if credit and 'credit_summary_item' in classes:
+                if any(_has_class(p, 'plot_summary') for p in div.parents if p.name == 'div'):
+                    self._credit(div, role)
+            if 'metacriticScore' in classes and not metascore_found:
+                metascore_found = self._metascore(div, role)
+            if reviews and 'titleReviewBarItem' in classes:
+                self._reviews(div, role)
+            if popularity and 'titleReviewBarSubItem' in classes:
+                self._popularity(div, role)
+            if story_line and parent_id == 'titleStoryLine':
+                self._story_line(div, role)
+            elif details and parent_id == 'titleDetails':
+                self._details(div, role)
+
+        if fields is not None:
+            for name in role.FIELDS:
+                if name in before or name in fields or not role.isSet(name):
+                    continue
+                delattr(role, name)
+        return role
+
+    def _credit(self, item: Tag, role: CelebRole):
+        h4 = item.find('h4')
+        if not h4:
+            return
+        label = h4.text
+
+        # Directors
+        if _director_re.search(label):
+            for director in _credit_links.select(item):
+                if director.text not in role.Directors and not _more_re.search(director.text):
+                    role.Directors.append(director.text)
+        # Writers
+        elif _writer_re.search(label):
+            for writer in _credit_links.select(item):
+                if writer.text not in role.Writers and not _more_re.search(writer.text):
+                    role.Writers.append(writer.text)
+        # Stars
+        elif _star_re.search(label):
+            for star in _credit_links.select(item):
+                if not _see_re.search(star.text) and star.text not in role.Stars:
+                    role.Stars.append(star.text)
+
+    def _metascore(self, div: Tag, role: CelebRole) -> bool:
+        # Metascore
+        span = _metascore_span.select_one(div)
+        if span is None:
+            return False
+        role.Metascore = _to_int(span.text)
+        return True
+
+    def _reviews(self, div: Tag, role: CelebRole):
+        for review in _review_links.select(div):
+            # UserReviews
+            if _user_reviews_re.search(review.text):
+                role.UserReviews = _to_int(review.text)
+            # CriticReviews
+            if _critic_reviews_re.search(review.text):
+                role.CriticReviews = _to_int(review.text)
+
+    def _popularity(self, item: Tag, role: CelebRole):
+        # Popularity
+        for div in item.find_all('div'):
+            if 'Popularity' in div.text:
+                popularity = _popularity_span.select_one(item)
+                if popularity:
+                    rank = _popularity_re.findall(popularity.text)
+                    if len(rank) > 0:
+                        role.Popularity = _to_int(rank[0])
+
+    def _story_line(self, item: Tag, role: CelebRole):
+        # PlotKeywords
+        for span in _keyword_spans.select(item):
+            kw = _spaces_re.sub(' ', _newline_re.sub('', span.text))
+            if kw not in role.PlotKeywords:
+                role.PlotKeywords.append(kw)
+
+        h4 = item.find('h4')
+        if not h4:
+            return
+        # Genres
+        if _genre_re.search(h4.text):
+            for genre in _credit_links.select(item):
+                ge = _strip_re.sub('', genre.text)
+                if ge not in role.Genres:
+                    role.Genres.append(ge)
+        # MotionPictureRating
+        elif _rating_re.search(h4.text):
+            rating = item.find('span')
+            if rating:
+                role.MotionPictureRating = rating.text
+
+    def _details(self, item: Tag, role: CelebRole):
+        h4 = item.find('h4')
+        if not h4:
+            return
+        m = _details_re.search(h4.text)
+        if not m:
+            return
+        label = m.group(1)
+
+        # ReleaseDate
+        if label == 'Release Date':
+            release_date = _release_date_re.findall(item.text)
+            if len(release_date) > 0:
+                role.ReleaseDate = release_date[0]
+        # ProductionCompanies
+        elif label == 'Production Co':
+            for a in _credit_links.select(item):
+                if not _see_re.search(a.text):
+                    pc = _strip_re.sub('', a.text)
+                    if pc not in role.ProductionCompanies:
+                        role.ProductionCompanies.append(pc)
+        # RuntimeMinutes
+        elif label == 'Runtime':
+            runtime = item.find('time')
+            if runtime:
+                role.RuntimeMinutes = _to_int(runtime.text)
+        # Budget, OpeningWeekend, Gross, CumulativeWorldwideGross
+        else:
+            amounts: List[str] = _money_re.findall(item.text)
+            if len(amounts) == 0:
+                return
+            amount = _to_int(amounts[0])
+            if label == 'Budget':
+                role.Budget = amount
+            elif label == 'Opening Weekend':
+                role.OpeningWeekend = amount
+            elif label == 'Gross':
+                role.Gross = amount
+            else:
+                role.CumulativeWorldwideGross = amount
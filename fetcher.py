@@ -0,0 +1,130 @@
+from urllib3 import PoolManager
+from urllib3.response import HTTPResponse
+from urllib3.util import Timeout
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+import urllib3 as urllib
+import asyncio
+
+DEFAULT_HEADERS: Dict[str, str] = {
+    'User-Agent': 'RIVA Solutions, Inc.',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive'
+}
+
+
+def create_pool_manager(maxsize: int = 10, timeout: float = 30.0) -> PoolManager:
+    """
+    Creates a long-lived connection pool. Connections are kept alive between requests
+    and gzip/deflate bodies are decoded by urllib3.
+    @param maxsize (int) the number of connections to keep open per host.
+    @param timeout (float) connect/read timeout in seconds.
+    @returns PoolManager
+    """
+    return urllib.PoolManager(
+        num_pools=32,
+        maxsize=maxsize,
+        block=True,
+        headers=DEFAULT_HEADERS,
+        timeout=Timeout(total=timeout)
+    )
+
+
+class AsyncFetcher():
+    """
+    Asyncio fetch engine. Keeps one long-lived, pooled client per host and caps the number
+    of concurrent requests per host, so hundreds of requests can be in flight across hosts.
+    usage:
+        ```
+        async with AsyncFetcher(per_host_concurrency=32) as fetcher:
+            pages = await fetcher.fetch_all(urls)
+        ```
+    """
+
+    def __init__(self, per_host_concurrency: int = 16, host_limits: Dict[str, int] = None,
+                 max_in_flight: int = 256, timeout: float = 30.0, transport=None):
+        """
+        @param per_host_concurrency (int) default number of concurrent requests per host.
+        @param host_limits (Dict[str, int]) per-host overrides, e.g. {'www.imdb.com': 64}.
+        @param max_in_flight (int) the total number of requests in flight across all hosts.
+        @param timeout (float) connect/read timeout in seconds.
+        @param transport (Transport) sends the requests instead of this fetcher's own per-host clients.
+        """
+        self.transport = transport
+        self.per_host_concurrency = per_host_concurrency
+        self.host_limits: Dict[str, int] = host_limits or {}
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._clients: Dict[str, PoolManager] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _limit(self, host: str) -> int:
+        return self.host_limits.get(host, self.per_host_concurrency)
+
+    def _client(self, host: str) -> PoolManager:
+        """
+        Returns the pooled client for a host, creating it on first use.
+        @param host (str)
+        @returns PoolManager
+        """
+        client = self._clients.get(host)
+        if client is None:
+            client = create_pool_manager(maxsize=self._limit(host), timeout=self.timeout)
+            self._clients[host] = client
+        return client
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self._limit(host))
+            self._semaphores[host] = sem
+        return sem
+
+    def _request(self, client: PoolManager, url: str, headers: Dict[str, str]) -> HTTPResponse:
+        return client.request('GET', url, headers=headers)
+
+    async def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        """
+        Sends a GET request without blocking the event loop.
+        @param url (str)
+        @param headers (Dict[str, str]) extra request headers, e.g. conditional request headers.
+        @returns HTTPResponse
+        """
+        host = urlsplit(url).netloc
+        async with self._semaphore(host):
+            loop = asyncio.get_running_loop()
+            if self.transport is not None:
+                return await loop.run_in_executor(self._executor, self.transport.request, url, headers or {})
+            return await loop.run_in_executor(self._executor, self._request, self._client(host), url, headers or {})
+
+    async def fetch(self, url: str, headers: Dict[str, str] = None) -> str:
+        """
+        Gets the raw HTML from a web page URL without blocking the event loop.
+        @param url (str)
+        @param headers (Dict[str, str]) extra request headers.
+        @returns html (str)
+        """
+        res: HTTPResponse = await self.request(url, headers)
+        return res.data.decode('utf-8')
+
+    async def fetch_all(self, urls: List[str]) -> List[str]:
+        """
+        Fetches many URLs concurrently, preserving order.
+        @param urls (List[str])
+        @returns pages (List[str])
+        """
+        return list(await asyncio.gather(*[self.fetch(url) for url in urls]))
+
+    def close(self):
+        for client in self._clients.values():
+            client.clear()
+        self._clients = {}
+        self._executor.shutdown(wait=False)
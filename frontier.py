@@ -0,0 +1,547 @@
+from urllib.parse import urlsplit
+from typing import List, Dict, Tuple, Callable
+import threading
+import sqlite3
+import socket
+import time
+import os
+
+# Statuses of a work item.
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class FrontierStore():
+    """
+    Shared queues of crawl work for workers on several nodes. Workers claim items under expiring leases:
+    an item whose lease runs out before it's completed (its worker died or stalled) is handed out again.
+    Items are keyed, so adding work that's already queued, leased or done is a no-op, and the result of
+    each item is kept in the store. Nodes announce themselves with heartbeats.
+    usage:
+        ```
+        store = get_frontier('sqlite:///shared/frontier.db')
+        store.add('celebs', {'Tom Hanks': payload})
+        for key, payload in store.claim('celebs', 'node-1', limit=1, lease=120):
+            store.complete('celebs', 'node-1', key, result)
+        ```
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        """
+        @param max_attempts (int) claims an item gets before a failure is final.
+        """
+        self.max_attempts = max_attempts
+
+    def add(self, queue: str, items: Dict[str, str]) -> int:
+        """
+        Queues items that aren't in the queue yet.
+        @param queue (str)
+        @param items (Dict[str, str]) payload by key.
+        @returns added (int) the number of new items.
+        """
+        raise NotImplementedError()
+
+    def claim(self, queue: str, owner: str, limit: int = 1, lease: float = 60.0) -> List[Tuple[str, str]]:
+        """
+        Leases pending items, oldest first, along with items whose lease expired.
+        @param queue (str)
+        @param owner (str) the claiming worker.
+        @param limit (int) the most items claimed.
+        @param lease (float) seconds the items are held before they're handed out again.
+        @returns items (List[Tuple[str, str]]) the (key, payload) of each claimed item.
+        """
+        raise NotImplementedError()
+
+    def renew(self, queue: str, owner: str, keys: List[str], lease: float = 60.0):
+        """
+        Extends the leases the owner still holds on some items.
+        """
+        raise NotImplementedError()
+
+    def complete(self, queue: str, owner: str, key: str, result: str) -> bool:
+        """
+        Records an item's result. The first result recorded is kept. Ignored unless the owner
+        was the last worker to claim the item.
+        @returns bool True if the result was recorded.
+        """
+        raise NotImplementedError()
+
+    def fail(self, queue: str, owner: str, key: str, error: str) -> bool:
+        """
+        Hands a failed item out again, or marks it failed once it has had max_attempts claims.
+        Ignored unless the owner still holds the item's lease, so a worker whose lease expired
+        can't requeue an item another worker has since claimed.
+        @returns bool True if the failure was recorded.
+        """
+        raise NotImplementedError()
+
+    def get(self, queue: str, key: str) -> Dict:
+        """
+        @returns item (Dict) its 'status', 'result', 'error' and 'attempts', or None if it was never queued.
+        """
+        raise NotImplementedError()
+
+    def results(self, queue: str) -> Dict[str, str]:
+        """
+        @returns results (Dict[str, str]) the result of every completed item, by key.
+        """
+        raise NotImplementedError()
+
+    def errors(self, queue: str) -> Dict[str, str]:
+        """
+        @returns errors (Dict[str, str]) the last error of every item that failed for good, by key.
+        """
+        raise NotImplementedError()
+
+    def counts(self, queue: str) -> Dict[str, int]:
+        """
+        @returns counts (Dict[str, int]) number of items pending, leased, done and failed.
+        """
+        raise NotImplementedError()
+
+    def heartbeat(self, node: str):
+        """
+        Records that a node is alive.
+        """
+        raise NotImplementedError()
+
+    def nodes(self, ttl: float) -> List[str]:
+        """
+        @param ttl (float) seconds since a node's last heartbeat after which it's presumed dead.
+        @returns nodes (List[str]) the live nodes, sorted.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class SqliteFrontier(FrontierStore):
+    """
+    Frontier in a SQLite database, e.g. on a volume every node mounts. Claims run in an immediate
+    transaction, so no two workers lease the same item. Each thread opens its own connection.
+    Network file systems generally don't support WAL mode, so it's off unless asked for.
+    """
+
+    def __init__(self, path: str = './html/frontier.db', max_attempts: int = 3, timeout: float = 60.0, wal: bool = False):
+        """
+        @param path (str) the SQLite database file.
+        @param max_attempts (int) claims an item gets before a failure is final.
+        @param timeout (float) seconds to wait on another worker's write lock.
+        @param wal (bool) use WAL mode; only when every worker is on the same machine.
+        """
+        super().__init__(max_attempts)
+        self.path = path
+        self.timeout = timeout
+        self.wal = wal
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # SQLite connections can't cross process or thread boundaries; each thread opens its own.
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirs = os.path.dirname(self.path)
+            if dirs:
+                os.makedirs(dirs, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            if self.wal:
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS items (
+                    queue TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    PRIMARY KEY (queue, key)
+                );
+                CREATE INDEX IF NOT EXISTS items_claim ON items (queue, status, seq);
+                CREATE TABLE IF NOT EXISTS nodes (
+                    node TEXT PRIMARY KEY,
+                    seen REAL NOT NULL
+                );
+            ''')
+        return conn
+
+    def _transaction(self, work):
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(conn)
+            conn.execute('COMMIT')
+            return result
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add(self, queue: str, items: Dict[str, str]) -> int:
+        def insert(conn: sqlite3.Connection) -> int:
+            seq = conn.execute('SELECT coalesce(max(seq), 0) FROM items WHERE queue = ?', (queue,)).fetchone()[0]
+            added = 0
+            for key, payload in items.items():
+                seq += 1
+                added += conn.execute('INSERT OR IGNORE INTO items (queue, key, seq, payload, status) VALUES (?, ?, ?, ?, ?)',
+                                      (queue, key, seq, payload, PENDING)).rowcount
+            return added
+        return self._transaction(insert) if len(items) > 0 else 0
+
+    def claim(self, queue: str, owner: str, limit: int = 1, lease: float = 60.0) -> List[Tuple[str, str]]:
+        def take(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+            now = time.time()
+            rows = conn.execute('SELECT key, payload FROM items WHERE queue = ? AND (status = ? OR (status = ? AND lease_until < ?)) '
+                                'ORDER BY seq LIMIT ?', (queue, PENDING, LEASED, now, limit)).fetchall()
+            for row in rows:
+                conn.execute('UPDATE items SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 WHERE queue = ? AND key = ?',
+                             (LEASED, owner, now + lease, queue, row['key']))
+            return [(row['key'], row['payload']) for row in rows]
+        return self._transaction(take)
+
+    def renew(self, queue: str, owner: str, keys: List[str], lease: float = 60.0):
+        conn = self._db()
+        for key in keys:
+            conn.execute('UPDATE items SET lease_until = ? WHERE queue = ? AND key = ? AND status = ? AND owner = ?',
+                         (time.time() + lease, queue, key, LEASED, owner))
+
+    def complete(self, queue: str, owner: str, key: str, result: str) -> bool:
+        return self._db().execute('UPDATE items SET status = ?, result = ?, error = NULL, lease_until = NULL '
+                                  'WHERE queue = ? AND key = ? AND status = ? AND owner = ?',
+                                  (DONE, result, queue, key, LEASED, owner)).rowcount == 1
+
+    def fail(self, queue: str, owner: str, key: str, error: str) -> bool:
+        # The owner is cleared with the lease, so a late complete() from this worker can't finish a requeued item.
+        return self._db().execute('UPDATE items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, '
+                                  'owner = NULL, lease_until = NULL WHERE queue = ? AND key = ? AND status = ? AND owner = ?',
+                                  (self.max_attempts, FAILED, PENDING, error, queue, key, LEASED, owner)).rowcount == 1
+
+    def get(self, queue: str, key: str) -> Dict:
+        row = self._db().execute('SELECT status, result, error, attempts FROM items WHERE queue = ? AND key = ?', (queue, key)).fetchone()
+        return dict(row) if row else None
+
+    def results(self, queue: str) -> Dict[str, str]:
+        rows = self._db().execute('SELECT key, result FROM items WHERE queue = ? AND status = ? ORDER BY seq', (queue, DONE))
+        return {row['key']: row['result'] for row in rows}
+
+    def errors(self, queue: str) -> Dict[str, str]:
+        rows = self._db().execute('SELECT key, error FROM items WHERE queue = ? AND status = ? ORDER BY seq', (queue, FAILED))
+        return {row['key']: row['error'] for row in rows}
+
+    def counts(self, queue: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self._db().execute('SELECT status, COUNT(*) AS n FROM items WHERE queue = ? GROUP BY status', (queue,)):
+            counts[row['status']] = row['n']
+        return counts
+
+    def heartbeat(self, node: str):
+        self._db().execute('INSERT OR REPLACE INTO nodes (node, seen) VALUES (?, ?)', (node, time.time()))
+
+    def nodes(self, ttl: float) -> List[str]:
+        rows = self._db().execute('SELECT node FROM nodes WHERE seen >= ? ORDER BY node', (time.time() - ttl,))
+        return [row['node'] for row in rows]
+
+    def close(self):
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RespError(Exception):
+    """
+    An error reply from a Redis-compatible server.
+    """
+
+
+class RespClient():
+    """
+    Minimal client for the Redis protocol (RESP), enough for RedisFrontier. Any client with the same
+    execute_command() method, e.g. redis.Redis, can be used instead.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._sock: socket.socket = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile('rb')
+        if self.db:
+            self.execute_command('SELECT', self.db)
+
+    def _read(self):
+        line: bytes = self._file.readline()
+        if not line:
+            raise ConnectionError('Connection closed by the server.')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._file.read(size + 2)[:-2]
+            return data.decode('utf-8')
+        if kind == b'*':
+            size = int(rest)
+            return None if size < 0 else [self._read() for _ in range(size)]
+        raise RespError(str.format('Unexpected reply: {0!r}', line))
+
+    def execute_command(self, *args):
+        if self._sock is None:
+            self._connect()
+        parts: List[bytes] = [str.format('*{0}\r\n', len(args)).encode('utf-8')]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(str.format('${0}\r\n', len(data)).encode('utf-8'))
+            parts.append(data + b'\r\n')
+        try:
+            self._sock.sendall(b''.join(parts))
+            return self._read()
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+
+def _text(value):
+    # redis-py hands back bytes; RespClient already decodes.
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, list):
+        return [_text(item) for item in value]
+    return value
+
+
+class RedisFrontier(FrontierStore):
+    """
+    Frontier in a Redis-compatible server. Each queue is a sorted set of pending keys, a sorted set of
+    leased keys scored by lease expiry, and hashes of payloads, owners, attempts, results and errors.
+    Every move of a key between the sets is one optimistic WATCH/MULTI/EXEC transaction, so a worker
+    that dies mid-claim leaves the key where it was, and no server-side scripts are needed: it also runs
+    against the local stand-in (see standin.RedisStandIn). Each thread opens its own connection.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, prefix: str = 'frontier',
+                 max_attempts: int = 3, client_factory=None):
+        """
+        @param host (str)
+        @param port (int)
+        @param db (int) the database number.
+        @param prefix (str) prepended to every key, so several crawls can share a server.
+        @param max_attempts (int) claims an item gets before a failure is final.
+        @param client_factory (Callable) makes a client with execute_command() that sends every command on one
+            connection, e.g. redis.Redis(single_connection_client=True). Defaults to RespClient.
+        """
+        super().__init__(max_attempts)
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self.client_factory = client_factory
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _call(self, *args):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self.client_factory() if self.client_factory else RespClient(self.host, self.port, self.db)
+            self._local.client = client
+        return _text(client.execute_command(*args))
+
+    def _key(self, queue: str, part: str) -> str:
+        return str.format('{0}:{1}:{2}', self.prefix, queue, part)
+
+    def add(self, queue: str, items: Dict[str, str]) -> int:
+        payloads = self._key(queue, 'payload')
+        added = 0
+        for key, payload in items.items():
+            # The payload hash is the queue's membership record; a key is registered and queued together or not at
+            # all. A sequence number taken for a key another worker queued first is just skipped.
+            seq = self._call('INCR', self._key(queue, 'seq'))
+            if self._atomic([payloads], lambda: self._call('HEXISTS', payloads, key) == 0, [
+                ('HSET', payloads, key, payload),
+                ('ZADD', self._key(queue, 'pending'), seq, key)
+            ]):
+                added += 1
+        return added
+
+    def _atomic(self, watch: List[str], check: Callable[[], bool], commands: List[Tuple]) -> bool:
+        """
+        Runs commands as one MULTI/EXEC transaction if check() holds, retrying whenever another
+        client changes the watched key between the check and the commit.
+        @param watch (List[str]) the keys check() reads.
+        @param check (Callable[[], bool])
+        @param commands (List[Tuple]) the commands to run together.
+        @returns bool False if check() didn't hold.
+        """
+        while True:
+            self._call('WATCH', *watch)
+            if not check():
+                self._call('UNWATCH')
+                return False
+            self._call('MULTI')
+            for command in commands:
+                self._call(*command)
+            if self._call('EXEC') is not None:
+                return True
+
+    def _requeue_expired(self, queue: str):
+        leased = self._key(queue, 'leased')
+        for key in self._call('ZRANGEBYSCORE', leased, '-inf', time.time()) or []:
+            def expired() -> bool:
+                score = self._call('ZSCORE', leased, key)
+                return score is not None and float(score) <= time.time()
+            # Requeued at the front.
+            self._atomic([leased], expired, [('ZREM', leased, key), ('HDEL', self._key(queue, 'owner'), key),
+                                             ('ZADD', self._key(queue, 'pending'), 0, key)])
+
+    def claim(self, queue: str, owner: str, limit: int = 1, lease: float = 60.0) -> List[Tuple[str, str]]:
+        self._requeue_expired(queue)
+        pending = self._key(queue, 'pending')
+        claimed: List[Tuple[str, str]] = []
+        for key in self._call('ZRANGE', pending, 0, limit - 1) or []:
+            if self._call('HEXISTS', self._key(queue, 'result'), key) == 1:
+                self._call('ZREM', pending, key)
+                continue
+            # Another worker may take the key first; then it's no longer pending and is skipped.
+            taken = self._atomic([pending], lambda: self._call('ZSCORE', pending, key) is not None, [
+                ('ZREM', pending, key),
+                ('ZADD', self._key(queue, 'leased'), time.time() + lease, key),
+                ('HSET', self._key(queue, 'owner'), key, owner),
+                ('HINCRBY', self._key(queue, 'attempts'), key, 1)
+            ])
+            if taken:
+                claimed.append((key, self._call('HGET', self._key(queue, 'payload'), key)))
+        return claimed
+
+    def renew(self, queue: str, owner: str, keys: List[str], lease: float = 60.0):
+        for key in keys:
+            if self._call('HGET', self._key(queue, 'owner'), key) == owner:
+                self._call('ZADD', self._key(queue, 'leased'), 'XX', time.time() + lease, key)
+
+    def _holds(self, queue: str, owner: str, key: str) -> bool:
+        return self._call('HGET', self._key(queue, 'owner'), key) == owner \
+            and self._call('ZSCORE', self._key(queue, 'leased'), key) is not None
+
+    def complete(self, queue: str, owner: str, key: str, result: str) -> bool:
+        owners, leased = self._key(queue, 'owner'), self._key(queue, 'leased')
+        return self._atomic([owners, leased], lambda: self._holds(queue, owner, key), [
+            ('HSETNX', self._key(queue, 'result'), key, result),
+            ('HDEL', self._key(queue, 'error'), key),
+            ('HDEL', owners, key),
+            ('ZREM', leased, key),
+            ('ZREM', self._key(queue, 'pending'), key)
+        ])
+
+    def fail(self, queue: str, owner: str, key: str, error: str) -> bool:
+        owners, leased = self._key(queue, 'owner'), self._key(queue, 'leased')
+        if self._call('HEXISTS', self._key(queue, 'result'), key) == 1:
+            return False
+        attempts = int(self._call('HGET', self._key(queue, 'attempts'), key) or 0)
+        if attempts >= self.max_attempts:
+            requeue: Tuple = ('HSET', self._key(queue, 'error'), key, error)
+        else:
+            requeue = ('ZADD', self._key(queue, 'pending'), self._call('INCR', self._key(queue, 'seq')), key)
+        return self._atomic([owners, leased], lambda: self._holds(queue, owner, key), [('ZREM', leased, key), ('HDEL', owners, key), requeue])
+
+    def get(self, queue: str, key: str) -> Dict:
+        if self._call('HEXISTS', self._key(queue, 'payload'), key) != 1:
+            return None
+        result = self._call('HGET', self._key(queue, 'result'), key)
+        error = self._call('HGET', self._key(queue, 'error'), key)
+        if result is not None:
+            status = DONE
+        elif error is not None:
+            status = FAILED
+        elif self._call('ZSCORE', self._key(queue, 'leased'), key) is not None:
+            status = LEASED
+        else:
+            status = PENDING
+        return {'status': status, 'result': result, 'error': error,
+                'attempts': int(self._call('HGET', self._key(queue, 'attempts'), key) or 0)}
+
+    def _hash(self, name: str) -> Dict[str, str]:
+        values = self._call('HGETALL', name) or []
+        return dict(zip(values[0::2], values[1::2]))
+
+    def results(self, queue: str) -> Dict[str, str]:
+        return self._hash(self._key(queue, 'result'))
+
+    def errors(self, queue: str) -> Dict[str, str]:
+        return self._hash(self._key(queue, 'error'))
+
+    def counts(self, queue: str) -> Dict[str, int]:
+        return {
+            PENDING: self._call('ZCARD', self._key(queue, 'pending')),
+            LEASED: self._call('ZCARD', self._key(queue, 'leased')),
+            DONE: self._call('HLEN', self._key(queue, 'result')),
+            FAILED: self._call('HLEN', self._key(queue, 'error'))
+        }
+
+    def heartbeat(self, node: str):
+        self._call('ZADD', str.format('{0}:nodes', self.prefix), time.time(), node)
+
+    def nodes(self, ttl: float) -> List[str]:
+        return sorted(self._call('ZRANGEBYSCORE', str.format('{0}:nodes', self.prefix), time.time() - ttl, '+inf') or [])
+
+    def close(self):
+        client = getattr(self._local, 'client', None)
+        if client is not None:
+            client.close()
+            self._local.client = None
+
+
+def get_frontier(url: str, max_attempts: int = 3) -> FrontierStore:
+    """
+    Gets a frontier store from a URL: 'sqlite:///path/to/frontier.db' (relative: 'sqlite:///./frontier.db')
+    or 'redis://host:port/db'.
+    @param url (str)
+    @param max_attempts (int) claims an item gets before a failure is final.
+    @returns FrontierStore
+    """
+    parts = urlsplit(url)
+    if parts.scheme == 'sqlite':
+        return SqliteFrontier(parts.path[1:] if parts.path.startswith('/.') else parts.path, max_attempts=max_attempts)
+    if parts.scheme == 'redis':
+        db = int(parts.path.strip('/') or 0)
+        return RedisFrontier(parts.hostname or '127.0.0.1', parts.port or 6379, db, max_attempts=max_attempts)
+    raise ValueError(str.format('Unknown frontier store: {0}', url))
@@ -0,0 +1,148 @@
+from typing import List, Dict
+import threading
+import sqlite3
+import time
+import os
+
+# Kinds of work tracked by the manifest.
+CELEB = 'celeb'
+SEARCH = 'search'
+PROFILE = 'profile'
+FILM = 'film'
+
+# Statuses
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+_COLUMNS: List[str] = ['kind', 'key', 'status', 'url', 'fetched_at', 'etag', 'last_modified', 'content_hash', 'ref', 'data', 'error']
+
+
+class CrawlManifest():
+    """
+    SQLite-backed record of crawl progress. Tracks every celeb, search resolution, profile and film
+    with its status, fetch time, ETag/Last-Modified and content hash, so a crawl can resume after a
+    crash and a refresh can send conditional requests.
+    Safe to share between worker processes and threads: each thread opens its own connection and the
+    database runs in WAL mode.
+    usage:
+        ```
+        manifest = CrawlManifest('./html/manifest.db')
+        manifest.mark(FILM, 'tt0111161', DONE, url=url, etag=etag)
+        manifest.is_done(FILM, 'tt0111161')
+        ```
+    """
+
+    def __init__(self, path: str = './html/manifest.db', timeout: float = 60.0):
+        """
+        @param path (str) the SQLite database file.
+        @param timeout (float) seconds to wait on another process's write lock.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # SQLite connections can't cross process or thread boundaries; each thread opens its own.
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirs = os.path.dirname(self.path)
+            if dirs:
+                os.makedirs(dirs, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    url TEXT,
+                    fetched_at REAL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    ref TEXT,
+                    data TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_status ON entries (kind, status)')
+        return conn
+
+    def get(self, kind: str, key: str) -> Dict:
+        """
+        @param kind (str) 'celeb', 'search', 'profile' or 'film'.
+        @param key (str)
+        @returns entry (Dict) or None if the manifest has no record.
+        """
+        row = self._db().execute('SELECT * FROM entries WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return dict(row) if row else None
+
+    def is_done(self, kind: str, key: str) -> bool:
+        entry = self.get(kind, key)
+        return entry is not None and entry['status'] == DONE
+
+    def mark(self, kind: str, key: str, status: str, **fields) -> Dict:
+        """
+        Records the status of a piece of work. Fields that aren't given keep their previous values.
+        @param kind (str)
+        @param key (str)
+        @param status (str) 'pending', 'done' or 'failed'.
+        @param fields url, fetched_at, etag, last_modified, content_hash, ref, data, error.
+        @returns entry (Dict)
+        """
+        unknown = [name for name in fields if name not in _COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError(str.format('Unknown manifest fields: {0}', ', '.join(unknown)))
+
+        entry: Dict = self.get(kind, key) or {name: None for name in _COLUMNS}
+        entry.update(fields)
+        entry.update({'kind': kind, 'key': key, 'status': status, 'updated_at': time.time()})
+        if status != FAILED:
+            entry['error'] = fields.get('error')
+
+        names = _COLUMNS + ['updated_at']
+        self._db().execute(
+            str.format('INSERT OR REPLACE INTO entries ({0}) VALUES ({1})', ', '.join(names), ', '.join('?' for _ in names)),
+            [entry[name] for name in names])
+        return entry
+
+    def keys(self, kind: str, status: str = None) -> List[str]:
+        """
+        @param kind (str)
+        @param status (str) only keys with this status, or all keys if None.
+        @returns keys (List[str])
+        """
+        if status is None:
+            rows = self._db().execute('SELECT key FROM entries WHERE kind = ?', (kind,))
+        else:
+            rows = self._db().execute('SELECT key FROM entries WHERE kind = ? AND status = ?', (kind, status))
+        return [row['key'] for row in rows]
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """
+        @returns counts (Dict[str, Dict[str, int]]) number of entries per kind and status.
+        """
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in self._db().execute('SELECT kind, status, COUNT(*) AS n FROM entries GROUP BY kind, status'):
+            counts.setdefault(row['kind'], {})[row['status']] = row['n']
+        return counts
+
+    def close(self):
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,429 @@
+from contextlib import contextmanager
+from typing import List, Dict, Tuple
+import threading
+import tracemalloc
+import cProfile
+import pstats
+import bisect
+import json
+import time
+import os
+
+# Latency bucket upper bounds in seconds: 1ms doubling up to ~65s.
+BUCKETS: List[float] = [0.001 * 2 ** i for i in range(17)]
+
+
+def metric_key(name: str, labels: Dict[str, str] = None) -> str:
+    """
+    Formats a metric name with labels the way Prometheus does, e.g. 'page_cache{kind="film",result="hit"}'.
+    """
+    if not labels:
+        return name
+    return str.format('{0}{{{1}}}', name, ','.join(str.format('{0}="{1}"', k, v) for k, v in sorted(labels.items())))
+
+
+class Histogram():
+    """
+    Fixed-bucket latency histogram. Histograms from different processes merge by adding buckets.
+    """
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: float = None
+        self.max: float = None
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, data: Dict):
+        for i, n in enumerate(data['buckets']):
+            self.buckets[i] += n
+        self.count += data['count']
+        self.sum += data['sum']
+        if data['min'] is not None:
+            self.min = data['min'] if self.min is None else min(self.min, data['min'])
+            self.max = data['max'] if self.max is None else max(self.max, data['max'])
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in, capped at the largest value seen.
+        """
+        if self.count == 0:
+            return None
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {'buckets': list(self.buckets), 'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max}
+
+
+class _ProfileStats():
+    # Lets pstats load stats that were collected in another process.
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Metrics():
+    """
+    Crawl metrics: a latency histogram per stage, counters (bytes, cache hits and misses, retries,
+    response statuses) and gauges (queue depth). Safe to share between threads.
+    Each worker process starts with empty metrics and hands its increments back with drain();
+    the parent merges them, so the totals cover every process.
+    Stages listed in `profile` also run under cProfile, merged per stage across threads and processes.
+    With track_memory, memory() records the peak memory allocated while each page is parsed (via tracemalloc,
+    which slows parsing down, and counts every thread of the process).
+    usage:
+        ```
+        metrics = Metrics(profile=['parse_film'])
+        with metrics.timer('parse_film'):
+            ...
+        metrics.count('page_cache', kind='film', result='hit')
+        print(json.dumps(metrics.summary(), indent=4))
+        ```
+    """
+
+    def __init__(self, profile: List[str] = None, track_memory: bool = False):
+        """
+        @param profile (List[str]) stages to run under cProfile.
+        @param track_memory (bool) record each page's peak parse memory.
+        """
+        self.profile: List[str] = list(profile or [])
+        self.track_memory = track_memory
+        self._reset()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def _reset(self):
+        self.started_at = time.time()
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Dict[str, float]] = {}
+        self._profilers: Dict[Tuple[str, int], cProfile.Profile] = {}
+        self._profile_stats: Dict[str, pstats.Stats] = {}
+        self.pages: List[Dict] = []
+
+    def __getstate__(self):
+        # A copy sent to a worker process starts empty; its increments come back through drain().
+        return {'profile': self.profile, 'track_memory': self.track_memory}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    # region recording
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Times a block into the stage's latency histogram.
+        """
+        profiler: cProfile.Profile = self._start_profile(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._local.profiling = False
+            self.observe(stage, elapsed)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, n: float = 1, **labels):
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name: str, value: float, **labels):
+        """
+        Records the current value of a gauge, keeping the largest value seen.
+        """
+        key = metric_key(name, labels)
+        with self._lock:
+            gauge = self.gauges.get(key)
+            if gauge is None:
+                self.gauges[key] = {'value': value, 'max': value}
+            else:
+                gauge['value'] = value
+                gauge['max'] = max(gauge['max'], value)
+
+    @contextmanager
+    def memory(self, stage: str, page: str = None, size: int = None):
+        """
+        Records the peak memory allocated in a block, e.g. while one page is parsed, as a per-page entry
+        and in the 'peak_bytes' gauge of the stage. Does nothing unless track_memory is set.
+        @param stage (str)
+        @param page (str) the page's key, e.g. its URL.
+        @param size (int) the page's size in characters.
+        """
+        if not self.track_memory:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+            self.gauge('peak_bytes', peak, stage=stage)
+            with self._lock:
+                self.pages.append({'stage': stage, 'page': page, 'size': size, 'peak_bytes': peak})
+
+    def _start_profile(self, stage: str) -> cProfile.Profile:
+        # One profiler per stage and thread; a stage nested in a profiled stage isn't profiled separately.
+        if stage not in self.profile or getattr(self._local, 'profiling', False):
+            return None
+        key = (stage, threading.get_ident())
+        with self._lock:
+            profiler = self._profilers.get(key)
+            if profiler is None:
+                profiler = self._profilers[key] = cProfile.Profile()
+        self._local.profiling = True
+        profiler.enable()
+        return profiler
+
+    # endregion
+
+    # region aggregation
+
+    def _collect_profiles(self) -> Dict[str, Dict]:
+        stats: Dict[str, Dict] = {}
+        for (stage, _), profiler in self._profilers.items():
+            profiler.create_stats()
+            if len(profiler.stats) > 0:
+                merged = self._profile_stats.get(stage)
+                if merged is None:
+                    merged = self._profile_stats[stage] = pstats.Stats(_ProfileStats(profiler.stats))
+                else:
+                    merged.add(_ProfileStats(profiler.stats))
+        self._profilers = {}
+        for stage, merged in self._profile_stats.items():
+            stats[stage] = merged.stats
+        return stats
+
+    def snapshot(self) -> Dict:
+        """
+        @returns snapshot (Dict) everything recorded so far, in a form that can be merged or pickled.
+        """
+        with self._lock:
+            return {
+                'histograms': {stage: h.to_dict() for stage, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'gauges': {key: dict(gauge) for key, gauge in self.gauges.items()},
+                'profiles': self._collect_profiles(),
+                'pages': list(self.pages)
+            }
+
+    def drain(self) -> Dict:
+        """
+        Takes everything recorded so far and starts over. Worker processes return this to the parent.
+        Call it when no timed block is running in this process.
+        @returns snapshot (Dict)
+        """
+        with self._lock:
+            snapshot = self.snapshot()
+            self._reset()
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        """
+        Adds a snapshot, e.g. one drained from a worker process.
+        """
+        if not snapshot:
+            return
+        with self._lock:
+            for stage, data in snapshot['histograms'].items():
+                histogram = self.histograms.get(stage)
+                if histogram is None:
+                    histogram = self.histograms[stage] = Histogram()
+                histogram.merge(data)
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, data in snapshot['gauges'].items():
+                gauge = self.gauges.get(key)
+                if gauge is None:
+                    self.gauges[key] = dict(data)
+                else:
+                    gauge['max'] = max(gauge['max'], data['max'])
+            self.pages.extend(snapshot.get('pages', []))
+            for stage, stats in snapshot.get('profiles', {}).items():
+                merged = self._profile_stats.get(stage)
+                if merged is None:
+                    self._profile_stats[stage] = pstats.Stats(_ProfileStats(stats))
+                else:
+                    merged.add(_ProfileStats(stats))
+
+    # endregion
+
+    # region export
+
+    def summary(self) -> Dict:
+        """
+        @returns summary (Dict) per-stage latency percentiles, counters and gauges.
+        """
+        with self._lock:
+            stages: Dict[str, Dict] = {}
+            for stage, h in sorted(self.histograms.items()):
+                stages[stage] = {
+                    'count': h.count,
+                    'total_seconds': h.sum,
+                    'mean': h.sum / h.count if h.count else None,
+                    'p50': h.quantile(0.5),
+                    'p90': h.quantile(0.9),
+                    'p99': h.quantile(0.99),
+                    'min': h.min,
+                    'max': h.max
+                }
+            memory: Dict[str, Dict] = {}
+            for page in self.pages:
+                stats = memory.setdefault(page['stage'], {'pages': 0, 'max_peak_bytes': 0, 'total_peak_bytes': 0, 'max_page': None})
+                stats['pages'] += 1
+                stats['total_peak_bytes'] += page['peak_bytes']
+                if page['peak_bytes'] >= stats['max_peak_bytes']:
+                    stats['max_peak_bytes'] = page['peak_bytes']
+                    stats['max_page'] = page['page']
+            for stats in memory.values():
+                stats['mean_peak_bytes'] = stats.pop('total_peak_bytes') / stats['pages']
+            return {
+                'started_at': self.started_at,
+                'elapsed_seconds': time.time() - self.started_at,
+                'stages': stages,
+                'counters': dict(sorted(self.counters.items())),
+                'gauges': dict(sorted((key, dict(gauge)) for key, gauge in self.gauges.items())),
+                'memory': dict(sorted(memory.items())),
+                'profiled_stages': sorted(self._profile_stats)
+            }
+
+    def to_prometheus(self, prefix: str = 'celebspyder') -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        @returns text (str)
+        """
+        lines: List[str] = []
+        with self._lock:
+            name = str.format('{0}_stage_seconds', prefix)
+            lines.append(str.format('# TYPE {0} histogram', name))
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS + [float('inf')], h.buckets):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(str.format('{0}_bucket{{stage="{1}",le="{2}"}} {3}', name, stage, le, cumulative))
+                lines.append(str.format('{0}_sum{{stage="{1}"}} {2}', name, stage, h.sum))
+                lines.append(str.format('{0}_count{{stage="{1}"}} {2}', name, stage, h.count))
+            for key, value in sorted(self.counters.items()):
+                lines.append(str.format('{0}_{1} {2}', prefix, key.replace('{', '_total{', 1) if '{' in key else key + '_total', value))
+            for key, gauge in sorted(self.gauges.items()):
+                lines.append(str.format('{0}_{1} {2}', prefix, key, gauge['value']))
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self, path: str):
+        """
+        Writes the JSON summary, replacing the file atomically.
+        """
+        self._write(path, json.dumps(self.summary(), indent=4))
+
+    def write_prometheus(self, path: str):
+        self._write(path, self.to_prometheus())
+
+    def write_pages(self, path: str):
+        """
+        Writes the per-page peak memory entries as JSON lines.
+        """
+        with self._lock:
+            self._write(path, ''.join(json.dumps(page) + '\n' for page in self.pages))
+
+    def _write(self, path: str, contents: str):
+        dirs = os.path.dirname(path)
+        if dirs:
+            os.makedirs(dirs, exist_ok=True)
+        tmp_path = str.format('{0}.{1}.tmp', path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(contents)
+        os.replace(tmp_path, path)
+
+    def dump_profiles(self, folder: str) -> List[str]:
+        """
+        Writes the merged cProfile stats of each profiled stage to '<folder>/<stage>.prof'.
+        @returns paths (List[str])
+        """
+        with self._lock:
+            self._collect_profiles()
+            os.makedirs(folder, exist_ok=True)
+            paths: List[str] = []
+            for stage, merged in self._profile_stats.items():
+                path = os.path.join(folder, str.format('{0}.prof', stage))
+                merged.dump_stats(path)
+                paths.append(path)
+            return paths
+
+    # endregion
+
+
+class MetricsReporter():
+    """
+    Writes periodic snapshots of the metrics during a long crawl: the JSON summary, and
+    optionally Prometheus text for a node exporter textfile collector.
+    usage:
+        ```
+        with MetricsReporter(metrics, './html/metrics.json', interval=30, prometheus_path='./html/metrics.prom'):
+            spyder.get_data()
+        ```
+    """
+
+    def __init__(self, metrics: Metrics, path: str = None, interval: float = 30.0, prometheus_path: str = None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def write(self):
+        if self.path:
+            self.metrics.write_summary(self.path)
+        if self.prometheus_path:
+            self.metrics.write_prometheus(self.prometheus_path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
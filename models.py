@@ -1,55 +1,215 @@
-from typing import List, Dict
-from types import SimpleNamespace
+from typing import List, Dict, Tuple, FrozenSet
+import marshal
 import json
+import sys
 
+# Bump when the field layout changes; bytes written with another version are rejected.
+BINARY_VERSION = 1
 
-class CelebRole:
-    FilmTitle: str = None
-    FilmUrl: str = None
-    Year: str = None
-    CharacterName: str = None
-    Directors: List[str] = None
-    Metascore: int = None
-    UserReviews: int = None
-    Popularity: int = None
-    CriticReviews: int = None
-    Writers: List[str] = None
-    Stars: List[str] = None
-    PlotKeywords: List[str] = None 
-    ReleaseDate: str = None
-    Genres: List[str] = None
-    MotionPictureRating: str = None
-    Budget: int = None
-    OpeningWeekend: int = None
-    Gross: int = None
-    CumulativeWorldwideGross: int = None
-    RuntimeMinutes: int = None
-    ProductionCompanies: List[str] = None
-    
-
-class Celeb:
-    FullName: str = None
-    FirstName: str = None 
-    LastName: str = None
-    PhotoUrl: str = None
-    Height: float = None
-    Gender: str = None
-    DOB: str = None
-    BornIn: str = None
-    DOD: str = None
-    MaritalStatus: str = None
-    Location: str = None
-    Rank: int = None
-    DomesticBoxOfficeRevenue: int = None
-    AverageDomesticBoxOfficeRevenue: int = None
-    LocalDataSourcePath: str = None
-    Trademark: str = None
-    DataSourceUrl: str = None
-    AstrologicalSign: str = None
-    AwardsUrl: str = None
-    AwardNominations: int = None
-    AwardsWins: int = None
-    Roles: List[CelebRole] = None
+
+def _clean(value, intern: bool):
+    """
+    Stores strings as plain str (BeautifulSoup hands out str subclasses that keep the whole parse tree alive),
+    interning categorical ones so every role naming the same director or genre shares one string.
+    """
+    if isinstance(value, str):
+        if intern:
+            return sys.intern(str(value))
+        return value if type(value) is str else str(value)
+    if isinstance(value, list) and intern:
+        return [sys.intern(str(item)) if isinstance(item, str) else item for item in value]
+    return value
+
+
+class _Record():
+    """
+    Slotted model base. Fields that were never set read as None and are left out of
+    toDict()/toJson(), just like the class-level defaults of the original models.
+    """
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    CATEGORICAL: FrozenSet[str] = frozenset()
+
+    def __getattr__(self, name: str):
+        # Only called for unset slots and unknown names.
+        if name in self.FIELDS:
+            return None
+        raise AttributeError(str.format("'{0}' object has no attribute '{1}'", type(self).__name__, name))
+
+    def __setattr__(self, name: str, value):
+        object.__setattr__(self, name, _clean(value, name in self.CATEGORICAL))
+
+    def isSet(self, name: str) -> bool:
+        try:
+            object.__getattribute__(self, name)
+            return True
+        except AttributeError:
+            return False
+
+    def toDict(self) -> Dict:
+        data: Dict = {}
+        for name in self.FIELDS:
+            try:
+                data[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return data
+
+    def _pack(self) -> Tuple[int, tuple]:
+        """
+        @returns (mask, values) a bit per set field, and the set fields' values in field order.
+        """
+        mask, values = 0, []
+        for bit, name in enumerate(self.FIELDS):
+            try:
+                values.append(self._pack_value(name, object.__getattribute__(self, name)))
+                mask |= 1 << bit
+            except AttributeError:
+                pass
+        return (mask, tuple(values))
+
+    def _unpack(self, mask: int, values: tuple):
+        it = iter(values)
+        for bit, name in enumerate(self.FIELDS):
+            if mask & (1 << bit):
+                setattr(self, name, self._unpack_value(name, next(it)))
+
+    def _pack_value(self, name: str, value):
+        return value
+
+    def _unpack_value(self, name: str, value):
+        return value
+
+
+class CelebRole(_Record):
+    FilmTitle: str
+    FilmUrl: str
+    Year: str
+    CharacterName: str
+    Directors: List[str]
+    Metascore: int
+    UserReviews: int
+    Popularity: int
+    CriticReviews: int
+    Writers: List[str]
+    Stars: List[str]
+    PlotKeywords: List[str]
+    ReleaseDate: str
+    Genres: List[str]
+    MotionPictureRating: str
+    Budget: int
+    OpeningWeekend: int
+    Gross: int
+    CumulativeWorldwideGross: int
+    RuntimeMinutes: int
+    ProductionCompanies: List[str]
+
+    FIELDS = ('FilmTitle', 'FilmUrl', 'Year', 'CharacterName', 'Directors', 'Metascore', 'UserReviews', 'Popularity',
+              'CriticReviews', 'Writers', 'Stars', 'PlotKeywords', 'ReleaseDate', 'Genres', 'MotionPictureRating',
+              'Budget', 'OpeningWeekend', 'Gross', 'CumulativeWorldwideGross', 'RuntimeMinutes', 'ProductionCompanies')
+    CATEGORICAL = frozenset(['FilmTitle', 'FilmUrl', 'Year', 'Directors', 'Writers', 'Stars', 'PlotKeywords',
+                             'ReleaseDate', 'Genres', 'MotionPictureRating', 'ProductionCompanies'])
+    __slots__ = FIELDS
+
+    def __reduce__(self):
+        return (_role_from_packed, self._pack())
+
+    @staticmethod
+    def fromDict(data: Dict):
+        role = CelebRole()
+        for name, value in data.items():
+            if name in CelebRole.FIELDS:
+                setattr(role, name, value)
+        return role
+
+
+class Celeb(_Record):
+    FullName: str
+    FirstName: str
+    LastName: str
+    PhotoUrl: str
+    Height: float
+    Gender: str
+    DOB: str
+    BornIn: str
+    DOD: str
+    MaritalStatus: str
+    Location: str
+    Rank: int
+    DomesticBoxOfficeRevenue: int
+    AverageDomesticBoxOfficeRevenue: int
+    LocalDataSourcePath: str
+    Trademark: str
+    DataSourceUrl: str
+    AstrologicalSign: str
+    AwardsUrl: str
+    AwardNominations: int
+    AwardsWins: int
+    Roles: List[CelebRole]
+
+    FIELDS = ('FullName', 'FirstName', 'LastName', 'PhotoUrl', 'Height', 'Gender', 'DOB', 'BornIn', 'DOD',
+              'MaritalStatus', 'Location', 'Rank', 'DomesticBoxOfficeRevenue', 'AverageDomesticBoxOfficeRevenue',
+              'LocalDataSourcePath', 'Trademark', 'DataSourceUrl', 'AstrologicalSign', 'AwardsUrl',
+              'AwardNominations', 'AwardsWins', 'Roles')
+    CATEGORICAL = frozenset(['Gender', 'BornIn', 'MaritalStatus', 'Location', 'AstrologicalSign'])
+    __slots__ = FIELDS
+
+    def __reduce__(self):
+        # Pickles (e.g. between pool workers) carry the compact binary form.
+        return (Celeb.fromBytes, (self.toBytes(),))
+
+    def toDict(self) -> Dict:
+        data: Dict = super().toDict()
+        if data.get('Roles') is not None:
+            data['Roles'] = [role.toDict() for role in data['Roles']]
+        return data
 
     def toJson(self, indent=0):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=indent)
\ No newline at end of file
+        return json.dumps(self.toDict(), indent=indent)
+
+    def toBytes(self) -> bytes:
+        """
+        Compact binary form for passing celebs between processes. Strings that are shared
+        (interned categorical values) are written once and referenced after that.
+        @returns data (bytes)
+        """
+        return marshal.dumps((BINARY_VERSION,) + self._pack())
+
+    def _pack_value(self, name: str, value):
+        if name == 'Roles' and value is not None:
+            return [role._pack() for role in value]
+        return value
+
+    def _unpack_value(self, name: str, value):
+        if name == 'Roles' and value is not None:
+            return [_role_from_packed(*role) for role in value]
+        return value
+
+    @staticmethod
+    def fromBytes(data: bytes):
+        version, mask, values = marshal.loads(data)
+        if version != BINARY_VERSION:
+            raise ValueError(str.format('Unsupported celeb binary version: {0}', version))
+        celeb = Celeb()
+        celeb._unpack(mask, values)
+        return celeb
+
+    @staticmethod
+    def fromDict(data: Dict):
+        celeb = Celeb()
+        for name, value in data.items():
+            if name == 'Roles' and value is not None:
+                celeb.Roles = [CelebRole.fromDict(item) for item in value]
+            elif name in Celeb.FIELDS:
+                setattr(celeb, name, value)
+        return celeb
+
+    @staticmethod
+    def fromJson(s: str):
+        return Celeb.fromDict(json.loads(s))
+
+
+def _role_from_packed(mask: int, values: tuple) -> CelebRole:
+    role = CelebRole()
+    role._unpack(mask, values)
+    return role
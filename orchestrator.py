@@ -0,0 +1,124 @@
+from CelebSpyder import CelebSpyder
+from models import Celeb
+from resolver import name_key
+from pipeline import CrawlPipeline
+from transport import get_transport
+from projection import ExtractionSpec
+from tmdb import TmdbSource, API_URL
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
+import argparse
+import asyncio
+
+START_URL = 'https://www.the-numbers.com/box-office-star-records/domestic/lifetime-acting/top-grossing-leading-stars'
+
+
+def list_page_url(start_url: str, page_num: int) -> str:
+    """
+    Gets the URL of a the-numbers.com list page. Page 0 is the start URL, page N starts at rank N01.
+    @param start_url (str)
+    @param page_num (int)
+    @returns url (str)
+    """
+    return start_url if page_num < 1 else str.format('{0}/{1}01', start_url, page_num)
+
+
+class CrawlOrchestrator():
+    """
+    Crawls a range of list pages as one job. All list pages are fetched concurrently, their rows are merged
+    into one frontier with duplicate celebs removed, and a single spider crawls the whole frontier, so film
+    work is shared across pages and no page waits on the one before it.
+    usage:
+        ```
+        orchestrator = CrawlOrchestrator(pages=range(0, 5))
+        celeb_data = orchestrator.run(engine='pipeline')
+        ```
+    """
+
+    def __init__(self, start_url: str = START_URL, pages: List[int] = range(0, 2), list_workers: int = 8, **spyder_args):
+        """
+        @param start_url (str) the first list page.
+        @param pages (List[int]) list page numbers to crawl.
+        @param list_workers (int) the number of list pages fetched at once.
+        @param spyder_args arguments for CelebSpyder, e.g. mode, parser, sink or debug.
+        """
+        self.start_url = start_url
+        self.pages: List[int] = list(pages)
+        self.list_workers = list_workers
+        self.spyder = CelebSpyder(celeb_list_url=start_url, page_num=self.pages[0] if self.pages else 0, **spyder_args)
+        self.errors: List[Tuple[int, str]] = []
+
+    def _load_page(self, page_num: int) -> List[Celeb]:
+        url = list_page_url(self.start_url, page_num)
+        return self.spyder._load_list_page(url, str.format('./html/celebs_{0}.html', page_num))
+
+    def load_frontier(self) -> List[Celeb]:
+        """
+        Fetches every list page concurrently and merges the rows. A celeb listed on more than one page is
+        kept once, at its best rank. A page that fails is recorded in errors and skipped.
+        @returns frontier (List[Celeb]) ordered by rank.
+        """
+        self.spyder._transport.reserve(self.list_workers)
+        frontier: Dict[str, Celeb] = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.list_workers)) as executor:
+            futures = [(page_num, executor.submit(self._load_page, page_num)) for page_num in self.pages]
+            for page_num, future in futures:
+                try:
+                    rows: List[Celeb] = future.result()
+                except Exception as e:
+                    self.errors.append((page_num, str(e)))
+                    continue
+                for celeb in rows:
+                    key = name_key(celeb.FullName)
+                    if key not in frontier or celeb.Rank < frontier[key].Rank:
+                        frontier[key] = celeb
+
+        if len(frontier) == 0:
+            raise Exception("Error getting list of celebrities from any list page.")
+        return sorted(frontier.values(), key=lambda celeb: celeb.Rank)
+
+    def run(self, engine: str = 'pool', **engine_args) -> List[Celeb]:
+        """
+        Loads the frontier and crawls it with one engine.
+        @param engine (str) 'pool' (CelebSpyder.get_data), 'async' (get_data_async) or 'pipeline' (CrawlPipeline).
+        @param engine_args arguments for the engine, e.g. num_processes or film_fetch_workers.
+        @returns celeb_list (List[Celeb]) with failures in spyder.errors.
+        """
+        self.spyder.frontier = self.load_frontier()
+        if engine == 'pool':
+            return self.spyder.get_data(**engine_args)
+        if engine == 'async':
+            return asyncio.run(self.spyder.get_data_async(**engine_args))
+        if engine == 'pipeline':
+            return CrawlPipeline(self.spyder, **engine_args).run()
+        raise ValueError(str.format('Unknown crawl engine: {0}', engine))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl a range of the-numbers.com list pages as one job.')
+    parser.add_argument('--start-url', default=START_URL)
+    parser.add_argument('--first-page', type=int, default=0)
+    parser.add_argument('--last-page', type=int, default=1)
+    parser.add_argument('--engine', default='pool', choices=['pool', 'async', 'pipeline'])
+    parser.add_argument('--mode', default='full', choices=['full', 'resume', 'refresh'])
+    parser.add_argument('--imdb-url', default='https://www.imdb.com')
+    parser.add_argument('--transport', default='live', choices=['live', 'record', 'replay'])
+    parser.add_argument('--archive', default='./html/archive', help='archive folder for record and replay')
+    parser.add_argument('--no-rate-control', action='store_true', help='send requests without per-host pacing and retries')
+    parser.add_argument('--streaming', action='store_true', help='parse profiles one filmography row at a time')
+    parser.add_argument('--fields', default=None, help="comma-separated fields to extract, e.g. 'DOB,Height,Roles.Genres'")
+    parser.add_argument('--tmdb', default=None, help="comma-separated fields to take from TMDB instead of IMDB pages, or 'all'")
+    parser.add_argument('--tmdb-url', default=API_URL)
+    args = parser.parse_args()
+
+    tmdb: TmdbSource = None
+    if args.tmdb:
+        tmdb = TmdbSource(fields=None if args.tmdb == 'all' else args.tmdb.split(','), api_url=args.tmdb_url,
+                          transport=get_transport(args.transport, args.archive, not args.no_rate_control))
+
+    orchestrator = CrawlOrchestrator(args.start_url, range(args.first_page, args.last_page + 1), mode=args.mode, debug=True,
+                                     imdb_url=args.imdb_url, transport=get_transport(args.transport, args.archive, not args.no_rate_control),
+                                     spec=ExtractionSpec.fromFields(args.fields.split(',')) if args.fields else None,
+                                     streaming=args.streaming, tmdb=tmdb)
+    celebs = orchestrator.run(engine=args.engine)
+    print(str.format('Crawled {0} celebs, {1} failed.', len(celebs), len(orchestrator.spyder.errors)))
@@ -0,0 +1,271 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import List, Dict
+import threading
+import hashlib
+import json
+import mmap
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# Query params left out of keys: IMDB's 'ref_' tracking param, and TMDB's API key, which must never be
+# written to a page store or archive and mustn't stop a recording from replaying under another key.
+_DROPPED_PARAMS = {'ref_', 'api_key'}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalizes a URL so the same page always maps to the same key:
+    lower-cases the scheme and host, drops the fragment, tracking params and API keys, and sorts the query.
+    @param url (str)
+    @returns url (str)
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _DROPPED_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+
+class _FileLock():
+    """
+    Exclusive, cross-process lock on a file. Uses flock on POSIX and msvcrt on Windows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+class PageStore():
+    """
+    Compressed, content-addressed store for raw pages.
+    Pages are compressed (zstd when available, else gzip) and appended to pack files. Identical
+    pages are stored once. An append-only index maps canonical URLs to blobs and is held in memory,
+    so lookups are O(1). Reads go through memory-mapped pack files. Writers in any number of processes
+    append under an exclusive file lock, and readers pick up their index entries on a miss.
+    A store can also be shared between threads.
+    usage:
+        ```
+        pages = PageStore('./html/pages')
+        pages.put(url, html)
+        html = pages.get(url)
+        ```
+    """
+
+    def __init__(self, root: str = './html/pages', codec: str = None, max_pack_size: int = 256 * 1024 * 1024):
+        """
+        @param root (str) folder holding the pack and index files.
+        @param codec (str) 'zstd' or 'gzip'. Defaults to zstd if the zstandard package is installed.
+        @param max_pack_size (int) bytes after which writers start a new pack file.
+        """
+        self.root = root
+        self.codec = codec or ('zstd' if zstandard else 'gzip')
+        if self.codec == 'zstd' and zstandard is None:
+            raise ValueError('The zstd codec requires the zstandard package.')
+        self.max_pack_size = max_pack_size
+        self._index_path = os.path.join(root, 'index.jsonl')
+        self._lock_path = os.path.join(root, 'lock')
+        self._urls: Dict[str, Dict] = {}
+        self._blobs: Dict[str, Dict] = {}
+        self._index_pos = 0
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self._refresh()
+
+    def __getstate__(self):
+        # Memory maps can't be pickled; each process reopens the index and packs.
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    # region index
+
+    def _refresh(self):
+        """
+        Reads index entries appended since the last refresh, including other processes' writes.
+        """
+        if not os.path.exists(self._index_path):
+            return
+        with self._lock, open(self._index_path, 'rb') as index:
+            index.seek(self._index_pos)
+            for line in index:
+                # Only complete lines; a partial one is re-read on the next refresh.
+                if not line.endswith(b'\n'):
+                    break
+                self._index_pos += len(line)
+                self._add_entry(json.loads(line))
+
+    def _add_entry(self, entry: Dict):
+        if 'pack' in entry:
+            self._blobs[entry['digest']] = entry
+        self._urls[entry['url']] = self._blobs[entry['digest']]
+
+    def _append_index(self, entry: Dict):
+        with open(self._index_path, 'ab') as index:
+            index.write((json.dumps(entry) + '\n').encode('utf-8'))
+
+    # endregion
+
+    # region packs
+
+    def _pack_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root) if name.endswith('.pack'))
+
+    def _current_pack(self) -> str:
+        names = self._pack_names()
+        if len(names) == 0 or os.path.getsize(os.path.join(self.root, names[-1])) >= self.max_pack_size:
+            return str.format('pack-{0:05d}.pack', len(names))
+        return names[-1]
+
+    def _map(self, pack: str, end: int) -> mmap.mmap:
+        """
+        Gets a read-only memory map of a pack file, remapping if the pack has grown past `end`.
+        """
+        mapped = self._maps.get(pack)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(os.path.join(self.root, pack), 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack] = mapped
+        return mapped
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _decompress(self, data: bytes, codec: str) -> bytes:
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ValueError('Reading zstd pages requires the zstandard package.')
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    # endregion
+
+    def _lookup(self, url: str) -> Dict:
+        key = canonical_url(url)
+        entry = self._urls.get(key)
+        if entry is None:
+            self._refresh()
+            entry = self._urls.get(key)
+        return entry
+
+    def contains(self, url: str) -> bool:
+        """
+        @param url (str)
+        @returns bool True if a page is stored for the URL.
+        """
+        return self._lookup(url) is not None
+
+    def digest(self, url: str) -> str:
+        """
+        @param url (str)
+        @returns digest (str) the SHA-256 of the stored page, or None.
+        """
+        entry = self._lookup(url)
+        return entry['digest'] if entry else None
+
+    def get(self, url: str) -> str:
+        """
+        Reads a page.
+        @param url (str)
+        @returns html (str) or None if the page isn't stored.
+        """
+        entry = self._lookup(url)
+        if entry is None:
+            return None
+        end = entry['offset'] + entry['length']
+        with self._lock:
+            mapped = self._map(entry['pack'], end)
+            if len(mapped) < end:
+                # The blob never reached the disk, e.g. a writer crashed before syncing it; the page is fetched again.
+                return None
+            blob = mapped[entry['offset']:end]
+        return self._decompress(blob, entry['codec']).decode('utf-8')
+
+    def put(self, url: str, contents: str) -> str:
+        """
+        Stores a page. Content already in the store is not written again; the URL just points at it.
+        @param url (str)
+        @param contents (str)
+        @returns digest (str) the SHA-256 of the page.
+        """
+        data = contents.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        key = canonical_url(url)
+        if self._stored(key, digest):
+            return digest
+
+        # Compressing is the slow part; it's done before taking the lock, so writers only queue for the appends.
+        blob: bytes = self._compress(data) if digest not in self._blobs else None
+        written: str = None
+
+        with self._lock, _FileLock(self._lock_path):
+            self._refresh()
+            if self._stored(key, digest):
+                return digest
+            entry: Dict = {'url': key, 'digest': digest}
+            if digest not in self._blobs:
+                if blob is None:
+                    blob = self._compress(data)
+                written = self._current_pack()
+                with open(os.path.join(self.root, written), 'ab') as pack_file:
+                    offset = pack_file.tell()
+                    pack_file.write(blob)
+                entry.update({'pack': written, 'offset': offset, 'length': len(blob), 'codec': self.codec, 'size': len(data)})
+            self._append_index(entry)
+            self._index_pos = os.path.getsize(self._index_path)
+            self._add_entry(entry)
+
+        # Synced after the lock is released. A blob lost to a crash before its sync reads as missing, see get().
+        if written is not None:
+            with open(os.path.join(self.root, written), 'rb') as pack_file:
+                os.fsync(pack_file.fileno())
+        return digest
+
+    def _stored(self, key: str, digest: str) -> bool:
+        # A URL already pointing at this content needs no new index entry.
+        entry: Dict = self._urls.get(key)
+        return entry is not None and entry['digest'] == digest
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
@@ -0,0 +1,68 @@
+from bs4 import BeautifulSoup
+from typing import Dict, Type
+from io import IOBase
+
+
+class ParserBackend():
+    """
+    Builds a BeautifulSoup tree from raw HTML. Extractors only use the Tag API,
+    so any tree builder can be swapped in without changing their output.
+    """
+    name: str = None
+    features: str = None
+
+    def parse(self, markup) -> BeautifulSoup:
+        """
+        Parses HTML into a tree.
+        @param markup (str | bytes | file) the raw HTML.
+        @returns BeautifulSoup
+        """
+        if isinstance(markup, IOBase):
+            markup = markup.read()
+        return BeautifulSoup(markup, self.features)
+
+
+class LxmlBackend(ParserBackend):
+    """
+    C-accelerated tree builder backed by lxml.
+    """
+    name = 'lxml'
+    features = 'lxml'
+
+
+class HtmlParserBackend(ParserBackend):
+    """
+    Pure-Python tree builder from the standard library. Always available.
+    """
+    name = 'html.parser'
+    features = 'html.parser'
+
+
+BACKENDS: Dict[str, Type[ParserBackend]] = {
+    LxmlBackend.name: LxmlBackend,
+    HtmlParserBackend.name: HtmlParserBackend
+}
+
+
+def lxml_available() -> bool:
+    try:
+        import lxml
+        return True
+    except ImportError:
+        return False
+
+
+def get_parser(name: str = None) -> ParserBackend:
+    """
+    Gets a parser backend by name. Defaults to lxml, falling back to html.parser when lxml isn't installed.
+    @param name (str) 'lxml', 'html.parser' or None for the fastest available.
+    @returns ParserBackend
+    """
+    if name is None:
+        name = LxmlBackend.name if lxml_available() else HtmlParserBackend.name
+    elif name == LxmlBackend.name and not lxml_available():
+        name = HtmlParserBackend.name
+
+    if name not in BACKENDS:
+        raise ValueError(str.format('Unknown parser backend: {0}', name))
+    return BACKENDS[name]()
@@ -0,0 +1,390 @@
+from models import Celeb, CelebRole
+from registry import title_id, film_fields
+from pagestore import canonical_url
+from manifest import CELEB, PROFILE, FILM, DONE, FAILED
+from urllib3.response import HTTPResponse
+from transport import check_page
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Set, Callable, FrozenSet
+import multiprocessing
+import traceback
+import threading
+import hashlib
+import queue
+import time
+
+_STOP = object()
+
+# The spider each parse process works with, set once by the pool initializer.
+_worker_spyder = None
+
+
+def _init_parse_worker(spyder):
+    global _worker_spyder
+    _worker_spyder = spyder._process_copy()
+
+
+# Parse tasks return their result with the metrics the worker recorded, for the parent to merge.
+
+def _parse_profile(celeb: Celeb, profile_html: str) -> Tuple[Celeb, Dict]:
+    celeb = _worker_spyder._parse_celeb_profile_html(celeb, fetch_films=False, profile_html=profile_html)
+    return (celeb, _worker_spyder.metrics.drain())
+
+
+def _parse_film(film_title: str, film_url: str, film_html: str, needs: FrozenSet[str] = None) -> Tuple[Dict, Dict]:
+    film = CelebRole()
+    film.FilmTitle = film_title
+    film.FilmUrl = film_url
+    fields: Dict = film_fields(_worker_spyder._parse_film_page(film, film_html, needs))
+    return (fields, _worker_spyder.metrics.drain())
+
+
+class _CelebJob():
+    """
+    A celeb moving through the pipeline, waiting on the films its roles point at.
+    """
+
+    def __init__(self, celeb: Celeb, profile_hash: str):
+        self.celeb = celeb
+        self.profile_hash = profile_hash
+        self.pending: Set[str] = set()
+        # Set when one of its films fails; the celeb then fails as a whole, as in the other engines.
+        self.error: str = None
+
+
+class CrawlPipeline():
+    """
+    Staged, streaming crawl: list -> resolve -> fetch profile -> parse profile -> fetch films -> parse films -> sink.
+    Stages are joined by bounded queues, so a slow stage pushes back on the stages feeding it instead of
+    buffering without limit. Fetch stages run on threads and parse stages on a process pool, so requests
+    stay in flight while pages are parsed. Fetched pages go straight to the parsers; writing them to the
+    page store and manifest happens on a background thread, off the critical path.
+    Each film is fetched and parsed once; every celeb waiting on it is completed when it is parsed.
+    usage:
+        ```
+        spyder = CelebSpyder(url)
+        celeb_data = CrawlPipeline(spyder, film_fetch_workers=64).run()
+        ```
+    """
+
+    def __init__(self, spyder, resolve_workers: int = 8, profile_fetch_workers: int = 16, profile_parse_workers: int = 0,
+                 film_fetch_workers: int = 32, film_parse_workers: int = 0, parse_processes: int = 0,
+                 queue_size: int = 64):
+        """
+        @param spyder (CelebSpyder) supplies the list page, parsers, page store, manifest and resolver.
+        @param resolve_workers (int) threads resolving names to profile URLs.
+        @param profile_fetch_workers (int) threads fetching profiles.
+        @param profile_parse_workers (int) profiles parsed at once. If '0', the number of parse processes.
+        @param film_fetch_workers (int) threads fetching film pages.
+        @param film_parse_workers (int) film pages parsed at once. If '0', the number of parse processes.
+        @param parse_processes (int) size of the parse process pool. If '0', uses all available CPUs.
+        @param queue_size (int) capacity of each queue between stages.
+        """
+        self.spyder = spyder
+        self.parse_processes = parse_processes or multiprocessing.cpu_count()
+        self.workers: Dict[str, int] = {
+            'resolve': resolve_workers,
+            'fetch_profile': profile_fetch_workers,
+            'parse_profile': profile_parse_workers or self.parse_processes,
+            'fetch_film': film_fetch_workers,
+            'parse_film': film_parse_workers or self.parse_processes
+        }
+        self.queue_size = queue_size
+        self.errors: List[Tuple[Celeb, str]] = []
+        self.write_errors: List[str] = []
+
+    # region controller
+
+    def run(self) -> List[Celeb]:
+        """
+        Runs the crawl to completion.
+        @returns celeb_list (List[Celeb]) also set on the spider, with failures in spyder.errors.
+        """
+        spyder = self.spyder
+        celeb_list: List[Celeb] = spyder._load_celeb_list()
+        spyder._start_crawl()
+        spyder.celeb_list = []
+        spyder.errors = []
+        celeb_list = spyder._skip_completed(celeb_list)
+
+        # Enough pooled connections for every fetch thread.
+        spyder._transport.reserve(max(self.workers['resolve'], self.workers['fetch_profile'], self.workers['fetch_film']))
+
+        self._results: List[Celeb] = []
+        self._lock = threading.Lock()
+        self._done = threading.Semaphore(0)
+        self._fields: Dict[str, Dict] = {}
+        self._film_errors: Dict[str, str] = {}
+        self._waiting: Dict[str, List[_CelebJob]] = {}
+        self._started: Set[str] = set()
+        # Film pages held between download and parse, across the film queues.
+        self._film_slots = threading.BoundedSemaphore(spyder.max_film_documents)
+
+        self._queues: Dict[str, queue.Queue] = {name: queue.Queue(maxsize=self.queue_size) for name in self.workers}
+        self._queues['sink'] = queue.Queue(maxsize=self.queue_size)
+        self._persist: queue.Queue = queue.Queue(maxsize=self.queue_size * 8)
+
+        handlers: Dict[str, Callable] = {
+            'resolve': self._resolve,
+            'fetch_profile': self._fetch_profile,
+            'parse_profile': self._parse_profile,
+            'fetch_film': self._fetch_film,
+            'parse_film': self._parse_film,
+            'sink': self._sink
+        }
+        counts: Dict[str, int] = dict(self.workers, sink=1)
+
+        with ProcessPoolExecutor(max_workers=self.parse_processes, initializer=_init_parse_worker, initargs=(spyder,)) as pool:
+            self._pool = pool
+            threads: List[threading.Thread] = []
+            for name, handler in handlers.items():
+                for i in range(counts[name]):
+                    threads.append(self._start(str.format('{0}-{1}', name, i), self._work, self._queues[name], handler))
+            persister = self._start('persist', self._work, self._persist, self._write)
+
+            # list: feed the frontier from this thread; the bounded queue throttles it.
+            for celeb in celeb_list:
+                self._queues['resolve'].put(celeb)
+
+            for _ in celeb_list:
+                self._done.acquire()
+
+            for name, q in self._queues.items():
+                for _ in range(counts[name]):
+                    q.put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        self._persist.put(_STOP)
+        persister.join()
+
+        spyder._finish_crawl()
+        spyder.celeb_list.extend(self._results)
+        spyder.celeb_list.sort(key=lambda celeb: celeb.Rank)
+        spyder.errors.extend(self.errors)
+        return spyder.celeb_list
+
+    def _start(self, name: str, target: Callable, *args) -> threading.Thread:
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def _work(self, q: queue.Queue, handler: Callable):
+        stage: str = threading.current_thread().name.rsplit('-', 1)[0]
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            self.spyder.metrics.gauge('queue_depth', q.qsize(), stage=stage)
+            handler(item)
+
+    def _write(self, task: Tuple[Callable, Tuple, Dict]):
+        write, args, kwargs = task
+        try:
+            write(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.write_errors.append(traceback.format_exc())
+
+    def _fail(self, celeb: Celeb, error: str = None):
+        error = error or traceback.format_exc()
+        self.spyder._manifest.mark(CELEB, celeb.FullName, FAILED, error=error)
+        with self._lock:
+            self.errors.append((celeb, error))
+        self._done.release()
+
+    # endregion
+
+    # region stages
+
+    def _resolve(self, celeb: Celeb):
+        try:
+            spyder = self.spyder
+            imdb_search_url: str = spyder._prepare_imdb_search(celeb)
+            with spyder.metrics.timer('search'):
+                celeb_url: str = spyder._resolved_profile_url(celeb)
+                if celeb_url is None:
+                    res: HTTPResponse = spyder._request(imdb_search_url, {})
+                    celeb_url = spyder._record_search(celeb, res.data.decode('utf-8'))
+            celeb.LocalDataSourcePath = canonical_url(celeb_url)
+            self._queues['fetch_profile'].put((celeb, celeb_url))
+        except Exception:
+            self._fail(celeb)
+
+    def _fetch_profile(self, item: Tuple[Celeb, str]):
+        celeb, celeb_url = item
+        try:
+            profile_html, _ = self._fetch(PROFILE, celeb.LocalDataSourcePath, celeb_url)
+            profile_hash: str = hashlib.sha256(profile_html.encode('utf-8')).hexdigest()
+
+            previous: Dict = self.spyder._manifest.get(CELEB, celeb.FullName)
+            if self.spyder._profile_unchanged(previous, profile_hash):
+                # Keep the last parse of the profile; only its films are re-checked.
+                self._queue_films(_CelebJob(self.spyder._restore_celeb(celeb, previous), profile_hash))
+            else:
+                self._queues['parse_profile'].put((celeb, profile_html, profile_hash))
+        except Exception:
+            self._fail(celeb)
+
+    def _parse_profile(self, item: Tuple[Celeb, str, str]):
+        celeb, profile_html, profile_hash = item
+        try:
+            parsed, worker_metrics = self._pool.submit(_parse_profile, celeb, profile_html).result()
+            self.spyder.metrics.merge(worker_metrics)
+            # TMDB is asked from this thread, so parse processes never wait on the network.
+            self.spyder._tmdb_celeb(parsed)
+            self._queue_films(_CelebJob(parsed, profile_hash))
+        except Exception:
+            self._fail(celeb)
+
+    def _queue_films(self, job: _CelebJob):
+        """
+        Registers a celeb's films, queueing each title id the first time any celeb needs it.
+        """
+        to_fetch: List[Tuple[str, CelebRole]] = []
+        roles: List[CelebRole] = (job.celeb.Roles or []) if self.spyder.spec.needsFilms else []
+        with self._lock:
+            for role in roles:
+                if not role.FilmUrl:
+                    continue
+                tid: str = title_id(role.FilmUrl) or role.FilmUrl
+                if tid in self._film_errors:
+                    job.error = job.error or self._film_errors[tid]
+                    continue
+                if tid in self._fields or tid in job.pending:
+                    self.spyder.metrics.count('film_cache', result='hit')
+                    continue
+                cached: Dict = self.spyder._films.get(tid)
+                if cached is not None:
+                    self.spyder.metrics.count('film_cache', result='hit')
+                    self._fields[tid] = cached
+                    continue
+                job.pending.add(tid)
+                self._waiting.setdefault(tid, []).append(job)
+                if tid not in self._started:
+                    self.spyder.metrics.count('film_cache', result='miss')
+                    self._started.add(tid)
+                    to_fetch.append((tid, role))
+                else:
+                    self.spyder.metrics.count('film_cache', result='hit')
+            ready = len(job.pending) == 0
+
+        for item in to_fetch:
+            self._queues['fetch_film'].put(item)
+        if ready:
+            self._complete(job)
+
+    def _fetch_film(self, item: Tuple[str, CelebRole]):
+        tid, role = item
+        spyder = self.spyder
+        self._film_slots.acquire()
+        # The slot is released here unless the page is handed on, in which case the parse stage releases it.
+        handed_on: bool = False
+        try:
+            html_needs, tmdb_fields = spyder._film_plan(role, spyder.spec.film_fields)
+            if not html_needs:
+                self._persist.put((spyder._films.put, (tid, tmdb_fields), {}))
+                fields: Dict = tmdb_fields
+            else:
+                film_html, changed = self._fetch(FILM, tid, role.FilmUrl)
+                fields = spyder._films.get(tid, any_crawl=True, needs=html_needs) if not changed else None
+                if fields is None:
+                    self._queues['parse_film'].put((tid, role, film_html, html_needs, tmdb_fields))
+                    handed_on = True
+                    return
+                if spyder._tmdb is not None:
+                    fields = dict({key: value for key, value in fields.items() if key in html_needs}, **tmdb_fields)
+        except Exception:
+            self._film_failed(tid)
+            return
+        finally:
+            if not handed_on:
+                self._film_slots.release()
+        self._film_done(tid, fields)
+
+    def _parse_film(self, item: Tuple[str, CelebRole, str, FrozenSet[str], Dict]):
+        tid, role, film_html, html_needs, tmdb_fields = item
+        try:
+            fields, worker_metrics = self._pool.submit(_parse_film, role.FilmTitle, role.FilmUrl, film_html, html_needs).result()
+            self.spyder.metrics.merge(worker_metrics)
+            fields.update(tmdb_fields)
+            self._persist.put((self.spyder._films.put, (tid, fields), {}))
+        except Exception:
+            self._film_failed(tid)
+            return
+        finally:
+            self._film_slots.release()
+        self._film_done(tid, fields)
+
+    def _film_failed(self, tid: str):
+        # Every celeb waiting on the film fails with its error, as a failed film fails the celeb in the other engines.
+        error: str = traceback.format_exc()
+        with self._lock:
+            self._film_errors[tid] = error
+            ready: List[_CelebJob] = []
+            for job in self._waiting.pop(tid, []):
+                job.pending.discard(tid)
+                job.error = job.error or error
+                if len(job.pending) == 0:
+                    ready.append(job)
+        for job in ready:
+            self._complete(job)
+
+    def _film_done(self, tid: str, fields: Dict):
+        with self._lock:
+            self._fields[tid] = fields
+            ready: List[_CelebJob] = []
+            for job in self._waiting.pop(tid, []):
+                job.pending.discard(tid)
+                if len(job.pending) == 0:
+                    ready.append(job)
+        for job in ready:
+            self._complete(job)
+
+    def _complete(self, job: _CelebJob):
+        if job.error is not None:
+            self._fail(job.celeb, job.error)
+            return
+        if not self.spyder.spec.needsFilms:
+            self._queues['sink'].put(job)
+            return
+        for role in job.celeb.Roles:
+            if role.FilmUrl:
+                tid: str = title_id(role.FilmUrl) or role.FilmUrl
+                self.spyder._films.stamp(role, self._fields.get(tid, {}))
+        self._queues['sink'].put(job)
+
+    def _sink(self, job: _CelebJob):
+        try:
+            self.spyder._finish_celeb(job.celeb, job.profile_hash)
+            self.spyder._emit(job.celeb)
+            with self._lock:
+                self._results.append(job.celeb)
+            self._done.release()
+        except Exception:
+            self._fail(job.celeb)
+
+    # endregion
+
+    def _fetch(self, kind: str, key: str, url: str) -> Tuple[str, bool]:
+        """
+        Fetches a page (or reuses the stored copy) and hands it back without waiting for it to be persisted.
+        @returns (html, changed)
+        """
+        spyder = self.spyder
+        cached, headers = spyder._page_request(kind, key, url)
+        if headers is None:
+            return (cached, False)
+
+        res: HTTPResponse = spyder._request(url, headers)
+        if res.status == 304 and cached is not None:
+            spyder.metrics.count('page_cache', kind=kind, result='not_modified')
+            self._persist.put((spyder._manifest.mark, (kind, key, DONE), {'url': url, 'fetched_at': time.time()}))
+            return (cached, False)
+
+        check_page(url, res)
+        html: str = res.data.decode('utf-8')
+        previous: Dict = spyder._manifest.get(kind, key)
+        changed: bool = previous is None or previous['content_hash'] != hashlib.sha256(html.encode('utf-8')).hexdigest()
+        self._persist.put((spyder._persist_page, (kind, key, url, html, res.headers.get('ETag'), res.headers.get('Last-Modified')), {}))
+        return (html, changed)
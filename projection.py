@@ -0,0 +1,80 @@
+from models import Celeb, CelebRole
+from registry import FILM_FIELDS
+from typing import List, FrozenSet
+
+# Role fields every projected role keeps: they identify the film, so its details can be loaded later.
+ROLE_KEYS: FrozenSet[str] = frozenset(['FilmTitle', 'FilmUrl'])
+
+
+class ExtractionSpec():
+    """
+    The Celeb and CelebRole fields a crawl needs. The spider only runs the profile and film page extractors
+    for requested fields, and skips film pages entirely when no film-level role field is requested.
+    None means every field. List page fields are always filled, and roles keep FilmTitle and FilmUrl
+    whenever they are parsed.
+    usage:
+        ```
+        spec = ExtractionSpec.fromFields(['DOB', 'Height', 'Gender'])
+        spyder = CelebSpyder(url, spec=spec)
+        spec = ExtractionSpec.fromFields(['DOB', 'Roles.Year', 'Roles.Genres'])
+        ```
+    """
+
+    def __init__(self, celeb_fields: List[str] = None, role_fields: List[str] = None):
+        """
+        @param celeb_fields (List[str]) Celeb fields to extract. Roles are parsed if 'Roles' is listed or role_fields is given.
+        @param role_fields (List[str]) CelebRole fields to extract.
+        """
+        if celeb_fields is not None:
+            _check(celeb_fields, Celeb.FIELDS, 'Celeb')
+        if role_fields is not None:
+            _check(role_fields, CelebRole.FIELDS, 'CelebRole')
+            if role_fields and celeb_fields is not None:
+                celeb_fields = list(celeb_fields) + ['Roles']
+
+        self.celeb_fields: FrozenSet[str] = frozenset(Celeb.FIELDS if celeb_fields is None else celeb_fields)
+        self.role_fields: FrozenSet[str] = frozenset(CelebRole.FIELDS if role_fields is None else set(role_fields) | ROLE_KEYS)
+        if 'Roles' not in self.celeb_fields:
+            self.role_fields = frozenset()
+        self.film_fields: FrozenSet[str] = frozenset(f for f in FILM_FIELDS if f in self.role_fields)
+
+    @staticmethod
+    def fromFields(names: List[str]):
+        """
+        Builds a spec from field names, with role fields prefixed by 'Roles.', e.g. ['DOB', 'Roles.Genres'].
+        'Roles' on its own requests every role field.
+        @param names (List[str])
+        @returns ExtractionSpec
+        """
+        celeb_fields: List[str] = [name for name in names if not name.startswith('Roles.')]
+        role_fields: List[str] = [name[len('Roles.'):] for name in names if name.startswith('Roles.')]
+        return ExtractionSpec(celeb_fields, None if 'Roles' in celeb_fields else role_fields)
+
+    def wants(self, field: str) -> bool:
+        """
+        @returns bool whether a Celeb field is requested.
+        """
+        return field in self.celeb_fields
+
+    def wantsRole(self, field: str) -> bool:
+        """
+        @returns bool whether a CelebRole field is requested.
+        """
+        return field in self.role_fields
+
+    @property
+    def needsRoles(self) -> bool:
+        return 'Roles' in self.celeb_fields
+
+    @property
+    def needsFilms(self) -> bool:
+        """
+        Whether any film page has to be fetched.
+        """
+        return len(self.film_fields) > 0
+
+
+def _check(fields: List[str], known: tuple, model: str):
+    unknown = [f for f in fields if f not in known]
+    if unknown:
+        raise ValueError(str.format('Unknown {0} fields: {1}', model, ', '.join(unknown)))
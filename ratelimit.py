@@ -0,0 +1,309 @@
+from urllib3.response import HTTPResponse
+from urllib3.exceptions import HTTPError
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from transport import Transport, HttpStatusError, RETRY_STATUSES
+from pagestore import _FileLock
+from typing import List, Dict, Callable
+import threading
+import random
+import json
+import time
+import re
+import os
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a host whose circuit breaker is open.
+    """
+
+    def __init__(self, host: str, retry_at: float):
+        super().__init__(str.format('Circuit open for {0}; retry after {1:.1f}s.', host, max(0.0, retry_at - time.time())))
+        self.host = host
+        self.retry_at = retry_at
+
+
+def retry_after_seconds(value: str, now: float = None) -> float:
+    """
+    Parses a Retry-After header, given either as seconds or as an HTTP date.
+    @param value (str)
+    @returns seconds (float) or None if missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class RateController():
+    """
+    AIMD request-rate limiter per host. Each host's rate creeps up while responses are healthy and is halved
+    when the host throttles (429), errors (5xx) or its latency rises well above its best. Retry-After pauses
+    the host, and a run of failures opens a circuit breaker that fails requests fast until a probe succeeds.
+    With a state folder, the state of each host is kept in a small file under a lock, so every worker process
+    (and the next run) paces against the same limits. Request outcomes are buffered in memory and folded into
+    the file by the next acquire(), so each request costs one locked read and write of the host's file.
+    usage:
+        ```
+        controller = RateController('./html/ratelimit', initial_rate=5, max_rate=50)
+        controller.acquire('www.imdb.com')
+        controller.record('www.imdb.com', 200, 0.3)
+        ```
+    """
+
+    def __init__(self, state_dir: str = './html/ratelimit', initial_rate: float = 5.0, min_rate: float = 0.2,
+                 max_rate: float = 50.0, increase: float = 0.1, decrease: float = 0.5, latency_factor: float = 3.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0, max_pause: float = 300.0,
+                 host_limits: Dict[str, float] = None, flush_interval: float = 1.0):
+        """
+        @param state_dir (str) folder holding each host's shared state. If None, state is kept in this process only.
+        @param initial_rate (float) requests per second a new host starts at.
+        @param min_rate (float) the floor a host's rate is never cut below.
+        @param max_rate (float) the ceiling a host's rate never grows past.
+        @param increase (float) requests per second added per healthy response.
+        @param decrease (float) factor the rate is multiplied by on throttling, errors or a latency spike.
+        @param latency_factor (float) a latency average this many times the host's best counts as a spike.
+        @param failure_threshold (int) consecutive failures that open the circuit breaker.
+        @param cooldown (float) seconds the breaker stays open before a probe request is let through.
+        @param max_pause (float) the longest Retry-After honored, in seconds.
+        @param host_limits (Dict[str, float]) per-host max_rate overrides, e.g. {'www.imdb.com': 20}.
+        @param flush_interval (float) seconds a host's buffered outcomes may wait for the next acquire()
+            before record() writes them itself.
+        """
+        self.state_dir = state_dir
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_pause = max_pause
+        self.host_limits: Dict[str, float] = host_limits or {}
+        self.flush_interval = flush_interval
+        self._states: Dict[str, Dict] = {}
+        # Outcomes recorded since each host's state was last written, and when that was.
+        self._pending: Dict[str, List[Callable[[Dict], None]]] = {}
+        self._flushed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_pending'] = {}
+        state['_flushed'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _new_state(self) -> Dict:
+        return {
+            'rate': self.initial_rate,
+            'next_at': 0.0,
+            'paused_until': 0.0,
+            'latency': None,
+            'best_latency': None,
+            'decreased_at': 0.0,
+            'failures': 0,
+            'open_until': 0.0
+        }
+
+    def _path(self, host: str) -> str:
+        return os.path.join(self.state_dir, re.sub(r'[^A-Za-z0-9.-]', '_', host) + '.json')
+
+    def _update(self, host: str, change: Callable[[Dict], object]):
+        """
+        Applies the host's buffered outcomes and then a change to its state, in one step under a
+        cross-process lock when the state is shared.
+        @returns whatever change returns.
+        """
+        with self._lock:
+            pending: List[Callable[[Dict], None]] = self._pending.pop(host, [])
+            self._flushed[host] = time.time()
+
+            def apply(state: Dict):
+                for outcome in pending:
+                    outcome(state)
+                return change(state)
+
+            if not self.state_dir:
+                state = self._states.get(host)
+                if state is None:
+                    state = self._states[host] = self._new_state()
+                return apply(state)
+
+            path = self._path(host)
+            with _FileLock(path + '.lock'):
+                state = self._new_state()
+                try:
+                    with open(path, 'r', encoding='utf-8') as file:
+                        state.update(json.load(file))
+                except (OSError, ValueError):
+                    pass
+                result = apply(state)
+                tmp_path = str.format('{0}.{1}.tmp', path, os.getpid())
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(state, file)
+                os.replace(tmp_path, path)
+                return result
+
+    def state(self, host: str) -> Dict:
+        """
+        @returns state (Dict) a copy of the host's current rate, pause, latency and breaker state.
+        """
+        return self._update(host, dict)
+
+    def acquire(self, host: str):
+        """
+        Waits for the host's next request slot. Raises CircuitOpenError if the host's breaker is open.
+        @param host (str)
+        """
+
+        def take_slot(state: Dict) -> float:
+            now = time.time()
+            if state['failures'] >= self.failure_threshold:
+                if state['open_until'] > now:
+                    raise CircuitOpenError(host, state['open_until'])
+                # Half open: this request is the probe; the rest fail fast until it comes back.
+                state['open_until'] = now + self.cooldown
+            slot = max(now, state['next_at'], state['paused_until'])
+            state['next_at'] = slot + 1.0 / state['rate']
+            return slot - now
+
+        wait: float = self._update(host, take_slot)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, host: str, status: int, latency: float, retry_after: float = None):
+        """
+        Adjusts the host's rate with the outcome of a request.
+        @param host (str)
+        @param status (int) the response status, or None if the request failed without one.
+        @param latency (float) seconds the request took.
+        @param retry_after (float) seconds the host asked to wait, if it sent Retry-After.
+        """
+        max_rate = self.host_limits.get(host, self.max_rate)
+        now = time.time()
+
+        def adjust(state: Dict):
+            failed = status is None or status in RETRY_STATUSES
+            if status is not None:
+                state['latency'] = latency if state['latency'] is None else 0.8 * state['latency'] + 0.2 * latency
+                best = state['best_latency']
+                # The best latency drifts up slowly, so a host that got slower for good becomes the new normal.
+                state['best_latency'] = latency if best is None else min(latency, best + (latency - best) * 0.01)
+            slow = state['best_latency'] is not None and state['latency'] > self.latency_factor * max(state['best_latency'], 0.001)
+
+            if failed or slow:
+                # Cut at most once per round trip, so a burst of failures from requests already in flight halves the rate once.
+                if now - state['decreased_at'] > max(1.0, state['latency'] or 0.0):
+                    state['rate'] = max(self.min_rate, state['rate'] * self.decrease)
+                    state['decreased_at'] = now
+            else:
+                state['rate'] = min(max_rate, state['rate'] + self.increase)
+
+            if retry_after is not None:
+                state['paused_until'] = max(state['paused_until'], now + min(retry_after, self.max_pause))
+
+            if failed:
+                state['failures'] += 1
+                if state['failures'] >= self.failure_threshold:
+                    state['open_until'] = now + self.cooldown
+            else:
+                state['failures'] = 0
+                state['open_until'] = 0.0
+
+        # Buffered for the host's next acquire(); written now only if that hasn't come for a while.
+        with self._lock:
+            self._pending.setdefault(host, []).append(adjust)
+            stale = now - self._flushed.get(host, 0.0) > self.flush_interval
+        if stale:
+            self._update(host, lambda state: None)
+
+    def flush(self):
+        """
+        Writes every host's buffered outcomes, e.g. before the process exits.
+        """
+        with self._lock:
+            hosts: List[str] = list(self._pending)
+        for host in hosts:
+            self._update(host, lambda state: None)
+
+
+class AdaptiveTransport(Transport):
+    """
+    Sends requests through another transport at the pace a RateController allows. Throttled (429) and
+    server error (5xx) responses and connection errors are retried with jittered exponential backoff,
+    waiting at least as long as Retry-After. If every attempt fails, HttpStatusError (or the connection
+    error) is raised, so an error page is never mistaken for the page that was asked for.
+    usage:
+        ```
+        transport = AdaptiveTransport(LiveTransport(), RateController('./html/ratelimit'), retries=4)
+        spyder = CelebSpyder(url, transport=transport)
+        ```
+    """
+    name = 'adaptive'
+
+    def __init__(self, inner: Transport, controller: RateController = None, retries: int = 4,
+                 backoff: float = 0.5, max_backoff: float = 30.0):
+        """
+        @param inner (Transport) sends the requests.
+        @param controller (RateController) paces the requests. Shared through './html/ratelimit' by default.
+        @param retries (int) attempts after the first on throttling, server errors and connection errors.
+        @param backoff (float) seconds before the first retry; doubled each attempt, with full jitter.
+        @param max_backoff (float) the longest backoff between attempts.
+        """
+        self.inner = inner
+        self.controller = controller or RateController()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def reserve(self, connections: int):
+        self.inner.reserve(connections)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            self.controller.acquire(host)
+            start = time.perf_counter()
+            try:
+                res: HTTPResponse = self.inner.request(url, headers)
+            except (HTTPError, OSError):
+                self.controller.record(host, None, time.perf_counter() - start)
+                if attempt >= self.retries:
+                    raise
+            else:
+                retry_after = retry_after_seconds(res.headers.get('Retry-After'))
+                self.controller.record(host, res.status, time.perf_counter() - start, retry_after)
+                if res.status not in RETRY_STATUSES:
+                    res.attempts = attempt + 1
+                    return res
+                if attempt >= self.retries:
+                    raise HttpStatusError(url, res.status)
+            # Retry-After is honored by acquire(), which waits out the host's pause.
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def flush(self):
+        self.controller.flush()
+        self.inner.flush()
+
+    def close(self):
+        self.flush()
+        self.inner.close()
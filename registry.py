@@ -0,0 +1,188 @@
+from models import CelebRole
+from typing import List, Dict, Callable, Iterable, FrozenSet
+import json
+import os
+import re
+import time
+
+# CelebRole fields that belong to the film itself. Everything else (CharacterName, Year)
+# is specific to the celeb's role and comes from the profile's filmography row.
+FILM_FIELDS: List[str] = [
+    'Directors', 'Metascore', 'UserReviews', 'Popularity', 'CriticReviews', 'Writers', 'Stars',
+    'PlotKeywords', 'ReleaseDate', 'Genres', 'MotionPictureRating', 'Budget', 'OpeningWeekend',
+    'Gross', 'CumulativeWorldwideGross', 'RuntimeMinutes', 'ProductionCompanies'
+]
+
+# Bump when the film parser's output changes so cached fields are re-parsed.
+REGISTRY_VERSION = 2
+
+_title_id_re = re.compile(r'/title/(tt\d+)')
+
+
+def title_id(film_url: str) -> str:
+    """
+    Gets the IMDB title id from a film URL, e.g. 'https://www.imdb.com/title/tt0111161/' -> 'tt0111161'.
+    @param film_url (str)
+    @returns title_id (str) or None if the URL has no title id.
+    """
+    if not film_url:
+        return None
+    m = _title_id_re.search(film_url)
+    return m.group(1) if m else None
+
+
+def film_fields(role: CelebRole) -> Dict:
+    """
+    Gets the film-level fields that have been set on a role.
+    @param role (CelebRole)
+    @returns fields (Dict)
+    """
+    return {f: getattr(role, f) for f in FILM_FIELDS if role.isSet(f)}
+
+
+class FilmRegistry():
+    """
+    Crawl-wide registry of parsed films keyed by IMDB title id.
+    Each film is fetched and parsed exactly once across all worker processes: the first worker
+    to claim a title id takes an exclusive lock file, the others wait for its parsed fields.
+    usage:
+        ```
+        films = FilmRegistry()
+        fields = films.resolve('tt0111161', lambda: load_film(role))
+        films.stamp(role, fields)
+        ```
+    """
+
+    def __init__(self, root: str = './html/imdb_films', lock_timeout: float = 300.0, poll_interval: float = 0.05,
+                 crawl_id: str = None, fields: Iterable[str] = None):
+        """
+        @param root (str) folder holding the parsed film fields.
+        @param lock_timeout (float) seconds after which another worker's lock is considered abandoned.
+        @param poll_interval (float) seconds between checks while waiting on another worker.
+        @param crawl_id (str) if set, fields cached by other crawls are ignored by get() and resolve(),
+            so every film is re-checked once during this crawl.
+        @param fields (Iterable[str]) the film fields this crawl parses. If None, all of them. Films cached
+            with fewer fields are parsed again.
+        """
+        self.root = root
+        self.crawl_id = crawl_id
+        self.fields: FrozenSet[str] = frozenset(FILM_FIELDS if fields is None else fields)
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._films: Dict[str, Dict] = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_films'] = {}
+        return state
+
+    def _path(self, tid: str) -> str:
+        return os.path.join(self.root, str.format('{0}.json', tid))
+
+    def _lock_path(self, tid: str) -> str:
+        return os.path.join(self.root, str.format('{0}.lock', tid))
+
+    def _covers(self, data: Dict, needs: FrozenSet[str]) -> bool:
+        # Entries written before field projection have no 'parsed' list and hold every field.
+        parsed = data.get('parsed')
+        return parsed is None or needs.issubset(parsed)
+
+    def get(self, tid: str, any_crawl: bool = False, needs: Iterable[str] = None) -> Dict:
+        """
+        Gets the cached film fields for a title id.
+        @param tid (str)
+        @param any_crawl (bool) accept fields cached by another crawl.
+        @param needs (Iterable[str]) film fields the cached parse has to include. If None, this crawl's fields.
+        @returns fields (Dict) or None if the film hasn't been parsed (for those fields) yet.
+        """
+        needs = self.fields if needs is None else frozenset(needs)
+        data: Dict = self._films.get(tid)
+        if data is not None and self._covers(data, needs):
+            return data['fields']
+
+        try:
+            with open(self._path(tid), 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if data.get('version') != REGISTRY_VERSION or not self._covers(data, needs):
+            return None
+
+        if self.crawl_id is not None and data.get('crawl') != self.crawl_id:
+            return data['fields'] if any_crawl else None
+
+        self._films[tid] = data
+        return data['fields']
+
+    def put(self, tid: str, fields: Dict, parsed: Iterable[str] = None) -> Dict:
+        """
+        Stores the film fields for a title id. The file is replaced atomically so readers never see a partial write.
+        @param tid (str)
+        @param fields (Dict)
+        @param parsed (Iterable[str]) the film fields the page was parsed for. If None, this crawl's fields.
+        @returns fields (Dict)
+        """
+        parsed = self.fields if parsed is None else frozenset(parsed)
+        data: Dict = {
+            'version': REGISTRY_VERSION,
+            'crawl': self.crawl_id,
+            'fields': fields,
+            'parsed': None if parsed.issuperset(FILM_FIELDS) else sorted(parsed)
+        }
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = str.format('{0}.{1}.tmp', self._path(tid), os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self._path(tid))
+        self._films[tid] = data
+        return fields
+
+    def resolve(self, tid: str, loader: Callable[[], Dict], needs: Iterable[str] = None) -> Dict:
+        """
+        Gets the film fields for a title id, calling `loader` to fetch and parse the film only
+        if no other worker has done or is doing so.
+        @param tid (str)
+        @param loader (Callable[[], Dict]) fetches and parses the film, returning its film-level fields.
+        @param needs (Iterable[str]) the film fields loader parses. If None, this crawl's fields.
+        @returns fields (Dict)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = self._lock_path(tid)
+        while True:
+            fields = self.get(tid, needs=needs)
+            if fields is not None:
+                return fields
+
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Another worker owns this film. Wait for it, breaking the lock if it was abandoned.
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > self.lock_timeout:
+                        os.remove(lock_path)
+                except OSError:
+                    pass
+                time.sleep(self.poll_interval)
+                continue
+
+            try:
+                os.close(fd)
+                # The owner may have finished between our cache check and taking the lock.
+                fields = self.get(tid, needs=needs)
+                if fields is None:
+                    fields = self.put(tid, loader(), needs)
+                return fields
+            finally:
+                os.remove(lock_path)
+
+    def stamp(self, role: CelebRole, fields: Dict) -> CelebRole:
+        """
+        Copies cached film fields onto a role.
+        @param role (CelebRole)
+        @param fields (Dict)
+        @returns CelebRole
+        """
+        for key, value in fields.items():
+            setattr(role, key, list(value) if isinstance(value, list) else value)
+        return role
@@ -0,0 +1,212 @@
+from typing import List, Dict, Tuple
+import unicodedata
+import argparse
+import threading
+import sqlite3
+import time
+import csv
+import os
+import re
+
+_person_id_re = re.compile(r'(nm\d+)')
+
+
+def person_id(value: str) -> str:
+    """
+    Gets an IMDB person id from an id or URL, e.g. 'https://www.imdb.com/name/nm0000158/' -> 'nm0000158'.
+    @param value (str)
+    @returns person_id (str) or None.
+    """
+    if not value:
+        return None
+    m = _person_id_re.search(value)
+    return m.group(1) if m else None
+
+
+def name_key(name: str) -> str:
+    """
+    Normalizes a name for lookups: strips accents, case and extra white space.
+    @param name (str)
+    @returns key (str)
+    """
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', stripped).strip().lower()
+
+
+class NameResolver():
+    """
+    Persistent index from a celeb's name (plus an optional disambiguation, e.g. a birth year)
+    to an IMDB person id, with the confidence and time of each resolution.
+    Lets the spider go straight to a profile without the search round trip.
+    Candidate matches from a search can be kept for later review.
+    usage:
+        ```
+        resolver = NameResolver('./html/resolutions.db')
+        resolver.seed_from_csv('./seeds.csv')
+        resolver.lookup('Tom Hanks')['person_id']
+        ```
+    """
+
+    def __init__(self, path: str = './html/resolutions.db', min_confidence: float = 0.5, timeout: float = 60.0):
+        """
+        @param path (str) the SQLite database file.
+        @param min_confidence (float) resolutions below this confidence are ignored by lookup().
+        @param timeout (float) seconds to wait on another process's write lock.
+        """
+        self.path = path
+        self.min_confidence = min_confidence
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirs = os.path.dirname(self.path)
+            if dirs:
+                os.makedirs(dirs, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS resolutions (
+                    name_key TEXT NOT NULL,
+                    disambiguation TEXT NOT NULL DEFAULT '',
+                    name TEXT NOT NULL,
+                    person_id TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    source TEXT,
+                    resolved_at REAL NOT NULL,
+                    PRIMARY KEY (name_key, disambiguation)
+                )''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS candidates (
+                    name_key TEXT NOT NULL,
+                    disambiguation TEXT NOT NULL DEFAULT '',
+                    person_id TEXT NOT NULL,
+                    rank INTEGER NOT NULL,
+                    label TEXT,
+                    confidence REAL NOT NULL,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (name_key, disambiguation, person_id)
+                )''')
+        return conn
+
+    def lookup(self, name: str, disambiguation: str = None) -> Dict:
+        """
+        @param name (str)
+        @param disambiguation (str)
+        @returns resolution (Dict) with person_id, confidence, source and resolved_at, or None.
+        """
+        row = self._db().execute(
+            'SELECT * FROM resolutions WHERE name_key = ? AND disambiguation = ? AND confidence >= ?',
+            (name_key(name), disambiguation or '', self.min_confidence)).fetchone()
+        return dict(row) if row else None
+
+    def store(self, name: str, pid: str, confidence: float = 1.0, source: str = 'search',
+              disambiguation: str = None, candidates: List[Tuple[str, str, float]] = None) -> Dict:
+        """
+        Records a resolution, replacing any earlier one for the same name and disambiguation.
+        @param name (str)
+        @param pid (str) IMDB person id or profile URL.
+        @param confidence (float) 0-1.
+        @param source (str) where the resolution came from, e.g. 'search' or 'csv'.
+        @param disambiguation (str)
+        @param candidates (List[Tuple[str, str, float]]) (person id or URL, label, confidence) for every match, best first.
+        @returns resolution (Dict)
+        """
+        pid = person_id(pid)
+        if pid is None:
+            raise ValueError(str.format('No IMDB person id for {0}.', name))
+
+        key, dis, now = name_key(name), disambiguation or '', time.time()
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (key, dis, name, pid, confidence, source, now))
+            for rank, (candidate, label, score) in enumerate(candidates or []):
+                candidate_id = person_id(candidate)
+                if candidate_id:
+                    db.execute('INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (key, dis, candidate_id, rank, label, score, now))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return self.lookup(name, disambiguation)
+
+    def candidates(self, name: str, disambiguation: str = None) -> List[Dict]:
+        """
+        @param name (str)
+        @param disambiguation (str)
+        @returns candidates (List[Dict]) stored matches, best first.
+        """
+        rows = self._db().execute(
+            'SELECT * FROM candidates WHERE name_key = ? AND disambiguation = ? ORDER BY rank',
+            (name_key(name), disambiguation or ''))
+        return [dict(row) for row in rows]
+
+    def ambiguous(self) -> List[Dict]:
+        """
+        @returns resolutions (List[Dict]) names with more than one stored candidate, for review.
+        """
+        rows = self._db().execute('''
+            SELECT r.* FROM resolutions r
+            JOIN candidates c ON c.name_key = r.name_key AND c.disambiguation = r.disambiguation
+            GROUP BY r.name_key, r.disambiguation HAVING COUNT(*) > 1
+            ORDER BY r.confidence''')
+        return [dict(row) for row in rows]
+
+    def seed_from_csv(self, path: str) -> int:
+        """
+        Bulk loads resolutions from a CSV with the columns 'name' and 'person_id' (an id or profile URL),
+        and optionally 'disambiguation' and 'confidence'.
+        @param path (str)
+        @returns count (int) the number of resolutions stored.
+        """
+        count = 0
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                if not row.get('name') or not person_id(row.get('person_id')):
+                    continue
+                confidence = float(row['confidence']) if row.get('confidence') else 1.0
+                self.store(row['name'], row['person_id'], confidence=confidence, source='csv',
+                           disambiguation=row.get('disambiguation'))
+                count += 1
+        return count
+
+    def close(self):
+        conn: sqlite3.Connection = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the name to IMDB id resolution index.')
+    parser.add_argument('--db', default='./html/resolutions.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed = commands.add_parser('seed', help='load resolutions from a CSV')
+    seed.add_argument('csv')
+    commands.add_parser('review', help='list names with several candidate matches')
+    args = parser.parse_args()
+
+    resolver = NameResolver(args.db)
+    if args.command == 'seed':
+        print(str.format('Stored {0} resolutions.', resolver.seed_from_csv(args.csv)))
+    else:
+        for resolution in resolver.ambiguous():
+            print(str.format('{0} -> {1} ({2:.2f})', resolution['name'], resolution['person_id'], resolution['confidence']))
+            for candidate in resolver.candidates(resolution['name'], resolution['disambiguation']):
+                print(str.format('    {0} {1} ({2:.2f})', candidate['person_id'], candidate['label'], candidate['confidence']))
@@ -0,0 +1,307 @@
+from models import Celeb, CelebRole
+from resolver import person_id, name_key
+from pagestore import _FileLock
+from typing import List, Dict, Type, get_type_hints
+import threading
+import json
+import uuid
+import re
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+CELEB_COLUMNS: List[str] = [name for name in Celeb.FIELDS if name != 'Roles']
+ROLE_COLUMNS: List[str] = list(CelebRole.FIELDS)
+
+
+def celeb_key(celeb: Celeb) -> str:
+    """
+    Key joining a celeb's row to its role rows: the IMDB person id, or the normalized name if it wasn't resolved.
+    @param celeb (Celeb)
+    @returns key (str)
+    """
+    return person_id(celeb.LocalDataSourcePath) or name_key(celeb.FullName)
+
+
+def celeb_record(celeb: Celeb) -> Dict:
+    """
+    Flattens a celeb into a row of the celebs table. Rank and Deceased are columns
+    rather than being encoded in a file name.
+    @param celeb (Celeb)
+    @returns row (Dict)
+    """
+    row: Dict = {'CelebKey': celeb_key(celeb)}
+    row.update((name, getattr(celeb, name)) for name in CELEB_COLUMNS)
+    row['Deceased'] = celeb.DOD is not None
+    row['RoleCount'] = len(celeb.Roles or [])
+    return row
+
+
+def role_records(celeb: Celeb) -> List[Dict]:
+    """
+    Flattens a celeb's roles into rows of the roles table.
+    @param celeb (Celeb)
+    @returns rows (List[Dict])
+    """
+    key = celeb_key(celeb)
+    rows: List[Dict] = []
+    for index, role in enumerate(celeb.Roles or []):
+        row: Dict = {'CelebKey': key, 'RoleIndex': index}
+        row.update((name, getattr(role, name)) for name in ROLE_COLUMNS)
+        rows.append(row)
+    return rows
+
+
+class Sink():
+    """
+    Destination for crawled celebs. Writes are buffered and flushed in batches;
+    close() flushes whatever is left.
+    usage:
+        ```
+        with JsonLinesSink('./dataset') as sink:
+            sink.write(celeb)
+        ```
+    """
+    name: str = None
+
+    def __init__(self, batch_size: int = 100):
+        """
+        @param batch_size (int) the number of celebs buffered before a flush.
+        """
+        self.batch_size = batch_size
+        self._buffer: List[Celeb] = []
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # Each process keeps its own buffer.
+        state = self.__dict__.copy()
+        state['_buffer'] = []
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, celeb: Celeb):
+        with self._lock:
+            self._buffer.append(celeb)
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if len(self._buffer) > 0:
+                self._write_batch(self._buffer)
+                self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def _write_batch(self, celebs: List[Celeb]):
+        raise NotImplementedError()
+
+
+class JsonDirectorySink(Sink):
+    """
+    The original layout: one indented './JSON/<FullName>.json' per celeb.
+    """
+    name = 'json'
+
+    def __init__(self, root: str = './JSON', batch_size: int = 1):
+        super().__init__(batch_size)
+        self.root = root
+
+    def _write_batch(self, celebs: List[Celeb]):
+        os.makedirs(self.root, exist_ok=True)
+        for celeb in celebs:
+            filename = os.path.join(self.root, str.format('{0}.json', re.sub(r'[^a-zA-Z]', '', celeb.FullName)))
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(celeb.toJson(indent=4))
+
+
+class JsonLinesSink(Sink):
+    """
+    Appends celebs to '<root>/celebs.jsonl' and their flattened roles to '<root>/roles.jsonl', one row per line.
+    Each batch is appended under an exclusive file lock, so any number of processes can share the files.
+    Files are only appended to; when a celeb is crawled again, readers keep its last row.
+    """
+    name = 'jsonl'
+
+    def __init__(self, root: str = './dataset', batch_size: int = 100):
+        super().__init__(batch_size)
+        self.root = root
+
+    def _append(self, path: str, rows: List[Dict]):
+        data = ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _write_batch(self, celebs: List[Celeb]):
+        os.makedirs(self.root, exist_ok=True)
+        roles: List[Dict] = [row for celeb in celebs for row in role_records(celeb)]
+        with _FileLock(os.path.join(self.root, 'lock')):
+            self._append(os.path.join(self.root, 'celebs.jsonl'), [celeb_record(celeb) for celeb in celebs])
+            if len(roles) > 0:
+                self._append(os.path.join(self.root, 'roles.jsonl'), roles)
+
+
+def _arrow_type(hint):
+    if hint is int:
+        return pyarrow.int64()
+    if hint is float:
+        return pyarrow.float64()
+    if hint is bool:
+        return pyarrow.bool_()
+    if getattr(hint, '__origin__', None) is list:
+        return pyarrow.list_(pyarrow.string())
+    return pyarrow.string()
+
+
+def celeb_schema() -> 'pyarrow.Schema':
+    """
+    @returns schema (pyarrow.Schema) of the celebs table, as written by celeb_record(). Requires pyarrow.
+    """
+    hints = get_type_hints(Celeb)
+    return pyarrow.schema(
+        [('CelebKey', pyarrow.string())] +
+        [(name, _arrow_type(hints[name])) for name in CELEB_COLUMNS] +
+        [('Deceased', pyarrow.bool_()), ('RoleCount', pyarrow.int64())])
+
+
+def role_schema() -> 'pyarrow.Schema':
+    """
+    @returns schema (pyarrow.Schema) of the roles table, as written by role_records(). Requires pyarrow.
+    """
+    hints = get_type_hints(CelebRole)
+    return pyarrow.schema(
+        [('CelebKey', pyarrow.string()), ('RoleIndex', pyarrow.int64())] +
+        [(name, _arrow_type(hints[name])) for name in ROLE_COLUMNS])
+
+
+class ParquetSink(Sink):
+    """
+    Writes celebs and roles as Parquet datasets under '<root>/celebs' and '<root>/roles'.
+    Every batch is a row group. Each process writes its own part files, so workers never share a file;
+    read a table back with `pyarrow.parquet.read_table('<root>/celebs')`. Requires the pyarrow package.
+    """
+    name = 'parquet'
+
+    def __init__(self, root: str = './dataset', batch_size: int = 500):
+        if pyarrow is None:
+            raise ValueError('The parquet sink requires the pyarrow package.')
+        super().__init__(batch_size)
+        self.root = root
+        self.celeb_schema = celeb_schema()
+        self.role_schema = role_schema()
+        self._writers: Dict[str, 'parquet.ParquetWriter'] = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_writers'] = {}
+        return state
+
+    def _writer(self, table: str, schema) -> 'parquet.ParquetWriter':
+        writer = self._writers.get(table)
+        if writer is None:
+            folder = os.path.join(self.root, table)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, str.format('part-{0}-{1}.parquet', os.getpid(), uuid.uuid4().hex[:8]))
+            writer = parquet.ParquetWriter(path, schema)
+            self._writers[table] = writer
+        return writer
+
+    def _write_batch(self, celebs: List[Celeb]):
+        roles: List[Dict] = [row for celeb in celebs for row in role_records(celeb)]
+        celeb_table = pyarrow.Table.from_pylist([celeb_record(celeb) for celeb in celebs], schema=self.celeb_schema)
+        self._writer('celebs', self.celeb_schema).write_table(celeb_table)
+        if len(roles) > 0:
+            self._writer('roles', self.role_schema).write_table(pyarrow.Table.from_pylist(roles, schema=self.role_schema))
+
+    def close(self):
+        # A part file is only readable once its footer is written.
+        with self._lock:
+            self.flush()
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+
+
+class IndexSink(Sink):
+    """
+    Adds celebs to the entity index at '<root>/entities.db' as they're crawled, so the index is current
+    without a rebuild. Combine it with a data sink, e.g. get_sink('jsonl,index').
+    """
+    name = 'index'
+
+    def __init__(self, root: str = './dataset', batch_size: int = 50):
+        super().__init__(batch_size)
+        self.root = root
+        from entityindex import EntityIndex
+        self.index = EntityIndex(os.path.join(root, 'entities.db'))
+
+    def _write_batch(self, celebs: List[Celeb]):
+        self.index.add(celebs)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.index.close()
+
+
+class MultiSink(Sink):
+    """
+    Writes every celeb to several sinks, e.g. JSONL and Parquet.
+    """
+
+    def __init__(self, sinks: List[Sink]):
+        super().__init__(batch_size=1)
+        self.sinks = sinks
+
+    def write(self, celeb: Celeb):
+        for sink in self.sinks:
+            sink.write(celeb)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+SINKS: Dict[str, Type[Sink]] = {
+    JsonLinesSink.name: JsonLinesSink,
+    ParquetSink.name: ParquetSink,
+    JsonDirectorySink.name: JsonDirectorySink,
+    IndexSink.name: IndexSink
+}
+
+
+def get_sink(names: str = 'jsonl', root: str = None) -> Sink:
+    """
+    Gets an output sink by name.
+    @param names (str) 'jsonl', 'parquet', 'json', 'index', or several separated by commas, e.g. 'jsonl,parquet'.
+    @param root (str) output folder. Defaults to each sink's own.
+    @returns Sink
+    """
+    sinks: List[Sink] = []
+    for name in [name.strip() for name in names.split(',') if name.strip()]:
+        if name not in SINKS:
+            raise ValueError(str.format('Unknown sink: {0}', name))
+        sinks.append(SINKS[name](root) if root else SINKS[name]())
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
@@ -0,0 +1,395 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+from transport import ResponseArchive
+from typing import List, Dict, Tuple
+import threading
+import argparse
+import random
+import time
+
+
+class StandInServer():
+    """
+    Local HTTP server that stands in for the real sites by serving a recorded archive.
+    Responses are matched on path and query, so one server can replay both the-numbers.com and IMDB.
+    Latency, bandwidth and errors can be injected to load-test concurrency settings.
+    usage:
+        ```
+        with StandInServer(ResponseArchive('./html/archive'), latency=0.2, error_rate=0.01) as server:
+            spyder = CelebSpyder(server.url + '/box-office-star-records/...', imdb_url=server.url)
+        ```
+    """
+
+    def __init__(self, archive: ResponseArchive, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, bandwidth: int = 0, error_rate: float = 0.0, error_status: int = 503,
+                 retry_after: int = None, seed: int = None):
+        """
+        @param archive (ResponseArchive) recorded responses to serve.
+        @param host (str)
+        @param port (int) 0 picks a free port.
+        @param latency (float) seconds before each response starts.
+        @param jitter (float) up to this many extra seconds, chosen at random per request.
+        @param bandwidth (int) bytes per second per response. If '0', unlimited.
+        @param error_rate (float) share of requests answered with error_status instead of the page.
+        @param error_status (int) status code of injected errors, e.g. 503 or 429.
+        @param retry_after (int) Retry-After seconds sent with injected errors.
+        @param seed (int) seeds the jitter and error choices for repeatable runs.
+        """
+        self.archive = archive
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.stats: Dict[str, int] = {'requests': 0, 'served': 0, 'not_found': 0, 'not_modified': 0, 'errors': 0, 'bytes': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer = None
+        self.url: str = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _roll(self) -> Tuple[float, bool]:
+        with self._lock:
+            return (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0,
+                    self._random.random() < self.error_rate)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        self._count('requests')
+        jitter, fail = self._roll()
+        time.sleep(self.latency + jitter)
+
+        if fail:
+            self._count('errors')
+            handler.send_response(self.error_status)
+            if self.retry_after is not None:
+                handler.send_header('Retry-After', str(self.retry_after))
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        entry: Dict = self.archive.lookup(handler.path, any_host=True)
+        if entry is None:
+            self._count('not_found')
+            handler.send_response(404)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        etag = entry['headers'].get('ETag') or entry['headers'].get('etag')
+        if etag and handler.headers.get('If-None-Match') == etag:
+            self._count('not_modified')
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        body: bytes = self.archive.body(entry)
+        handler.send_response(entry['status'])
+        for name, value in entry['headers'].items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        self._write(handler, body)
+        self._count('served')
+        self._count('bytes', len(body))
+
+    def _write(self, handler: BaseHTTPRequestHandler, body: bytes):
+        if self.bandwidth <= 0:
+            handler.wfile.write(body)
+            return
+        # Throttle in ~50ms slices.
+        chunk = max(1, self.bandwidth // 20)
+        for start in range(0, len(body), chunk):
+            handler.wfile.write(body[start:start + chunk])
+            handler.wfile.flush()
+            time.sleep(len(body[start:start + chunk]) / self.bandwidth)
+
+    def start(self) -> str:
+        """
+        Starts serving on a background thread.
+        @returns url (str) the server's base URL.
+        """
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                standin._handle(self)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = str.format('http://{0}:{1}', self.host, self._server.server_address[1])
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Commands that change the key they name (every key, for DEL).
+_WRITES = {'DEL', 'INCR', 'HSET', 'HSETNX', 'HDEL', 'HINCRBY', 'ZADD', 'ZREM', 'ZPOPMIN'}
+
+
+class RedisStandIn():
+    """
+    Local in-memory server speaking the Redis protocol, with the string, hash and sorted set commands
+    and the WATCH/MULTI/EXEC transactions the RedisFrontier uses, so distributed crawls can be tested
+    without a Redis install. Every command, and every transaction, runs under one lock, so each is atomic, as in Redis.
+    usage:
+        ```
+        with RedisStandIn() as redis:
+            store = RedisFrontier(redis.host, redis.port)
+        ```
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        @param host (str)
+        @param port (int) 0 picks a free port.
+        """
+        self.host = host
+        self.port = port
+        self._data: Dict[str, object] = {}
+        # Bumped on every write to a key, so EXEC can tell whether a watched key changed.
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingTCPServer = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _hash(self, key: str) -> Dict[str, str]:
+        return self._data.setdefault(key, {})
+
+    def _zset(self, key: str) -> Dict[str, float]:
+        return self._data.setdefault(key, {})
+
+    def _score(self, value: str) -> float:
+        return float(value.replace('(', '')) if value not in ('-inf', '+inf', 'inf') else float(value)
+
+    def execute(self, args: List[str], session: Dict = None):
+        """
+        Runs one command.
+        @param args (List[str]) the command name and its arguments.
+        @param session (Dict) the connection's transaction state: its watched keys and queued commands.
+        @returns reply (str, int, list or None)
+        """
+        name = args[0].upper()
+        session = {} if session is None else session
+        with self._lock:
+            if name == 'WATCH':
+                session.setdefault('watched', {}).update((key, self._versions.get(key, 0)) for key in args[1:])
+                return 'OK'
+            if name == 'UNWATCH':
+                session.pop('watched', None)
+                return 'OK'
+            if name == 'MULTI':
+                session['queued'] = []
+                return 'OK'
+            if name == 'DISCARD':
+                session.pop('queued', None)
+                session.pop('watched', None)
+                return 'OK'
+            if name == 'EXEC':
+                queued: List[List[str]] = session.pop('queued', None)
+                watched: Dict[str, int] = session.pop('watched', {})
+                if queued is None:
+                    raise ValueError('EXEC without MULTI')
+                if any(self._versions.get(key, 0) != version for key, version in watched.items()):
+                    return None
+                return [self._run(command[0].upper(), command) for command in queued]
+            if session.get('queued') is not None:
+                session['queued'].append(args)
+                return 'QUEUED'
+            return self._run(name, args)
+
+    def _run(self, name: str, args: List[str]):
+        if name in _WRITES:
+            for key in (args[1:] if name == 'DEL' else args[1:2]):
+                self._versions[key] = self._versions.get(key, 0) + 1
+        if name == 'PING':
+            return 'PONG'
+        if name == 'SELECT':
+            return 'OK'
+        if name in ('FLUSHDB', 'FLUSHALL'):
+            for key in self._data:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._data.clear()
+            return 'OK'
+        if name == 'DEL':
+            return sum(1 for key in args[1:] if self._data.pop(key, None) is not None)
+        if name == 'INCR':
+            value = int(self._data.get(args[1], 0)) + 1
+            self._data[args[1]] = str(value)
+            return value
+        if name == 'HSET':
+            fields = self._hash(args[1])
+            added = sum(1 for field in args[2::2] if field not in fields)
+            fields.update(zip(args[2::2], args[3::2]))
+            return added
+        if name == 'HSETNX':
+            fields = self._hash(args[1])
+            if args[2] in fields:
+                return 0
+            fields[args[2]] = args[3]
+            return 1
+        if name == 'HGET':
+            return self._hash(args[1]).get(args[2])
+        if name == 'HDEL':
+            fields = self._hash(args[1])
+            return sum(1 for field in args[2:] if fields.pop(field, None) is not None)
+        if name == 'HEXISTS':
+            return 1 if args[2] in self._hash(args[1]) else 0
+        if name == 'HLEN':
+            return len(self._hash(args[1]))
+        if name == 'HGETALL':
+            return [item for pair in self._hash(args[1]).items() for item in pair]
+        if name == 'HINCRBY':
+            fields = self._hash(args[1])
+            fields[args[2]] = str(int(fields.get(args[2], 0)) + int(args[3]))
+            return int(fields[args[2]])
+        if name == 'ZADD':
+            members = self._zset(args[1])
+            options = [arg.upper() for arg in args[2:] if arg.upper() in ('NX', 'XX')]
+            pairs = args[2 + len(options):]
+            added = 0
+            for score, member in zip(pairs[0::2], pairs[1::2]):
+                if ('NX' in options and member in members) or ('XX' in options and member not in members):
+                    continue
+                added += member not in members
+                members[member] = float(score)
+            return added
+        if name == 'ZREM':
+            members = self._zset(args[1])
+            return sum(1 for member in args[2:] if members.pop(member, None) is not None)
+        if name == 'ZCARD':
+            return len(self._zset(args[1]))
+        if name == 'ZSCORE':
+            score = self._zset(args[1]).get(args[2])
+            return None if score is None else repr(score)
+        if name == 'ZPOPMIN':
+            members = self._zset(args[1])
+            popped = sorted(members.items(), key=lambda item: (item[1], item[0]))[:int(args[2]) if len(args) > 2 else 1]
+            for member, _ in popped:
+                del members[member]
+            return [item for member, score in popped for item in (member, repr(score))]
+        if name == 'ZRANGE':
+            ordered = [member for member, _ in sorted(self._zset(args[1]).items(), key=lambda item: (item[1], item[0]))]
+            start, stop = int(args[2]), int(args[3])
+            return ordered[start:len(ordered) + stop + 1 if stop < 0 else stop + 1]
+        if name == 'ZRANGEBYSCORE':
+            low, high = self._score(args[2]), self._score(args[3])
+            members = self._zset(args[1])
+            return [member for member, score in sorted(members.items(), key=lambda item: (item[1], item[0])) if low <= score <= high]
+        raise ValueError(str.format("unknown command '{0}'", args[0]))
+
+    def _reply(self, value) -> bytes:
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return str.format(':{0}\r\n', value).encode('utf-8')
+        if isinstance(value, list):
+            return str.format('*{0}\r\n', len(value)).encode('utf-8') + b''.join(self._reply(item) for item in value)
+        if value in ('OK', 'PONG', 'QUEUED'):
+            return str.format('+{0}\r\n', value).encode('utf-8')
+        data = value.encode('utf-8')
+        return str.format('${0}\r\n', len(data)).encode('utf-8') + data + b'\r\n'
+
+    def start(self) -> int:
+        """
+        Starts serving on a background thread.
+        @returns port (int)
+        """
+        standin = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                session: Dict = {}
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    args: List[str] = []
+                    for _ in range(int(line[1:-2])):
+                        size = int(self.rfile.readline()[1:-2])
+                        args.append(self.rfile.read(size + 2)[:-2].decode('utf-8'))
+                    try:
+                        reply = standin._reply(standin.execute(args, session))
+                    except (ValueError, IndexError) as e:
+                        reply = str.format('-ERR {0}\r\n', e).encode('utf-8')
+                    self.wfile.write(reply)
+
+        ThreadingTCPServer.allow_reuse_address = True
+        self._server = ThreadingTCPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.port = self._server.server_address[1]
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a recorded crawl archive as a local stand-in for the real sites.')
+    parser.add_argument('--archive', default='./html/archive')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per response')
+    parser.add_argument('--bandwidth', type=int, default=0, help='bytes per second per response, 0 for unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--retry-after', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--redis', action='store_true', help='serve an in-memory Redis stand-in for the crawl frontier instead')
+    args = parser.parse_args()
+
+    if args.redis:
+        redis = RedisStandIn(host=args.host, port=args.port)
+        print(str.format('Serving a Redis stand-in at {0}:{1}', args.host, redis.start()))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            redis.stop()
+        raise SystemExit(0)
+
+    archive = ResponseArchive(args.archive)
+    server = StandInServer(archive, host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                           bandwidth=args.bandwidth, error_rate=args.error_rate, error_status=args.error_status,
+                           retry_after=args.retry_after, seed=args.seed)
+    print(str.format('Serving {0} recorded responses at {1}', len(archive), server.start()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,102 @@
+from typing import List, Iterator
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Profile elements the celeb fields are read from. Everything else outside the filmography rows is dropped as it streams by.
+_HEADER_IDS = {'name-poster', 'name-born-info', 'name-death-info', 'details-height', 'dyk-star-sign', 'dyk-trademark'}
+_GENDER_HREFS = {'#actor', '#actress'}
+
+
+def streaming_available() -> bool:
+    return etree is not None
+
+
+class ProfileStream():
+    """
+    Incremental parser for IMDB profile pages. The page is fed to lxml's pull parser in chunks and each
+    filmography row is handed out as a small HTML fragment as soon as it's complete. Elements are freed as
+    they're passed, so memory stays bounded by one row plus the few header elements kept for the celeb fields,
+    however long the filmography is.
+    usage:
+        ```
+        stream = ProfileStream(profile_html)
+        for row_html in stream.rows():
+            ...
+        header_html = stream.header()
+        ```
+    """
+
+    def __init__(self, html: str, chunk_size: int = 65536):
+        """
+        @param html (str) the raw profile page.
+        @param chunk_size (int) characters fed to the parser at a time.
+        """
+        if etree is None:
+            raise ImportError('Streaming profile extraction requires lxml.')
+        self.html = html
+        self.chunk_size = chunk_size
+        self._header: List[str] = []
+        self._done = False
+
+    def _wanted(self, elem, in_filmography: bool) -> bool:
+        if elem.tag == 'div' and in_filmography and 'filmo-row' in (elem.get('class') or '').split():
+            return True
+        if elem.get('id') in _HEADER_IDS:
+            return True
+        if elem.tag == 'a' and elem.get('href') in _GENDER_HREFS:
+            return True
+        return elem.tag == 'span' and 'awards-blurb' in (elem.get('class') or '').split()
+
+    def rows(self) -> Iterator[str]:
+        """
+        Parses the page, yielding the HTML of each 'div#filmography div.filmo-row' in page order.
+        """
+        parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._header = []
+        kept = None
+        filmography = None
+        for start in range(0, len(self.html) + self.chunk_size, self.chunk_size):
+            if start < len(self.html):
+                parser.feed(self.html[start:start + self.chunk_size])
+            else:
+                parser.close()
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if filmography is None and elem.get('id') == 'filmography':
+                        filmography = elem
+                    if kept is None and self._wanted(elem, filmography is not None):
+                        kept = elem
+                    continue
+
+                if elem is filmography:
+                    filmography = None
+                if kept is not None:
+                    if elem is not kept:
+                        continue
+                    kept = None
+                    fragment: str = etree.tostring(elem, encoding='unicode', with_tail=False)
+                    if elem.tag == 'div' and 'filmo-row' in (elem.get('class') or '').split():
+                        yield fragment
+                    else:
+                        self._header.append(fragment)
+
+                # Free what has been read: the element's children and the siblings before it.
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+        self._done = True
+
+    def header(self) -> str:
+        """
+        @returns html (str) a small page holding only the header elements the celeb fields are read from.
+            Available once rows() has been read to the end.
+        """
+        if not self._done:
+            for _ in self.rows():
+                pass
+        return str.format('<html><body>{0}</body></html>', ''.join(self._header))
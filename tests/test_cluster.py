@@ -0,0 +1,38 @@
+from cluster import ClusterNode, film_queue, film_shard, shard_owner
+from CelebSpyder import CelebSpyder
+from frontier import SqliteFrontier, LEASED
+from transport import LiveTransport
+import pytest
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = SqliteFrontier(str(tmp_path / 'frontier.db'))
+    spyder = CelebSpyder('http://127.0.0.1/list', transport=LiveTransport())
+    yield ClusterNode(spyder, store, node_id='n1', lease=60, heartbeat=0)
+    store.close()
+
+
+def test_film_shards_are_stable():
+    assert film_shard('tt0111161', 16) == film_shard('tt0111161', 16)
+    assert 0 <= film_shard('tt0111161', 16) < 16
+
+
+def test_shards_move_only_from_a_leaving_node():
+    nodes = ['a', 'b', 'c']
+    before = {shard: shard_owner(shard, nodes) for shard in range(64)}
+    after = {shard: shard_owner(shard, ['a', 'b']) for shard in range(64)}
+    assert all(after[shard] == owner for shard, owner in before.items() if owner != 'c')
+    assert shard_owner(0, []) is None
+
+
+def test_heartbeat_renews_loading_films(node: ClusterNode):
+    queue = film_queue(0)
+    node.store.add(queue, {'tt0000001': '{}'})
+    node.store.claim(queue, 'n1', lease=0.01)
+    node._loading['tt0000001'] = queue
+    node._beat()
+    # Still held by n1: without renewal the expired lease would be handed to the next claimer.
+    assert node.store.claim(queue, 'n2') == []
+    assert node.store.get(queue, 'tt0000001')['status'] == LEASED
@@ -0,0 +1,100 @@
+from models import Celeb, CelebRole
+from sinks import JsonLinesSink, JsonDirectorySink
+from typing import List, Tuple
+import pytest
+import os
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('pyarrow')
+
+from corpus import Corpus, build_features, load_features, source_files
+
+
+def _celeb(name: str, pid: int, rank: int, roles: List[Tuple[str, str, int, List[str], str]]) -> Celeb:
+    celeb = Celeb()
+    celeb.FullName = name
+    celeb.LocalDataSourcePath = str.format('https://www.imdb.com/name/nm{0:07d}/', pid)
+    celeb.Rank = rank
+    celeb.Roles = []
+    for title, year, budget, genres, rating in roles:
+        role = CelebRole()
+        role.FilmTitle = title
+        role.Year = year
+        role.Budget = budget
+        role.Genres = genres
+        role.MotionPictureRating = rating
+        celeb.Roles.append(role)
+    return celeb
+
+
+CELEBS = [
+    _celeb('Second', 2, 2, [('A', '1990', 100, ['Drama'], 'Rated R for violence'), ('B', '2001/I', None, ['Drama', 'Comedy'], 'PG')]),
+    _celeb('First', 1, 1, [('C', '2010', 50, ['Comedy'], 'R')]),
+    _celeb('Unranked', 3, None, [])
+]
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = str(tmp_path / 'dataset')
+    with JsonLinesSink(root) as sink:
+        for celeb in CELEBS:
+            sink.write(celeb)
+    return root
+
+
+def test_corpus_keeps_rank_order_and_role_offsets(dataset):
+    corpus = Corpus.load(dataset)
+    assert len(corpus) == 3
+    assert list(corpus.keys) == ['nm0000001', 'nm0000002', 'nm0000003']
+    assert list(corpus.offsets) == [0, 1, 3, 3]
+    assert corpus.roles.column('FilmTitle').to_pylist() == ['C', 'A', 'B']
+    assert list(corpus.role_years()) == [2010, 1990, 2001]
+
+
+def test_corpus_keeps_each_celebs_last_crawl(dataset):
+    recrawled = _celeb('Second', 2, 2, [('D', '2020', 10, ['Horror'], 'R')])
+    with JsonLinesSink(dataset) as sink:
+        sink.write(recrawled)
+    corpus = Corpus.load(dataset)
+    assert len(corpus) == 3
+    assert corpus.roles.column('FilmTitle').to_pylist() == ['C', 'D']
+
+
+def test_json_directory_layout(tmp_path):
+    root = str(tmp_path / 'JSON')
+    with JsonDirectorySink(root) as sink:
+        for celeb in CELEBS:
+            sink.write(celeb)
+    assert len(source_files(root)) == 3
+    assert list(Corpus.load(root).offsets) == [0, 1, 3, 3]
+
+
+def test_build_features(dataset):
+    matrix = build_features(Corpus.load(dataset))
+    row = matrix.index('nm0000002')
+    assert row == 1
+    assert matrix.column('RoleCount').tolist() == [1, 2, 0]
+    assert matrix.column('Budget_sum')[row] == 100
+    assert matrix.column('Budget_max')[0] == 50
+    assert numpy.isnan(matrix.column('Budget_mean')[2])
+    assert matrix.column('YearsActive')[row] == 12
+    assert matrix.column('Genre_Drama').tolist() == [0, 2, 0]
+    assert matrix.column('Rating_R').tolist() == [1, 1, 0]
+    assert matrix.index('nm9999999') == -1
+
+
+def test_load_features_uses_the_cache_until_the_source_changes(dataset, tmp_path):
+    cache = str(tmp_path / 'features')
+    matrix = load_features(dataset, cache)
+    assert isinstance(matrix.values, numpy.memmap)
+    assert matrix.column('RoleCount').tolist() == [1, 2, 0]
+    [folder] = os.listdir(cache)
+    values_path = os.path.join(cache, folder, 'values.npy')
+    built = os.stat(values_path).st_mtime_ns
+    load_features(dataset, cache)
+    assert os.stat(values_path).st_mtime_ns == built
+
+    with JsonLinesSink(dataset) as sink:
+        sink.write(_celeb('Fourth', 4, 4, [('E', '2015', 5, ['Drama'], 'R')]))
+    assert len(load_features(dataset, cache)) == 4
@@ -0,0 +1,139 @@
+"""
+End-to-end crawls against a stand-in server replaying an archive recorded from the benchmark fixture server.
+"""
+from benchmarks import fixtures
+from benchmarks.fixture_server import FixtureServer
+from CelebSpyder import CelebSpyder
+from pipeline import CrawlPipeline
+from models import Celeb
+from transport import ResponseArchive, RecordTransport, LiveTransport
+from standin import StandInServer
+from typing import List, Tuple
+import asyncio
+import pytest
+import os
+
+CELEBS = 6
+ROLES = 5
+FILM_POOL = 20
+
+
+def _summary(celebs: List[Celeb]) -> List[Tuple[str, List[str]]]:
+    return sorted((celeb.FullName, sorted(role.FilmTitle for role in celeb.Roles or [])) for celeb in celebs)
+
+
+@pytest.fixture(scope='module')
+def recorded(tmp_path_factory):
+    """
+    Records one single-process crawl of the fixture server.
+    @returns (archive, summary) the recorded archive and the celebs that crawl produced.
+    """
+    root = tmp_path_factory.mktemp('recorded')
+    cwd = os.getcwd()
+    os.chdir(str(root))
+    try:
+        archive = ResponseArchive(str(root / 'archive'))
+        with FixtureServer(fixtures.celeb_names(CELEBS), roles=ROLES, film_pool=FILM_POOL) as server:
+            spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=RecordTransport(archive, LiveTransport()))
+            celebs = spyder.get_data(num_processes=1)
+        assert spyder.errors == []
+    finally:
+        os.chdir(cwd)
+    return archive, _summary(celebs)
+
+
+@pytest.fixture
+def crawl_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize('num_processes', [1, 2, 3])
+def test_pool_crawl_matches_recording(recorded, crawl_dir, num_processes):
+    archive, expected = recorded
+    with StandInServer(archive) as server:
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport())
+        celebs = spyder.get_data(num_processes=num_processes)
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    # Workers sharing the parent's keep-alive socket stalled, retried searches and lost celebs.
+    assert server.stats['requests'] == len(archive)
+
+
+def test_process_copy_drops_connections(recorded, crawl_dir):
+    archive, _ = recorded
+    with StandInServer(archive) as server:
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport())
+        spyder._request(server.url + '/list', {})
+        spyder._manifest._db()
+        spyder._resolver._db()
+        copy = spyder._process_copy()
+    assert spyder._transport._http is not None
+    assert copy._transport._http is None
+    assert getattr(copy._manifest._local, 'conn', None) is None
+    assert getattr(copy._resolver._local, 'conn', None) is None
+
+
+@pytest.mark.parametrize('parse_processes', [1, 2])
+def test_pipeline_crawl_matches_recording(recorded, crawl_dir, parse_processes):
+    archive, expected = recorded
+    with StandInServer(archive) as server:
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport())
+        celebs = CrawlPipeline(spyder, parse_processes=parse_processes).run()
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    assert server.stats['requests'] == len(archive)
+
+
+def test_async_crawl_matches_recording(recorded, crawl_dir):
+    archive, expected = recorded
+    with StandInServer(archive) as server:
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport())
+        celebs = asyncio.run(spyder.get_data_async())
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    assert server.stats['requests'] == len(archive)
+
+
+def test_resume_skips_finished_celebs(recorded, crawl_dir):
+    archive, expected = recorded
+    with StandInServer(archive) as server:
+        CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport()).get_data(num_processes=2)
+        first = server.stats['requests']
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport(), mode='resume')
+        celebs = spyder.get_data(num_processes=2)
+        resumed = server.stats['requests'] - first
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    # Only the list page is fetched again; every celeb comes from the manifest.
+    assert resumed <= 1
+
+
+def test_refresh_sends_conditional_requests(recorded, crawl_dir):
+    archive, expected = recorded
+    # The fixture server sends no validators; tag every recorded page so the stand-in can answer 304.
+    tagged = ResponseArchive(str(crawl_dir / 'tagged'))
+    for url, entry in archive._urls.items():
+        tagged.record(url, entry['status'], dict(entry['headers'], ETag=str.format('"{0}"', entry['digest'])), archive.body(entry))
+    with StandInServer(tagged) as server:
+        CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport()).get_data(num_processes=1)
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport(), mode='refresh')
+        celebs = spyder.get_data(num_processes=2)
+        not_modified = server.stats['not_modified']
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    # Every profile and film is confirmed unchanged instead of downloaded again.
+    assert not_modified == len([url for url in archive._urls if '/name/' in url or '/title/' in url])
+
+
+def test_resolved_names_skip_the_search(recorded, crawl_dir):
+    archive, expected = recorded
+    with StandInServer(archive) as server:
+        spyder = CelebSpyder(server.url + '/list', imdb_url=server.url, transport=LiveTransport())
+        for name in fixtures.celeb_names(CELEBS):
+            spyder._resolver.store(name, fixtures.person_id_for(name), source='csv')
+        celebs = spyder.get_data(num_processes=2)
+        requests = server.stats['requests']
+    assert spyder.errors == []
+    assert _summary(celebs) == expected
+    assert requests == len(archive) - CELEBS
@@ -0,0 +1,96 @@
+from entityindex import EntityIndex, film_key
+from models import Celeb, CelebRole
+from sinks import JsonLinesSink
+from typing import List
+import pytest
+
+
+def _celeb(name: str, rank: int, roles: List[CelebRole]) -> Celeb:
+    celeb = Celeb()
+    celeb.FullName = name
+    celeb.Rank = rank
+    celeb.Roles = roles
+    return celeb
+
+
+def _role(tid: str, title: str, directors: List[str] = None, stars: List[str] = None, companies: List[str] = None) -> CelebRole:
+    role = CelebRole()
+    role.FilmTitle = title
+    role.FilmUrl = str.format('https://www.imdb.com/title/{0}/', tid)
+    role.Directors = directors
+    role.Stars = stars
+    role.ProductionCompanies = companies
+    return role
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = EntityIndex(str(tmp_path / 'entities.db'))
+    yield index
+    index.close()
+
+
+def test_film_key_falls_back_to_the_title():
+    assert film_key(_role('tt0111161', 'Film')) == 'tt0111161'
+    role = CelebRole()
+    role.FilmTitle = 'Some Film'
+    assert film_key(role) == 'title:some film'
+    assert film_key(CelebRole()) is None
+
+
+def test_lookups(index: EntityIndex):
+    index.add([
+        _celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'], ['Meg Ryan']), _role('tt2', 'Two', ['Spielberg'], ['Meg Ryan'])]),
+        _celeb('Meg Ryan', 2, [_role('tt1', 'One', ['Nolan'], ['Tom Hanks'])])
+    ])
+    assert index.films('director', 'nolan') == ['tt1']
+    assert index.celebs('director', 'Nolan') == ['tom hanks', 'meg ryan']
+    assert index.filmography('tom hanks') == ['tt1', 'tt2']
+    assert index.entities('tt2', 'director') == ['Spielberg']
+    assert index.costars('Tom Hanks') == [('Meg Ryan', 2)]
+    assert index.shared_films('Tom Hanks', 'Meg Ryan') == ['tt1', 'tt2']
+
+
+def test_re_adding_a_celeb_replaces_what_it_contributed(index: EntityIndex):
+    index.add([_celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'], ['Meg Ryan'], ['A24']),
+                                       _role('tt2', 'Two', ['Spielberg'], ['Meg Ryan'])])])
+    index.add([_celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'], ['Meg Ryan'])])])
+    assert index.films('company', 'A24') == []
+    assert index.films('director', 'Spielberg') == []
+    assert index.filmography('tom hanks') == ['tt1']
+    assert index.costars('Tom Hanks') == [('Meg Ryan', 1)]
+    assert index.costars('Meg Ryan') == [('Tom Hanks', 1)]
+
+
+def test_entities_named_by_another_celeb_are_kept(index: EntityIndex):
+    index.add([
+        _celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'], ['Meg Ryan'])]),
+        _celeb('Meg Ryan', 2, [_role('tt1', 'One', ['Nolan'], ['Tom Hanks'])])
+    ])
+    index.add([_celeb('Tom Hanks', 1, [])])
+    assert index.films('director', 'Nolan') == ['tt1']
+    assert index.celebs('director', 'Nolan') == ['meg ryan']
+    # Meg Ryan's role still puts both of them in the film.
+    assert index.costars('Meg Ryan') == [('Tom Hanks', 1)]
+
+
+def test_rebuild_indexes_a_dataset(index: EntityIndex, tmp_path):
+    with JsonLinesSink(str(tmp_path / 'dataset')) as sink:
+        sink.write(_celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'], ['Meg Ryan'])]))
+    index.add([_celeb('Stale Celeb', 9, [_role('tt9', 'Nine', ['Someone'])])])
+    index.rebuild(str(tmp_path / 'dataset'))
+    assert index.films('director', 'Someone') == []
+    assert index.films('director', 'Nolan') == ['tt1']
+
+
+def test_failed_rebuild_keeps_the_previous_index(index: EntityIndex, tmp_path, monkeypatch):
+    with JsonLinesSink(str(tmp_path / 'dataset')) as sink:
+        sink.write(_celeb('Tom Hanks', 1, [_role('tt1', 'One', ['Nolan'])]))
+    index.add([_celeb('Meg Ryan', 2, [_role('tt9', 'Nine', ['Someone'])])])
+
+    def crash(conn, celebs):
+        raise RuntimeError('crashed part way')
+    monkeypatch.setattr(index, '_add', crash)
+    with pytest.raises(RuntimeError):
+        index.rebuild(str(tmp_path / 'dataset'))
+    assert index.films('director', 'Someone') == ['tt9']
@@ -0,0 +1,114 @@
+from frontier import FrontierStore, SqliteFrontier, RedisFrontier, get_frontier, PENDING, LEASED, DONE, FAILED
+from standin import RedisStandIn
+from typing import List
+import threading
+import pytest
+import time
+
+Q = 'q'
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        store = SqliteFrontier(str(tmp_path / 'frontier.db'), max_attempts=2)
+        yield store
+        store.close()
+    else:
+        with RedisStandIn() as redis:
+            store = RedisFrontier(redis.host, redis.port, max_attempts=2)
+            yield store
+            store.close()
+
+
+def test_add_queues_each_key_once(store: FrontierStore):
+    assert store.add(Q, {'a': '1', 'b': '2'}) == 2
+    assert store.add(Q, {'a': 'changed', 'c': '3'}) == 1
+    assert store.counts(Q)[PENDING] == 3
+    assert store.claim(Q, 'n1', 3) == [('a', '1'), ('b', '2'), ('c', '3')]
+
+
+def test_concurrent_claims_hand_out_each_key_once(store: FrontierStore):
+    store.add(Q, {str(i): str(i) for i in range(120)})
+    claimed: List[str] = []
+    lock = threading.Lock()
+
+    def work(owner: str):
+        while True:
+            items = store.claim(Q, owner, 3)
+            if len(items) == 0:
+                return
+            for key, _ in items:
+                with lock:
+                    claimed.append(key)
+                assert store.complete(Q, owner, key, 'done')
+
+    threads = [threading.Thread(target=work, args=(str.format('n{0}', i),)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(str(i) for i in range(120))
+    assert store.counts(Q)[DONE] == 120
+
+
+def test_only_the_owner_completes(store: FrontierStore):
+    store.add(Q, {'a': '1'})
+    store.claim(Q, 'n1')
+    assert not store.complete(Q, 'n2', 'a', 'theirs')
+    assert store.complete(Q, 'n1', 'a', 'mine')
+    assert store.results(Q) == {'a': 'mine'}
+
+
+def test_expired_lease_moves_to_the_next_claimer(store: FrontierStore):
+    store.add(Q, {'a': '1'})
+    store.claim(Q, 'old', lease=0.05)
+    time.sleep(0.1)
+    assert store.claim(Q, 'new') == [('a', '1')]
+    assert not store.fail(Q, 'old', 'a', 'late')
+    assert not store.complete(Q, 'old', 'a', 'late')
+    assert store.complete(Q, 'new', 'a', 'fresh')
+    assert store.results(Q) == {'a': 'fresh'}
+
+
+def test_renew_keeps_a_lease(store: FrontierStore):
+    store.add(Q, {'a': '1'})
+    store.claim(Q, 'n1', lease=0.2)
+    store.renew(Q, 'n1', ['a'], lease=60)
+    time.sleep(0.3)
+    assert store.claim(Q, 'n2') == []
+    assert store.get(Q, 'a')['status'] == LEASED
+
+
+def test_late_complete_after_requeue_is_ignored(store: FrontierStore):
+    store.add(Q, {'a': '1'})
+    store.claim(Q, 'n1')
+    assert store.fail(Q, 'n1', 'a', 'boom')
+    assert store.get(Q, 'a')['status'] == PENDING
+    # The failed worker finishing anyway mustn't mark an item that's waiting for another claim done.
+    assert not store.complete(Q, 'n1', 'a', 'late')
+    assert store.get(Q, 'a')['status'] == PENDING
+
+
+def test_fail_is_final_after_max_attempts(store: FrontierStore):
+    store.add(Q, {'a': '1'})
+    for attempt in range(2):
+        store.claim(Q, 'n1')
+        assert store.fail(Q, 'n1', 'a', str.format('boom {0}', attempt))
+    assert store.get(Q, 'a')['status'] == FAILED
+    assert store.errors(Q) == {'a': 'boom 1'}
+    assert store.claim(Q, 'n1') == []
+
+
+def test_heartbeats_list_live_nodes(store: FrontierStore):
+    store.heartbeat('n2')
+    store.heartbeat('n1')
+    assert store.nodes(60) == ['n1', 'n2']
+
+
+def test_get_frontier_parses_urls(tmp_path):
+    assert isinstance(get_frontier(str.format('sqlite://{0}', tmp_path / 'f.db')), SqliteFrontier)
+    store = get_frontier('redis://example.test:6380/2')
+    assert (store.host, store.port, store.db) == ('example.test', 6380, 2)
+    with pytest.raises(ValueError):
+        get_frontier('ftp://example.test')
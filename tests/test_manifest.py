@@ -0,0 +1,52 @@
+from manifest import CrawlManifest, CELEB, FILM, PROFILE, PENDING, DONE, FAILED
+from multiprocessing import Pool
+import pickle
+import pytest
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = CrawlManifest(str(tmp_path / 'manifest.db'))
+    yield manifest
+    manifest.close()
+
+
+def test_mark_keeps_fields_not_given(manifest: CrawlManifest):
+    manifest.mark(FILM, 'tt1', DONE, url='https://a.test/tt1', etag='"v1"', content_hash='abc')
+    manifest.mark(FILM, 'tt1', DONE, fetched_at=5.0)
+    entry = manifest.get(FILM, 'tt1')
+    assert (entry['url'], entry['etag'], entry['content_hash'], entry['fetched_at']) == ('https://a.test/tt1', '"v1"', 'abc', 5.0)
+    assert manifest.is_done(FILM, 'tt1')
+    assert manifest.get(FILM, 'tt2') is None
+    assert not manifest.is_done(FILM, 'tt2')
+
+
+def test_keys_and_summary(manifest: CrawlManifest):
+    manifest.mark(CELEB, 'Tom Hanks', DONE)
+    manifest.mark(CELEB, 'Meg Ryan', FAILED, error='boom')
+    manifest.mark(PROFILE, 'nm1', PENDING)
+    assert manifest.keys(CELEB, DONE) == ['Tom Hanks']
+    assert sorted(manifest.keys(CELEB)) == ['Meg Ryan', 'Tom Hanks']
+    assert manifest.summary() == {CELEB: {DONE: 1, FAILED: 1}, PROFILE: {PENDING: 1}}
+
+
+def test_pickled_copy_opens_its_own_connection(manifest: CrawlManifest):
+    manifest.mark(CELEB, 'Tom Hanks', DONE)
+    copy: CrawlManifest = pickle.loads(pickle.dumps(manifest))
+    assert getattr(copy._local, 'conn', None) is None
+    assert copy.is_done(CELEB, 'Tom Hanks')
+
+
+def _mark(args):
+    path, worker = args
+    manifest = CrawlManifest(path)
+    for i in range(40):
+        manifest.mark(FILM, str.format('{0}-{1}', worker, i), DONE)
+    manifest.close()
+
+
+def test_writers_in_several_processes(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    with Pool(4) as pool:
+        pool.map(_mark, [(path, worker) for worker in range(4)])
+    assert CrawlManifest(path).summary() == {FILM: {DONE: 160}}
@@ -0,0 +1,69 @@
+from pagestore import PageStore, canonical_url
+from multiprocessing import Pool
+import pytest
+import os
+
+
+def test_canonical_url():
+    assert canonical_url('HTTPS://WWW.IMDB.com/find?s=nm&q=Tom+Hanks&ref_=nv#top') == 'https://www.imdb.com/find?q=Tom+Hanks&s=nm'
+    assert canonical_url('https://api.test/3/find/tt1?api_key=secret&language=en') == 'https://api.test/3/find/tt1?language=en'
+    assert canonical_url('https://www.imdb.com') == 'https://www.imdb.com/'
+
+
+@pytest.mark.parametrize('codec', ['gzip', 'zstd'])
+def test_round_trip(tmp_path, codec):
+    if codec == 'zstd':
+        pytest.importorskip('zstandard')
+    store = PageStore(str(tmp_path), codec=codec)
+    digest = store.put('https://www.imdb.com/name/nm1/?ref_=x', '<html>é</html>')
+    assert store.get('https://www.imdb.com/name/nm1/') == '<html>é</html>'
+    assert store.digest('https://www.imdb.com/name/nm1/') == digest
+    assert store.get('https://www.imdb.com/name/nm2/') is None
+    store.close()
+
+
+def test_duplicate_content_is_stored_once(tmp_path):
+    store = PageStore(str(tmp_path))
+    store.put('https://a.test/1', 'same page')
+    store.put('https://a.test/2', 'same page')
+    store.put('https://a.test/1', 'same page')
+    packs = [name for name in os.listdir(str(tmp_path)) if name.startswith('pack')]
+    assert sum(os.path.getsize(str(tmp_path / name)) for name in packs) == store._urls[canonical_url('https://a.test/1')]['length']
+    with open(str(tmp_path / 'index.jsonl'), 'r', encoding='utf-8') as index:
+        assert len(index.readlines()) == 2
+
+
+def test_a_new_version_replaces_the_old_one(tmp_path):
+    store = PageStore(str(tmp_path))
+    store.put('https://a.test/1', 'old')
+    store.put('https://a.test/1', 'new')
+    assert store.get('https://a.test/1') == 'new'
+    assert PageStore(str(tmp_path)).get('https://a.test/1') == 'new'
+
+
+def test_a_blob_that_never_reached_the_disk_reads_as_missing(tmp_path):
+    store = PageStore(str(tmp_path))
+    store.put('https://a.test/1', 'page')
+    entry = store._urls[canonical_url('https://a.test/1')]
+    with open(str(tmp_path / entry['pack']), 'r+b') as pack:
+        pack.truncate(entry['offset'] + entry['length'] - 1)
+    assert PageStore(str(tmp_path)).get('https://a.test/1') is None
+
+
+def _put_pages(args):
+    root, worker = args
+    store = PageStore(root)
+    for i in range(50):
+        store.put(str.format('https://a.test/{0}/{1}', worker, i), str.format('page {0} from {1}', i, worker))
+        store.put(str.format('https://a.test/shared/{0}', i), str.format('shared page {0}', i))
+    return worker
+
+
+def test_writers_in_several_processes(tmp_path):
+    with Pool(4) as pool:
+        pool.map(_put_pages, [(str(tmp_path), worker) for worker in range(4)])
+    store = PageStore(str(tmp_path))
+    for worker in range(4):
+        for i in range(50):
+            assert store.get(str.format('https://a.test/{0}/{1}', worker, i)) == str.format('page {0} from {1}', i, worker)
+    assert store.get('https://a.test/shared/49') == 'shared page 49'
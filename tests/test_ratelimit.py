@@ -0,0 +1,63 @@
+from ratelimit import RateController, AdaptiveTransport, CircuitOpenError
+from transport import Transport, HttpStatusError, make_response
+from urllib3.response import HTTPResponse
+from typing import Dict, List
+import pytest
+
+HOST = 'example.test'
+
+
+class _Answers(Transport):
+    """
+    Answers each request with the next status in a list.
+    """
+
+    def __init__(self, statuses: List[int]):
+        self.statuses = list(statuses)
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        return make_response(b'', self.statuses.pop(0))
+
+
+def test_outcomes_are_shared_once_flushed(tmp_path):
+    writer = RateController(str(tmp_path), flush_interval=60)
+    reader = RateController(str(tmp_path))
+    writer.state(HOST)
+    writer.record(HOST, 503, 0.01)
+    assert reader.state(HOST)['failures'] == 0
+
+    writer.flush()
+    state = reader.state(HOST)
+    assert state['failures'] == 1
+    assert state['rate'] == pytest.approx(writer.initial_rate * writer.decrease)
+
+
+def test_stale_outcomes_are_written_by_record(tmp_path):
+    writer = RateController(str(tmp_path), flush_interval=0)
+    writer.record(HOST, 503, 0.01)
+    assert RateController(str(tmp_path)).state(HOST)['failures'] == 1
+
+
+def test_healthy_responses_raise_the_rate(tmp_path):
+    controller = RateController(str(tmp_path), initial_rate=5.0, increase=1.0)
+    for _ in range(3):
+        controller.record(HOST, 200, 0.01)
+    assert controller.state(HOST)['rate'] == pytest.approx(8.0)
+
+
+def test_breaker_opens_after_consecutive_failures(tmp_path):
+    controller = RateController(str(tmp_path), failure_threshold=2, cooldown=60)
+    controller.record(HOST, 500, 0.01)
+    controller.record(HOST, None, 0.01)
+    with pytest.raises(CircuitOpenError):
+        controller.acquire(HOST)
+
+
+def test_close_writes_the_last_outcomes(tmp_path):
+    controller = RateController(str(tmp_path), flush_interval=60, initial_rate=1000)
+    transport = AdaptiveTransport(_Answers([503, 503]), controller, retries=1, backoff=0)
+    controller.state(HOST)
+    with pytest.raises(HttpStatusError):
+        transport.request(str.format('http://{0}/', HOST))
+    transport.close()
+    assert RateController(str(tmp_path)).state(HOST)['failures'] == 2
@@ -0,0 +1,57 @@
+from resolver import NameResolver, name_key, person_id
+import pytest
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    resolver = NameResolver(str(tmp_path / 'resolutions.db'))
+    yield resolver
+    resolver.close()
+
+
+def test_person_id():
+    assert person_id('https://www.imdb.com/name/nm0000158/?ref_=x') == 'nm0000158'
+    assert person_id('nm0000158') == 'nm0000158'
+    assert person_id('https://www.imdb.com/title/tt0111161/') is None
+    assert person_id(None) is None
+
+
+def test_name_key():
+    assert name_key('  Penélope   CRUZ ') == 'penelope cruz'
+    assert name_key(None) == ''
+
+
+def test_lookup_matches_normalized_names(resolver: NameResolver):
+    resolver.store('Penélope Cruz', 'https://www.imdb.com/name/nm0004851/')
+    assert resolver.lookup('penelope cruz')['person_id'] == 'nm0004851'
+    assert resolver.lookup('Penelope Cruz', disambiguation='1974') is None
+
+
+def test_low_confidence_resolutions_are_ignored(resolver: NameResolver):
+    resolver.store('Chris Evans', 'nm0262635', confidence=0.3)
+    assert resolver.lookup('Chris Evans') is None
+    resolver.store('Chris Evans', 'nm0262635', confidence=0.9)
+    assert resolver.lookup('Chris Evans')['confidence'] == 0.9
+
+
+def test_candidates_and_ambiguous(resolver: NameResolver):
+    resolver.store('Chris Evans', 'nm0262635', candidates=[('nm0262635', 'Chris Evans (I)', 0.9), ('nm1234567', 'Chris Evans (II)', 0.4)])
+    resolver.store('Tom Hanks', 'nm0000158', candidates=[('nm0000158', 'Tom Hanks', 1.0)])
+    assert [c['person_id'] for c in resolver.candidates('chris evans')] == ['nm0262635', 'nm1234567']
+    assert [r['name'] for r in resolver.ambiguous()] == ['Chris Evans']
+
+
+def test_store_rejects_values_without_a_person_id(resolver: NameResolver):
+    with pytest.raises(ValueError):
+        resolver.store('Tom Hanks', 'https://www.imdb.com/title/tt0111161/')
+
+
+def test_seed_from_csv(resolver: NameResolver, tmp_path):
+    path = tmp_path / 'seed.csv'
+    path.write_text('name,person_id,disambiguation,confidence\n'
+                    'Tom Hanks,https://www.imdb.com/name/nm0000158/,,\n'
+                    'Chris Evans,nm0262635,1981,0.8\n'
+                    'Nobody,not an id,,\n', encoding='utf-8')
+    assert resolver.seed_from_csv(str(path)) == 2
+    assert resolver.lookup('Chris Evans', '1981')['confidence'] == 0.8
+    assert resolver.lookup('Tom Hanks')['source'] == 'csv'
@@ -0,0 +1,108 @@
+from models import Celeb, CelebRole
+from sinks import JsonLinesSink, JsonDirectorySink, IndexSink, MultiSink, celeb_key, celeb_record, role_records, get_sink
+from multiprocessing import Pool
+from typing import List
+import pickle
+import json
+import pytest
+import os
+
+
+def _celeb(name: str, url: str = None, titles: List[str] = ()) -> Celeb:
+    celeb = Celeb()
+    celeb.FullName = name
+    celeb.LocalDataSourcePath = url
+    roles: List[CelebRole] = []
+    for index, title in enumerate(titles):
+        role = CelebRole()
+        role.FilmTitle = title
+        role.FilmUrl = str.format('https://www.imdb.com/title/tt{0:07d}/', index + 1)
+        roles.append(role)
+    celeb.Roles = roles
+    return celeb
+
+
+def _rows(path: str) -> List[dict]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_records_join_on_the_celeb_key():
+    celeb = _celeb('Tom Hanks', 'https://www.imdb.com/name/nm0000158/', ['Big', 'Cast Away'])
+    assert celeb_key(celeb) == 'nm0000158'
+    assert celeb_key(_celeb('Penélope Cruz')) == 'penelope cruz'
+    record = celeb_record(celeb)
+    assert (record['CelebKey'], record['FullName'], record['RoleCount'], record['Deceased']) == ('nm0000158', 'Tom Hanks', 2, False)
+    roles = role_records(celeb)
+    assert [(row['CelebKey'], row['RoleIndex'], row['FilmTitle']) for row in roles] == [('nm0000158', 0, 'Big'), ('nm0000158', 1, 'Cast Away')]
+
+
+def test_jsonl_sink_flushes_in_batches(tmp_path):
+    sink = JsonLinesSink(str(tmp_path), batch_size=2)
+    sink.write(_celeb('A', titles=['One']))
+    assert not os.path.exists(str(tmp_path / 'celebs.jsonl'))
+    sink.write(_celeb('B'))
+    assert [row['FullName'] for row in _rows(str(tmp_path / 'celebs.jsonl'))] == ['A', 'B']
+    sink.write(_celeb('C', titles=['Two', 'Three']))
+    sink.close()
+    assert [row['FullName'] for row in _rows(str(tmp_path / 'celebs.jsonl'))] == ['A', 'B', 'C']
+    assert [row['FilmTitle'] for row in _rows(str(tmp_path / 'roles.jsonl'))] == ['One', 'Two', 'Three']
+
+
+def _write_part(args):
+    sink, names = args
+    with sink:
+        for name in names:
+            sink.write(_celeb(name, titles=['Film']))
+
+
+def test_jsonl_sink_is_shared_across_processes(tmp_path):
+    sink = JsonLinesSink(str(tmp_path), batch_size=3)
+    parts = [[str.format('celeb {0} {1}', part, i) for i in range(25)] for part in range(4)]
+    with Pool(4) as pool:
+        pool.map(_write_part, [(sink, names) for names in parts])
+    rows = _rows(str(tmp_path / 'celebs.jsonl'))
+    assert sorted(row['FullName'] for row in rows) == sorted(name for names in parts for name in names)
+    assert len(_rows(str(tmp_path / 'roles.jsonl'))) == 100
+
+
+def test_pickled_sink_starts_with_an_empty_buffer(tmp_path):
+    sink = JsonLinesSink(str(tmp_path), batch_size=10)
+    sink.write(_celeb('A'))
+    copy = pickle.loads(pickle.dumps(sink))
+    copy.close()
+    assert not os.path.exists(str(tmp_path / 'celebs.jsonl'))
+    sink.close()
+    assert len(_rows(str(tmp_path / 'celebs.jsonl'))) == 1
+
+
+def test_json_directory_sink(tmp_path):
+    with JsonDirectorySink(str(tmp_path)) as sink:
+        sink.write(_celeb('Tom Hanks', titles=['Big']))
+    with open(str(tmp_path / 'TomHanks.json'), encoding='utf-8') as file:
+        assert json.load(file)['FullName'] == 'Tom Hanks'
+
+
+def test_parquet_sink(tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    from sinks import ParquetSink
+    with ParquetSink(str(tmp_path), batch_size=2) as sink:
+        for name in ['A', 'B', 'C']:
+            sink.write(_celeb(name, titles=['One', 'Two']))
+    celebs = parquet.read_table(str(tmp_path / 'celebs')).to_pylist()
+    roles = parquet.read_table(str(tmp_path / 'roles')).to_pylist()
+    assert sorted(row['FullName'] for row in celebs) == ['A', 'B', 'C']
+    assert len(roles) == 6
+
+
+def test_get_sink(tmp_path):
+    assert isinstance(get_sink('jsonl', str(tmp_path)), JsonLinesSink)
+    sink = get_sink('jsonl, index', str(tmp_path))
+    assert isinstance(sink, MultiSink)
+    assert [type(child) for child in sink.sinks] == [JsonLinesSink, IndexSink]
+    sink.write(_celeb('Tom Hanks', 'https://www.imdb.com/name/nm0000158/', ['Big']))
+    sink.close()
+    assert len(_rows(str(tmp_path / 'celebs.jsonl'))) == 1
+    assert os.path.exists(str(tmp_path / 'entities.db'))
+    with pytest.raises(ValueError):
+        get_sink('csv')
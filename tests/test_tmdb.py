@@ -0,0 +1,117 @@
+from tmdb import TmdbSource, TmdbExtractor, TMDB_FILM_FIELDS
+from models import Celeb, CelebRole
+from pagestore import PageStore
+from ratelimit import AdaptiveTransport, RateController
+from transport import ResponseArchive, ReplayTransport, HttpStatusError
+from typing import Dict
+import pytest
+import json
+
+API = 'http://tmdb.test/3'
+FILMS = 12
+
+
+def _movie(i: int) -> Dict:
+    return {
+        'id': 100 + i,
+        'genres': [{'name': 'Drama'}, {'name': 'Crime'}],
+        'runtime': 142,
+        'budget': 25000000,
+        'revenue': 0,
+        'release_date': '1994-09-23',
+        'production_companies': [{'name': 'Castle Rock'}],
+        'credits': {
+            'crew': [{'name': 'Frank Darabont', 'job': 'Director', 'department': 'Directing'},
+                     {'name': 'Stephen King', 'job': 'Novel', 'department': 'Writing'}],
+            'cast': [{'name': str.format('Star {0}', order), 'order': order} for order in (3, 0, 2, 1)]
+        },
+        'keywords': {'keywords': [{'name': 'prison'}]},
+        'release_dates': {'results': [{'iso_3166_1': 'US', 'release_dates': [
+            {'type': 1, 'certification': 'PG'}, {'type': 3, 'certification': 'R'}]}]}
+    }
+
+
+def _role(i: int) -> CelebRole:
+    role = CelebRole()
+    role.FilmTitle = str.format('Film {0}', i)
+    role.FilmUrl = str.format('https://www.imdb.com/title/tt{0:07d}/', i)
+    return role
+
+
+@pytest.fixture
+def archive(tmp_path) -> ResponseArchive:
+    archive = ResponseArchive(str(tmp_path / 'archive'))
+    for i in range(FILMS):
+        archive.record(str.format('{0}/find/tt{1:07d}?external_source=imdb_id&language=en-US', API, i), 200, {},
+                       json.dumps({'movie_results': [{'id': 100 + i}] if i % 4 else [], 'person_results': []}).encode('utf-8'))
+        archive.record(str.format('{0}/movie/{1}?append_to_response=credits,keywords,release_dates&language=en-US', API, 100 + i),
+                       200, {}, json.dumps(_movie(i)).encode('utf-8'))
+    archive.record(API + '/find/nm0000001?external_source=imdb_id&language=en-US', 200, {},
+                   json.dumps({'movie_results': [], 'person_results': [{'id': 7}]}).encode('utf-8'))
+    archive.record(API + '/person/7?language=en-US', 401, {}, b'{"status_message": "Invalid API key"}')
+    return archive
+
+
+def test_extract_movie():
+    role = TmdbExtractor().extract(_movie(1), CelebRole())
+    assert role.Directors == ['Frank Darabont']
+    assert role.Writers == ['Stephen King']
+    assert role.Stars == ['Star 0', 'Star 1', 'Star 2']
+    assert role.MotionPictureRating == 'Rated R'
+    assert role.ReleaseDate == '23 September 1994'
+    assert role.Budget == 25000000
+    assert not role.isSet('CumulativeWorldwideGross')
+
+
+def test_extract_only_the_fields_asked_for():
+    role = TmdbExtractor().extract(_movie(1), CelebRole(), frozenset(['Genres']))
+    assert role.Genres == ['Drama', 'Crime']
+    assert not role.isSet('Directors')
+
+
+def test_extract_person():
+    celeb = Celeb()
+    celeb.BornIn = 'London'
+    TmdbExtractor(image_url='http://img').extract_person({'gender': 1, 'birthday': '1962-12-22', 'profile_path': '/a.jpg'}, celeb)
+    assert (celeb.Gender, celeb.DOB, celeb.PhotoUrl, celeb.BornIn) == ('Female', '1962-12-22', 'http://img/a.jpg', 'London')
+
+
+def test_film_falls_back_when_tmdb_does_not_have_it(archive, tmp_path):
+    tmdb = TmdbSource(api_key='k', api_url=API, transport=ReplayTransport(archive), cache=PageStore(str(tmp_path / 'cache')))
+    assert tmdb.film(_role(0)) is None
+    assert tmdb.film(_role(1))['Genres'] == ['Drama', 'Crime']
+
+
+def test_error_responses_raise_http_status_errors(archive, tmp_path):
+    tmdb = TmdbSource(api_key='k', api_url=API, transport=ReplayTransport(archive), cache=PageStore(str(tmp_path / 'cache')))
+    with pytest.raises(HttpStatusError) as error:
+        tmdb.person('nm0000001')
+    assert error.value.status == 401
+    # Not recorded: a replay miss is an error, not a film TMDB doesn't have.
+    with pytest.raises(HttpStatusError) as error:
+        tmdb.movie('tt9999999')
+    assert error.value.status == 404
+
+
+def test_cache_keys_leave_out_the_api_key(archive, tmp_path):
+    cache = PageStore(str(tmp_path / 'cache'))
+    TmdbSource(api_key='secret', api_url=API, transport=ReplayTransport(archive), cache=cache).movie('tt0000001')
+    assert cache.get(API + '/find/tt0000001?external_source=imdb_id&language=en-US') is not None
+    with open(str(tmp_path / 'cache' / 'index.jsonl'), 'r', encoding='utf-8') as index:
+        assert 'secret' not in index.read()
+
+
+def test_prefetch_fills_the_cache_and_writes_rate_control_state(archive, tmp_path):
+    controller = RateController(str(tmp_path / 'ratelimit'), initial_rate=1000, max_rate=5000, increase=1.0, flush_interval=60)
+    cache = PageStore(str(tmp_path / 'cache'))
+    tmdb = TmdbSource(api_key='k', api_url=API, transport=AdaptiveTransport(ReplayTransport(archive), controller), cache=cache)
+    roles = [_role(i) for i in range(FILMS)]
+    assert tmdb.prefetch(roles, workers=4) == FILMS - FILMS // 4
+
+    state = RateController(str(tmp_path / 'ratelimit')).state('tmdb.test')
+    assert state['rate'] == pytest.approx(1000 + FILMS + FILMS - FILMS // 4)
+
+    # Every response is now cached: a source that can't reach TMDB at all still has them.
+    offline = TmdbSource(api_key='k', api_url=API, transport=ReplayTransport(ResponseArchive(str(tmp_path / 'empty')), strict=True),
+                         cache=cache)
+    assert [offline.film(role) is not None for role in roles] == [i % 4 != 0 for i in range(FILMS)]
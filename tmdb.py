@@ -0,0 +1,350 @@
+from models import Celeb, CelebRole
+from transport import Transport, LiveTransport, HttpStatusError, check_page
+from ratelimit import AdaptiveTransport
+from pagestore import PageStore, canonical_url
+from registry import title_id
+from resolver import person_id
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.response import HTTPResponse
+from datetime import datetime
+from typing import List, Dict, Iterable, FrozenSet
+import argparse
+import json
+import os
+
+# CelebRole fields TMDB's movie details can fill. Metascore, review counts, popularity rank and the
+# US gross breakdown (OpeningWeekend, Gross) are IMDB-only and always come from the film page.
+TMDB_FILM_FIELDS: List[str] = [
+    'Directors', 'Writers', 'Stars', 'PlotKeywords', 'ReleaseDate', 'Genres', 'MotionPictureRating',
+    'Budget', 'CumulativeWorldwideGross', 'RuntimeMinutes', 'ProductionCompanies'
+]
+
+# Celeb fields TMDB's person details can fill. Height, star sign, trademark and awards are IMDB-only.
+TMDB_CELEB_FIELDS: List[str] = ['PhotoUrl', 'Gender', 'DOB', 'BornIn', 'DOD']
+
+# Movie sub-resources fetched with the movie itself, in one request.
+MOVIE_APPENDS: List[str] = ['credits', 'keywords', 'release_dates']
+
+API_URL = 'https://api.themoviedb.org/3'
+IMAGE_URL = 'https://image.tmdb.org/t/p/original'
+
+# TMDB's person gender codes: 0 not set, 1 female, 2 male, 3 non-binary.
+_GENDERS: Dict[int, str] = {1: 'Female', 2: 'Male', 3: 'Non-binary'}
+
+# The first few billed cast members, like the 'Stars' line of an IMDB title page.
+_STAR_COUNT = 3
+
+
+def _names(items: List[Dict]) -> List[str]:
+    names: List[str] = []
+    for item in items or []:
+        name = item.get('name')
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _amount(value: int) -> int:
+    # TMDB reports unknown budgets and revenues as 0.
+    return value if value else None
+
+
+def _release_date(value: str) -> str:
+    """
+    Formats a TMDB date the way IMDB's details show it, e.g. '1994-09-23' -> '23 September 1994'.
+    """
+    if not value:
+        return None
+    try:
+        date = datetime.strptime(value[:10], '%Y-%m-%d')
+    except ValueError:
+        return None
+    return str.format('{0} {1} {2}', date.day, date.strftime('%B'), date.year)
+
+
+class TmdbExtractor():
+    """
+    Extracts the film fields of a CelebRole and the profile fields of a Celeb from TMDB JSON responses.
+    Mirrors FilmPageExtractor: given a set of fields, only those are filled.
+    usage:
+        ```
+        extractor = TmdbExtractor()
+        extractor.extract(movie, role, fields=frozenset(['Genres', 'RuntimeMinutes']))
+        extractor.extract_person(person, celeb)
+        ```
+    """
+
+    def __init__(self, country: str = 'US', image_url: str = IMAGE_URL):
+        """
+        @param country (str) ISO 3166-1 code of the certification used for MotionPictureRating.
+        @param image_url (str) base URL profile photo paths are appended to.
+        """
+        self.country = country
+        self.image_url = image_url.rstrip('/')
+
+    def extract(self, movie: Dict, role: CelebRole, fields: FrozenSet[str] = None) -> CelebRole:
+        """
+        Fills the film fields of a role from a movie details response with credits, keywords and release dates appended.
+        Fields TMDB has no value for are left unset.
+        @param movie (Dict)
+        @param role (CelebRole)
+        @param fields (FrozenSet[str]) the film fields to fill. If None, all of TMDB_FILM_FIELDS.
+        @returns CelebRole
+        """
+        fields = frozenset(TMDB_FILM_FIELDS) if fields is None else fields
+        credits: Dict = movie.get('credits') or {}
+        crew: List[Dict] = credits.get('crew') or []
+        values: Dict = {}
+
+        if 'Directors' in fields:
+            values['Directors'] = _names([c for c in crew if c.get('job') == 'Director'])
+        if 'Writers' in fields:
+            values['Writers'] = _names([c for c in crew if c.get('department') == 'Writing'])
+        if 'Stars' in fields:
+            cast: List[Dict] = sorted(credits.get('cast') or [], key=lambda c: c.get('order', 0))
+            values['Stars'] = _names(cast[:_STAR_COUNT])
+        if 'PlotKeywords' in fields:
+            values['PlotKeywords'] = _names((movie.get('keywords') or {}).get('keywords'))
+        if 'Genres' in fields:
+            values['Genres'] = _names(movie.get('genres'))
+        if 'ProductionCompanies' in fields:
+            values['ProductionCompanies'] = _names(movie.get('production_companies'))
+        if 'ReleaseDate' in fields:
+            values['ReleaseDate'] = _release_date(movie.get('release_date'))
+        if 'RuntimeMinutes' in fields:
+            values['RuntimeMinutes'] = movie.get('runtime') or None
+        if 'Budget' in fields:
+            values['Budget'] = _amount(movie.get('budget'))
+        if 'CumulativeWorldwideGross' in fields:
+            values['CumulativeWorldwideGross'] = _amount(movie.get('revenue'))
+        if 'MotionPictureRating' in fields:
+            certification: str = self._certification(movie)
+            values['MotionPictureRating'] = str.format('Rated {0}', certification) if certification else None
+
+        for name, value in values.items():
+            if value is not None:
+                setattr(role, name, value)
+        return role
+
+    def extract_person(self, person: Dict, celeb: Celeb, fields: FrozenSet[str] = None) -> Celeb:
+        """
+        Fills the profile fields of a celeb from a person details response. Fields TMDB has no value for are left as they were.
+        @param person (Dict)
+        @param celeb (Celeb)
+        @param fields (FrozenSet[str]) the celeb fields to fill. If None, all of TMDB_CELEB_FIELDS.
+        @returns Celeb
+        """
+        fields = frozenset(TMDB_CELEB_FIELDS) if fields is None else fields
+        values: Dict = {
+            'PhotoUrl': self.image_url + person['profile_path'] if person.get('profile_path') else None,
+            'Gender': _GENDERS.get(person.get('gender')),
+            'DOB': person.get('birthday') or None,
+            'BornIn': person.get('place_of_birth') or None,
+            'DOD': person.get('deathday') or None
+        }
+        for name, value in values.items():
+            if name in fields and value is not None:
+                setattr(celeb, name, value)
+        return celeb
+
+    def _certification(self, movie: Dict) -> str:
+        for country in (movie.get('release_dates') or {}).get('results') or []:
+            if country.get('iso_3166_1') != self.country:
+                continue
+            # Theatrical releases (type 3) carry the rating IMDB shows; fall back to any other release.
+            releases: List[Dict] = sorted(country.get('release_dates') or [], key=lambda r: r.get('type') != 3)
+            for release in releases:
+                if release.get('certification'):
+                    return release['certification']
+        return None
+
+
+class TmdbSource():
+    """
+    Fills Celeb and CelebRole fields from TMDB's JSON API instead of IMDB's HTML pages.
+    Films and people are looked up by their IMDB ids. A movie's credits, keywords and release dates
+    come back appended to its details, so each film costs one details request after its id lookup.
+    Requests go over a pooled transport and every response is cached, so a film or person is
+    downloaded once however many crawls ask for it. Only the fields it is given are filled;
+    the rest still come from IMDB.
+    usage:
+        ```
+        tmdb = TmdbSource(api_key, fields=['Genres', 'RuntimeMinutes', 'Budget'])
+        spyder = CelebSpyder(url, tmdb=tmdb)
+        ```
+    """
+
+    def __init__(self, api_key: str = None, access_token: str = None, fields: Iterable[str] = None,
+                 api_url: str = API_URL, transport: Transport = None, cache: PageStore = None,
+                 extractor: TmdbExtractor = None, language: str = 'en-US'):
+        """
+        @param api_key (str) v3 API key sent as a query parameter. Defaults to the TMDB_API_KEY environment variable.
+        @param access_token (str) v4 read access token sent as a bearer header instead of an API key.
+            Defaults to the TMDB_ACCESS_TOKEN environment variable.
+        @param fields (Iterable[str]) the Celeb and CelebRole fields to take from TMDB. If None, all it can fill.
+        @param api_url (str) base URL of the API, e.g. a local stand-in server's URL + '/3'.
+        @param transport (Transport) sends requests. Defaults to a paced, pooled live transport.
+        @param cache (PageStore) where responses are cached. Defaults to './html/tmdb'.
+        @param extractor (TmdbExtractor)
+        @param language (str) language of names and titles.
+        """
+        self.api_key = api_key or os.environ.get('TMDB_API_KEY')
+        self.access_token = access_token or os.environ.get('TMDB_ACCESS_TOKEN')
+        fields = TMDB_FILM_FIELDS + TMDB_CELEB_FIELDS if fields is None else list(fields)
+        unknown: List[str] = [f for f in fields if f not in TMDB_FILM_FIELDS and f not in TMDB_CELEB_FIELDS]
+        if unknown:
+            raise ValueError(str.format('Fields TMDB does not have: {0}', ', '.join(unknown)))
+        self.film_fields: FrozenSet[str] = frozenset(f for f in fields if f in TMDB_FILM_FIELDS)
+        self.celeb_fields: FrozenSet[str] = frozenset(f for f in fields if f in TMDB_CELEB_FIELDS)
+        self.api_url = api_url.rstrip('/')
+        self.language = language
+        self._transport: Transport = transport or AdaptiveTransport(LiveTransport())
+        self._cache: PageStore = cache or PageStore('./html/tmdb')
+        self._extractor: TmdbExtractor = extractor or TmdbExtractor()
+
+    def _url(self, path: str, params: Dict[str, str] = None) -> str:
+        query: Dict[str, str] = dict(params or {})
+        if self.language:
+            query['language'] = self.language
+        if self.api_key and not self.access_token:
+            query['api_key'] = self.api_key
+        return str.format('{0}{1}?{2}', self.api_url, path, urlencode(sorted(query.items())))
+
+    def _get(self, path: str, params: Dict[str, str] = None) -> Dict:
+        """
+        Gets an API response, from the cache if it was fetched before.
+        Anything but a 200 is an error: a bad key (401) or a URL missing from a replayed archive (404)
+        must not read as "not on TMDB". Films and people TMDB doesn't have come back as empty
+        /find results, which are cached like any other response.
+        @param path (str) e.g. '/movie/278'.
+        @param params (Dict[str, str]) query parameters.
+        @returns data (Dict)
+        """
+        url: str = self._url(path, params)
+        # Cache and archive keys never hold the API key.
+        key: str = canonical_url(url)
+        cached: str = self._cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+        headers: Dict[str, str] = {'Accept': 'application/json'}
+        if self.access_token:
+            headers['Authorization'] = str.format('Bearer {0}', self.access_token)
+        res: HTTPResponse = check_page(key, self._transport.request(url, headers))
+        if res.status != 200:
+            raise HttpStatusError(key, res.status)
+
+        body: str = res.data.decode('utf-8')
+        self._cache.put(key, body)
+        return json.loads(body)
+
+    def _find(self, imdb_id: str, kind: str) -> int:
+        """
+        Maps an IMDB id to a TMDB id.
+        @param imdb_id (str) e.g. 'tt0111161' or 'nm0000158'.
+        @param kind (str) 'movie' or 'person'.
+        @returns tmdb_id (int) or None if TMDB doesn't know the id.
+        """
+        found: Dict = self._get(str.format('/find/{0}', imdb_id), {'external_source': 'imdb_id'})
+        results: List[Dict] = found.get(str.format('{0}_results', kind)) or []
+        return results[0]['id'] if results else None
+
+    def movie(self, imdb_id: str) -> Dict:
+        """
+        Gets a movie's details, with its credits, keywords and release dates appended.
+        @param imdb_id (str)
+        @returns movie (Dict) or None if the film isn't on TMDB.
+        """
+        tmdb_id: int = self._find(imdb_id, 'movie')
+        if tmdb_id is None:
+            return None
+        return self._get(str.format('/movie/{0}', tmdb_id), {'append_to_response': ','.join(MOVIE_APPENDS)})
+
+    def person(self, imdb_id: str) -> Dict:
+        """
+        Gets a person's details.
+        @param imdb_id (str)
+        @returns person (Dict) or None if the person isn't on TMDB.
+        """
+        tmdb_id: int = self._find(imdb_id, 'person')
+        if tmdb_id is None:
+            return None
+        return self._get(str.format('/person/{0}', tmdb_id))
+
+    def film(self, role: CelebRole, fields: Iterable[str] = None) -> Dict:
+        """
+        Gets the film-level fields of a role's film.
+        @param role (CelebRole) a role with a FilmUrl.
+        @param fields (Iterable[str]) the film fields to fill. If None, this source's film fields.
+        @returns fields (Dict) or None if the film isn't on TMDB, so the caller can fall back to the film page.
+        """
+        tid: str = title_id(role.FilmUrl)
+        movie: Dict = self.movie(tid) if tid else None
+        if movie is None:
+            return None
+        fields = self.film_fields if fields is None else frozenset(fields) & self.film_fields
+        film = CelebRole()
+        self._extractor.extract(movie, film, fields)
+        return {f: getattr(film, f) for f in TMDB_FILM_FIELDS if film.isSet(f)}
+
+    def fill_celeb(self, celeb: Celeb, fields: Iterable[str] = None) -> Celeb:
+        """
+        Fills a celeb's profile fields from TMDB, looked up by the IMDB id of its profile.
+        Fields TMDB has no value for keep the ones parsed from the profile page.
+        @param celeb (Celeb) a celeb with a LocalDataSourcePath.
+        @param fields (Iterable[str]) the celeb fields to fill. If None, this source's celeb fields.
+        @returns Celeb
+        """
+        fields = self.celeb_fields if fields is None else frozenset(fields) & self.celeb_fields
+        pid: str = person_id(celeb.LocalDataSourcePath)
+        if not fields or pid is None:
+            return celeb
+        person: Dict = self.person(pid)
+        if person is not None:
+            self._extractor.extract_person(person, celeb, fields)
+        return celeb
+
+    def prefetch(self, roles: List[CelebRole], workers: int = 8) -> int:
+        """
+        Downloads the TMDB responses for many films at once into the cache, e.g. ahead of a crawl.
+        Safe alongside a crawl's worker processes, before or while they run: the cache and the rate controller
+        lock across threads and processes, and workers crawl with their own copy of this source's connections.
+        The threads' rate control outcomes are written before it returns.
+        @param roles (List[CelebRole]) roles with a FilmUrl.
+        @param workers (int) requests in flight at once.
+        @returns found (int) the number of distinct films TMDB has.
+        """
+        tids: List[str] = sorted(set(filter(None, (title_id(role.FilmUrl) for role in roles))))
+        self._transport.reserve(workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                movies: List[Dict] = list(executor.map(self.movie, tids))
+        finally:
+            self.flush()
+        return len([movie for movie in movies if movie is not None])
+
+    def flush(self):
+        self._transport.flush()
+
+    def close(self):
+        self._transport.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look up IMDB titles and people on TMDB.')
+    parser.add_argument('ids', nargs='+', help="IMDB ids, e.g. 'tt0111161' or 'nm0000158'")
+    parser.add_argument('--api-url', default=API_URL)
+    args = parser.parse_args()
+
+    tmdb = TmdbSource(api_url=args.api_url)
+    for imdb_id in args.ids:
+        if imdb_id.startswith('nm'):
+            celeb = Celeb()
+            celeb.LocalDataSourcePath = str.format('https://www.imdb.com/name/{0}/', imdb_id)
+            print(imdb_id, tmdb.fill_celeb(celeb).toJson())
+        else:
+            role = CelebRole()
+            role.FilmUrl = str.format('https://www.imdb.com/title/{0}/', imdb_id)
+            print(imdb_id, json.dumps(tmdb.film(role)))
+    tmdb.close()
@@ -0,0 +1,308 @@
+from urllib3 import PoolManager
+from urllib3.response import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+from urllib.parse import urlsplit, urlunsplit
+from fetcher import DEFAULT_HEADERS, create_pool_manager
+from pagestore import PageStore, canonical_url, _FileLock
+from typing import Dict
+import threading
+import json
+import time
+import io
+import os
+
+# Headers that describe the wire encoding rather than the page; archived bodies are already decoded.
+_WIRE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+# Throttling and server errors: the body is an error page, not the page asked for, and the request is worth retrying.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpStatusError(Exception):
+    """
+    Raised when a request is answered with an error status instead of the page.
+    """
+
+    def __init__(self, url: str, status: int):
+        super().__init__(str.format('HTTP {0} from {1}.', status, url))
+        self.url = url
+        self.status = status
+
+
+def check_status(url: str, res: HTTPResponse) -> HTTPResponse:
+    """
+    Raises HttpStatusError if a response is a throttling or server error rather than a page.
+    @returns res (HTTPResponse)
+    """
+    if res.status in RETRY_STATUSES:
+        raise HttpStatusError(url, res.status)
+    return res
+
+
+def check_page(url: str, res: HTTPResponse) -> HTTPResponse:
+    """
+    Raises HttpStatusError if a page request was answered with any error status, e.g. a 404 for a page
+    that doesn't exist or that a replayed archive never recorded, so the error page is never stored or
+    parsed as the page and marked done.
+    @returns res (HTTPResponse)
+    """
+    if res.status >= 400:
+        raise HttpStatusError(url, res.status)
+    return res
+
+
+def path_key(url: str) -> str:
+    """
+    Canonical URL without the scheme and host, so an archive recorded from the real sites
+    can be served from any host, e.g. a local stand-in server.
+    @param url (str)
+    @returns key (str)
+    """
+    parts = urlsplit(canonical_url(url))
+    return urlunsplit(('', '', parts.path, parts.query, ''))
+
+
+def make_response(body: bytes, status: int = 200, headers: Dict[str, str] = None) -> HTTPResponse:
+    """
+    Builds an in-memory response that behaves like one read off the wire.
+    """
+    return HTTPResponse(body=io.BytesIO(body), headers=HTTPHeaderDict(headers or {}), status=status,
+                        preload_content=True, decode_content=False)
+
+
+class ResponseArchive():
+    """
+    Recorded request/response pairs. Bodies go into a compressed PageStore and each response's
+    status and headers into an append-only index, so an archive can be recorded by many processes at once.
+    The latest recording of a URL wins.
+    usage:
+        ```
+        archive = ResponseArchive('./html/archive')
+        archive.lookup('https://www.imdb.com/title/tt0111161/')
+        ```
+    """
+
+    def __init__(self, root: str = './html/archive'):
+        """
+        @param root (str) folder holding the index and the body store.
+        """
+        self.root = root
+        self._bodies = PageStore(os.path.join(root, 'bodies'))
+        self._index_path = os.path.join(root, 'responses.jsonl')
+        self._lock_path = os.path.join(root, 'lock')
+        self._urls: Dict[str, Dict] = {}
+        self._paths: Dict[str, Dict] = {}
+        self._index_pos = 0
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self._refresh()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        if not os.path.exists(self._index_path):
+            return
+        with self._lock, open(self._index_path, 'rb') as index:
+            index.seek(self._index_pos)
+            for line in index:
+                if not line.endswith(b'\n'):
+                    break
+                self._index_pos += len(line)
+                entry: Dict = json.loads(line)
+                self._urls[entry['url']] = entry
+                self._paths[path_key(entry['url'])] = entry
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def record(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> Dict:
+        """
+        Stores a response.
+        @param url (str)
+        @param status (int)
+        @param headers (Dict[str, str]) response headers.
+        @param body (bytes) the decoded response body.
+        @returns entry (Dict)
+        """
+        key = canonical_url(url)
+        entry: Dict = {
+            'url': key,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in _WIRE_HEADERS},
+            'digest': self._bodies.put(key, body.decode('utf-8', errors='replace')),
+            'recorded_at': time.time()
+        }
+        with self._lock, _FileLock(self._lock_path):
+            with open(self._index_path, 'ab') as index:
+                index.write((json.dumps(entry) + '\n').encode('utf-8'))
+            self._refresh()
+        return entry
+
+    def lookup(self, url: str, any_host: bool = False) -> Dict:
+        """
+        @param url (str)
+        @param any_host (bool) match on path and query only.
+        @returns entry (Dict) with url, status, headers and digest, or None.
+        """
+        key = path_key(url) if any_host else canonical_url(url)
+        entries = self._paths if any_host else self._urls
+        entry = entries.get(key)
+        if entry is None:
+            self._refresh()
+            entry = entries.get(key)
+        return entry
+
+    def body(self, entry: Dict) -> bytes:
+        html = self._bodies.get(entry['url'])
+        return html.encode('utf-8') if html is not None else b''
+
+
+class Transport():
+    """
+    Sends the spider's GET requests. Swapping the transport lets a crawl run live, record
+    everything it fetches, or replay a recorded crawl with no network.
+    """
+    name: str = None
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        raise NotImplementedError()
+
+    def reserve(self, connections: int):
+        """
+        Makes room for this many concurrent requests.
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes any state buffered for other processes, e.g. rate control outcomes.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class LiveTransport(Transport):
+    """
+    Real HTTP over one long-lived, keep-alive connection pool.
+    """
+    name = 'live'
+
+    def __init__(self, maxsize: int = 10, timeout: float = 30.0):
+        """
+        @param maxsize (int) connections kept open per host.
+        @param timeout (float) connect/read timeout in seconds.
+        """
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._http: PoolManager = None
+
+    def __getstate__(self):
+        # Connection pools can't cross process boundaries; each process opens its own.
+        state = self.__dict__.copy()
+        state['_http'] = None
+        return state
+
+    def reserve(self, connections: int):
+        if connections > self.maxsize:
+            self.maxsize = connections
+            self._http = None
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        request_headers = dict(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+        http = self._http
+        if http is None:
+            http = self._http = create_pool_manager(maxsize=self.maxsize, timeout=self.timeout)
+        return http.request('GET', url, headers=request_headers)
+
+    def close(self):
+        if self._http is not None:
+            self._http.clear()
+            self._http = None
+
+
+class RecordTransport(Transport):
+    """
+    Fetches through another transport and stores every response in an archive.
+    """
+    name = 'record'
+
+    def __init__(self, archive: ResponseArchive, inner: Transport = None):
+        self.archive = archive
+        self.inner = inner or LiveTransport()
+
+    def reserve(self, connections: int):
+        self.inner.reserve(connections)
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        res: HTTPResponse = self.inner.request(url, headers)
+        body: bytes = res.data
+        # A 304 has no body to replay; the page it confirms was recorded on an earlier fetch.
+        if res.status != 304:
+            self.archive.record(url, res.status, dict(res.headers), body)
+        return make_response(body, res.status, dict(res.headers))
+
+    def flush(self):
+        self.inner.flush()
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Serves responses from an archive with no network. Conditional requests are answered
+    with 304 when the archived ETag matches. URLs missing from the archive get a 404,
+    or raise if strict.
+    """
+    name = 'replay'
+
+    def __init__(self, archive: ResponseArchive, strict: bool = False, any_host: bool = True):
+        """
+        @param archive (ResponseArchive)
+        @param strict (bool) raise on URLs that weren't recorded instead of answering 404.
+        @param any_host (bool) match recordings on path and query only, so base URLs can be changed.
+        """
+        self.archive = archive
+        self.strict = strict
+        self.any_host = any_host
+
+    def request(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        entry: Dict = self.archive.lookup(url, any_host=self.any_host)
+        if entry is None:
+            if self.strict:
+                raise Exception(str.format('No recorded response for {0}.', url))
+            return make_response(b'', 404)
+
+        etag = entry['headers'].get('ETag') or entry['headers'].get('etag')
+        if etag and (headers or {}).get('If-None-Match') == etag:
+            return make_response(b'', 304, {'ETag': etag})
+        return make_response(self.archive.body(entry), entry['status'], entry['headers'])
+
+
+def get_transport(mode: str = 'live', archive: str = './html/archive', adaptive: bool = True) -> Transport:
+    """
+    Gets a transport by mode.
+    @param mode (str) 'live', 'record' or 'replay'.
+    @param archive (str) the archive folder for 'record' and 'replay'.
+    @param adaptive (bool) pace and retry network requests with an AdaptiveTransport.
+    @returns Transport
+    """
+    from ratelimit import AdaptiveTransport
+    live: Transport = AdaptiveTransport(LiveTransport()) if adaptive else LiveTransport()
+    if mode == LiveTransport.name:
+        return live
+    if mode == RecordTransport.name:
+        return RecordTransport(ResponseArchive(archive), live)
+    if mode == ReplayTransport.name:
+        return ReplayTransport(ResponseArchive(archive))
+    raise ValueError(str.format('Unknown transport: {0}', mode))
@@ -2,8 +2,8 @@ import json
 import os
 
 def read_json(path: str):
-    infile = open(path, "r")
-    return json.loads(infile.read())
+    with open(path, "r", encoding="utf-8") as infile:
+        return json.load(infile)
 
 def read_files(path: str):
     file_list = []